@@ -1,156 +1,691 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import sys
-import os
-
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from graph.patient_graph import patient_graph
-from graph.evaluator_graph import evaluator_graph
-from graph.treatment_graph import treatment_graph
-from langchain_core.messages import HumanMessage, AIMessage
-
-app = Flask(__name__)
-CORS(app)
-
-# ==================== CHAT ENDPOINT ====================
-@app.route('/api/chat', methods=['POST', 'OPTIONS'])
-def chat():
-    if request.method == 'OPTIONS':
-        return '', 200
-    
-    try:
-        body = request.get_json(force=True)
-    except Exception:
-        return jsonify({"error": "Invalid JSON body"}), 400
-    
-    user_message = body.get("user_message", "").strip()
-    messages = body.get("messages", [])
-    
-    # First message → greeting
-    if not user_message and not messages:
-        greeting = "Hello! I'm ready to discuss my symptoms with you."
-        return jsonify({
-            "reply": greeting,
-            "conversation_end": False,
-            "messages": [{"role": "patient", "content": greeting}]
-        }), 200
-    
-    # Build LangGraph message history
-    graph_messages = []
-    for m in messages:
-        if m.get("role") == "doctor":
-            graph_messages.append(HumanMessage(content=m.get("content", "")))
-        else:
-            graph_messages.append(AIMessage(content=m.get("content", "")))
-    
-    if user_message:
-        graph_messages.append(HumanMessage(content=user_message))
-    
-    try:
-        new_state = patient_graph.invoke({
-            "messages": graph_messages,
-            "revealed_symptoms": [],
-            "conversation_end": False
-        })
-    except Exception as e:
-        return jsonify({"error": f"Graph invocation failed: {str(e)}"}), 500
-    
-    reply = new_state["messages"][-1].content
-    
-    if user_message:
-        messages.append({"role": "doctor", "content": user_message})
-    messages.append({"role": "patient", "content": reply})
-    
-    return jsonify({
-        "reply": reply,
-        "conversation_end": new_state.get("conversation_end", False),
-        "messages": messages
-    }), 200
-
-# ==================== EVALUATE ENDPOINT ====================
-@app.route('/api/evaluate', methods=['POST', 'OPTIONS'])
-def evaluate():
-    if request.method == 'OPTIONS':
-        return '', 200
-    
-    try:
-        body = request.get_json(force=True)
-    except Exception:
-        return jsonify({"error": "Invalid JSON body"}), 400
-    
-    doctor_message = body.get("doctor_message", "").strip()
-    patient_history = body.get("patient_history", [])
-    
-    if not doctor_message:
-        return jsonify({"error": "doctor_message is required"}), 400
-    
-    try:
-        result = evaluator_graph.invoke({
-            "doctor_message": doctor_message,
-            "patient_history": patient_history,
-            "evaluation": {}
-        })
-    except Exception as e:
-        return jsonify({"error": f"Evaluation failed: {str(e)}"}), 500
-    
-    return jsonify({
-        "evaluation": result.get("evaluation", {})
-    }), 200
-
-# ==================== TREATMENT ENDPOINT ====================
-@app.route('/api/treatment', methods=['POST', 'OPTIONS'])
-def treatment():
-    if request.method == 'OPTIONS':
-        return '', 200
-    
-    try:
-        body = request.get_json(force=True)
-    except Exception:
-        return jsonify({"error": "Invalid JSON body"}), 400
-    
-    prescription = body.get("prescription", "").strip()
-    messages = body.get("messages", [])
-    clarification_used = body.get("clarification_used", False)
-    
-    if not prescription and not messages:
-        greeting = "Please share the prescription given by the doctor."
-        return jsonify({
-            "patient_reply": greeting,
-            "conversation_end": False,
-            "clarification_used": False,
-            "messages": [{"role": "patient", "content": greeting}]
-        }), 200
-    
-    graph_messages = []
-    for m in messages:
-        if m.get("role") == "doctor":
-            graph_messages.append(HumanMessage(content=m.get("content", "")))
-        else:
-            graph_messages.append(AIMessage(content=m.get("content", "")))
-    
-    if prescription:
-        graph_messages.append(HumanMessage(content=prescription))
-    
-    try:
-        new_state = treatment_graph.invoke({
-            "messages": graph_messages,
-            "clarification_used": clarification_used,
-            "conversation_end": False
-        })
-    except Exception as e:
-        return jsonify({"error": f"Treatment graph error: {str(e)}"}), 500
-    
-    reply = new_state["messages"][-1].content
-    
-    if prescription:
-        messages.append({"role": "doctor", "content": prescription})
-    messages.append({"role": "patient", "content": reply})
-    
-    return jsonify({
-        "patient_reply": reply,
-        "conversation_end": new_state.get("conversation_end", False),
-        "clarification_used": new_state.get("clarification_used", False),
-        "messages": messages
-    }), 200
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from flask_cors import CORS
+import sys
+import os
+import json
+import time
+import importlib
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.session_manager import create_session, get_session, update_session, reset_session
+from utils.transcript import DOCTOR, PATIENT, Transcript
+from utils.history import echo_history, history_fields
+from utils.case_library import DEFAULT_CASE, get_library
+from utils.metrics import REGISTRY, CONTENT_TYPE, HTTP_LATENCY, HTTP_INFLIGHT
+from utils.resilience import REQUEST_DEADLINE_S, DeadlineExceeded, start_deadline, end_deadline
+from utils.single_flight import flights
+from utils.conversation_log import log_turn, setup_logging
+from utils import conversation_log
+
+app = Flask(__name__)
+CORS(app)
+
+CHAT_GREETING = "Hello! I'm ready to discuss my symptoms with you."
+TREATMENT_GREETING = "Please share the prescription given by the doctor."
+
+# ==================== LAZY GRAPHS ====================
+# Each route only imports (and compiles) the graph it uses, on first use, so a
+# cold start serving /api/chat never pays for the evaluator or treatment graphs.
+GRAPH_MODULES = {
+    "patient": "graph.patient_graph",
+    "evaluator": "graph.evaluator_graph",
+    "treatment": "graph.treatment_graph",
+    "turn": "graph.turn_graph"
+}
+_graph_modules = {}
+_graph_lock = threading.Lock()
+
+def _graph(name):
+    """Returns the graph module for name, importing it once per process."""
+    module = _graph_modules.get(name)
+    if module is None:
+        with _graph_lock:
+            module = _graph_modules.get(name)
+            if module is None:
+                module = importlib.import_module(GRAPH_MODULES[name])
+                _graph_modules[name] = module
+    return module
+
+def warm_graphs(names=None):
+    """Imports and compiles the given graphs (all by default) ahead of traffic."""
+    for name in names or GRAPH_MODULES:
+        _graph(name)
+
+# ==================== METRICS ====================
+def _metrics_endpoint():
+    # The route pattern keeps label cardinality bounded (no raw paths)
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+@app.before_request
+def _start_request_timer():
+    g.metrics_start = time.perf_counter()
+    HTTP_INFLIGHT.labels(_metrics_endpoint()).inc()
+
+@app.after_request
+def _observe_request(response):
+    start = g.get("metrics_start")
+    if start is not None:
+        HTTP_LATENCY.labels(_metrics_endpoint(), str(response.status_code)).observe(
+            time.perf_counter() - start
+        )
+    return response
+
+@app.teardown_request
+def _finish_request(exc=None):
+    # Runs even when a handler raises; streamed responses end here too
+    if g.pop("metrics_start", None) is not None:
+        HTTP_INFLIGHT.labels(_metrics_endpoint()).dec()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition for this worker process."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+# ==================== DEADLINES ====================
+# Every Groq call made while serving a request is capped to the time left on
+# its deadline. Clients may tighten it with X-Request-Timeout-Ms, down to
+# MIN_CLIENT_DEADLINE_MS.
+ROUTE_DEADLINES = {
+    "/api/evaluate/batch": float(os.getenv("BATCH_DEADLINE_S", "120"))
+}
+MIN_CLIENT_DEADLINE_S = float(os.getenv("MIN_CLIENT_DEADLINE_MS", "1000")) / 1000
+
+def _request_budget():
+    budget = ROUTE_DEADLINES.get(_metrics_endpoint(), REQUEST_DEADLINE_S)
+    header = request.headers.get("X-Request-Timeout-Ms")
+    if header:
+        try:
+            budget = min(budget, max(float(header) / 1000, MIN_CLIENT_DEADLINE_S))
+        except ValueError:
+            pass
+    return budget
+
+@app.before_request
+def _open_deadline():
+    g.deadline_token = start_deadline(_request_budget())
+
+@app.teardown_request
+def _close_deadline(exc=None):
+    token = g.pop("deadline_token", None)
+    if token is not None:
+        end_deadline(token)
+
+# ==================== CONVERSATION LOG ====================
+# One structured record per conversation request (endpoint, status, latency,
+# tokens, verdict, ...). The hooks only queue it; redaction and file writes
+# happen on the background writer (utils/conversation_log.py).
+setup_logging()
+
+TURN_ROUTES = {
+    "/api/chat", "/api/chat/stream", "/api/turn", "/api/evaluate", "/api/evaluate/stream",
+    "/api/treatment", "/api/treatment/stream"
+}
+
+def _log_turn(**fields):
+    """Adds fields to this request's conversation record (if it has one)."""
+    record = g.get("turn_log")
+    if record is not None:
+        record.update(fields)
+
+@app.before_request
+def _open_turn_log():
+    if conversation_log.ENABLED and request.method == "POST" and _metrics_endpoint() in TURN_ROUTES:
+        from utils.llm_client import start_usage_scope
+        g.turn_log = {}
+        g.turn_start = time.perf_counter()
+        g.turn_usage, g.turn_usage_token = start_usage_scope()
+
+@app.after_request
+def _record_turn_status(response):
+    _log_turn(status=response.status_code)
+    return response
+
+@app.teardown_request
+def _write_turn_log(exc=None):
+    # Streamed responses end here too, so their latency covers the whole stream
+    record = g.pop("turn_log", None)
+    if record is None:
+        return
+    from utils.llm_client import end_usage_scope
+    end_usage_scope(g.pop("turn_usage_token"))
+    usage = g.pop("turn_usage")
+    if isinstance(exc, GeneratorExit):
+        record.setdefault("error", "client disconnected")
+    elif exc is not None:
+        record.setdefault("error", str(exc))
+    log_turn(
+        endpoint=_metrics_endpoint(),
+        latency_ms=round((time.perf_counter() - g.pop("turn_start")) * 1000, 1),
+        llm_calls=usage.calls,
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        **record
+    )
+
+# ==================== SESSION HELPERS ====================
+def _open_session(body):
+    """
+    Resolves the session for a session-mode request.
+
+    Session mode is selected by sending "session_id" (continue a session) or
+    "session": true (start one). A new session may be seeded from a legacy
+    "messages" array, which lets clients recover from an expired session,
+    and picks its patient case with "case_id".
+    Returns (session_id, session, error); all None in legacy mode.
+    """
+    session_id = body.get("session_id")
+    if session_id:
+        session = get_session(session_id)
+        if session is None:
+            return None, None, ({"error": "Unknown or expired session_id"}, 404)
+        return session_id, session, None
+
+    if body.get("session"):
+        case_id = str(body.get("case_id") or DEFAULT_CASE)
+        if case_id not in get_library():
+            return None, None, _unknown_case(case_id)
+        session_id = create_session(Transcript.from_json(body.get("messages", [])), case_id=case_id)
+        return session_id, get_session(session_id), None
+
+    return None, None, None
+
+def _requester(session_id=None):
+    """
+    Who is asking, for single-flight keys: the session, else the client's
+    Idempotency-Key header. None when neither is sent, and the call is not
+    coalesced: students behind one NAT can share an address and browser.
+    """
+    if session_id:
+        return f"session:{session_id}"
+    key = request.headers.get("Idempotency-Key")
+    if key:
+        return f"key:{key}"
+    return None
+
+def _unknown_case(case_id):
+    return {"error": f"Unknown case_id: {case_id}"}, 400
+
+def _read_body():
+    try:
+        return request.get_json(force=True), None
+    except Exception:
+        return None, ({"error": "Invalid JSON body"}, 400)
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_turn(turn, stream_reply, complete_turn, error_prefix):
+    """Streams reply tokens as Server-Sent Events, finishing with the full response payload."""
+    def generate():
+        try:
+            for kind, value in stream_reply(turn["state"]):
+                if kind == "token":
+                    yield _sse("token", {"token": value})
+                else:
+                    payload, _ = complete_turn(turn, value)
+                    yield _sse("done", payload)
+        except Exception as e:
+            _log_turn(error=str(e))
+            yield _sse("error", {"error": f"{error_prefix}: {str(e)}"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _stream_payload(payload, reply_key):
+    """Sends an already complete payload (e.g. a greeting) over the SSE protocol."""
+    def generate():
+        yield _sse("token", {"token": payload[reply_key]})
+        yield _sse("done", payload)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
+
+# ==================== CHAT ENDPOINT ====================
+def _prepare_chat_turn(body):
+    """
+    Builds the patient graph input for a chat request.
+    Returns (turn, early) where early is a (payload, status) pair when the
+    request is answered without the graph (greeting or validation error).
+    """
+    user_message = body.get("user_message", "").strip()
+    messages = body.get("messages", [])
+
+    session_id, session, error = _open_session(body)
+    if error:
+        return None, error
+
+    # Delta protocol: the transcript lives server-side, only the new reply is returned
+    if session is not None:
+        if not user_message:
+            if session["messages"]:
+                return None, ({"error": "user_message is required"}, 400)
+            update_session(session_id, messages=session["messages"].add(PATIENT, CHAT_GREETING))
+            return None, ({
+                "reply": CHAT_GREETING,
+                "conversation_end": False,
+                "session_id": session_id,
+                "case_id": session.get("case_id") or DEFAULT_CASE
+            }, 200)
+
+        return {
+            "session_id": session_id,
+            "state": {
+                "messages": session["messages"].add(DOCTOR, user_message),
+                "revealed_symptoms": session["revealed_symptoms"],
+                "conversation_end": session["conversation_end"],
+                "case_id": session.get("case_id") or DEFAULT_CASE,
+                "use_cache": body.get("cache", True) is not False,
+                **history_fields(session)
+            }
+        }, None
+
+    # First message → greeting
+    if not user_message and not messages:
+        return None, ({
+            "reply": CHAT_GREETING,
+            "conversation_end": False,
+            "messages": [{"role": "patient", "content": CHAT_GREETING}]
+        }, 200)
+
+    # Build the graph transcript
+    transcript = Transcript.from_json(messages)
+
+    if user_message:
+        transcript = transcript.add(DOCTOR, user_message)
+
+    case_id = str(body.get("case_id") or DEFAULT_CASE)
+    if case_id not in get_library():
+        return None, _unknown_case(case_id)
+
+    # Revealed symptoms are carried by the client so they accumulate across turns
+    revealed_symptoms = body.get("revealed_symptoms", [])
+    if not isinstance(revealed_symptoms, list):
+        revealed_symptoms = []
+
+    return {
+        "session_id": None,
+        "state": {
+            "messages": transcript,
+            "revealed_symptoms": [str(s) for s in revealed_symptoms],
+            "conversation_end": False,
+            "case_id": case_id,
+            "use_cache": body.get("cache", True) is not False,
+            **history_fields(body)
+        }
+    }, None
+
+def _complete_chat_turn(turn, new_state):
+    reply = new_state["messages"].last()
+    conversation_end = new_state.get("conversation_end", False)
+    _log_turn(
+        session_id=turn["session_id"],
+        case_id=turn["state"].get("case_id"),
+        doctor_message=new_state["messages"].last(DOCTOR),
+        reply=reply,
+        conversation_end=conversation_end,
+        revealed_symptoms=len(new_state.get("revealed_symptoms", []))
+    )
+
+    session_id = turn["session_id"]
+    if session_id:
+        update_session(
+            session_id,
+            messages=new_state["messages"],
+            revealed_symptoms=new_state.get("revealed_symptoms", []),
+            conversation_end=conversation_end,
+            **history_fields(new_state)
+        )
+        return {
+            "reply": reply,
+            "conversation_end": conversation_end,
+            "session_id": session_id
+        }, 200
+
+    return echo_history({
+        "reply": reply,
+        "conversation_end": conversation_end,
+        "revealed_symptoms": new_state.get("revealed_symptoms", []),
+        "messages": new_state["messages"].to_json()
+    }, new_state), 200
+
+@app.route('/api/chat', methods=['POST', 'OPTIONS'])
+def chat():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    body, error = _read_body()
+    if error:
+        return jsonify(error[0]), error[1]
+
+    turn, early = _prepare_chat_turn(body)
+    if early:
+        return jsonify(early[0]), early[1]
+
+    try:
+        new_state = flights.invoke("patient", _graph("patient").patient_graph, turn["state"],
+                                   _requester(turn["session_id"]))
+    except Exception as e:
+        _log_turn(error=str(e))
+        return jsonify({"error": f"Graph invocation failed: {str(e)}"}), 500
+
+    payload, status = _complete_chat_turn(turn, new_state)
+    return jsonify(payload), status
+
+@app.route('/api/chat/stream', methods=['POST', 'OPTIONS'])
+def chat_stream():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    body, error = _read_body()
+    if error:
+        return jsonify(error[0]), error[1]
+
+    turn, early = _prepare_chat_turn(body)
+    if early:
+        if early[1] != 200:
+            return jsonify(early[0]), early[1]
+        return _stream_payload(early[0], "reply")
+
+    return _stream_turn(turn, _graph("patient").stream_patient_reply, _complete_chat_turn,
+                        "Graph invocation failed")
+
+# ==================== CASES ENDPOINT ====================
+@app.route('/api/cases', methods=['GET'])
+def cases():
+    """Patient cases a session can be started with ("case_id")."""
+    library = get_library()
+    return jsonify({
+        "default": DEFAULT_CASE,
+        "cases": [
+            {"case_id": case.case_id, "title": case.title, "symptoms": list(case.symptoms)}
+            for case in map(library.get, library.ids())
+        ]
+    }), 200
+
+# ==================== TURN ENDPOINT ====================
+@app.route('/api/turn', methods=['POST', 'OPTIONS'])
+def turn_route():
+    """
+    One doctor message, answered and graded together: the patient reply and
+    the evaluator verdict come from parallel branches of turn_graph, so the
+    turn costs max(patient, evaluator) instead of their sum. Accepts the same
+    body as /api/chat ("cache": false skips both the reply and verdict
+    caches); the response adds "evaluation".
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    body, error = _read_body()
+    if error:
+        return jsonify(error[0]), error[1]
+
+    turn, early = _prepare_chat_turn(body)
+    if early:
+        return jsonify(early[0]), early[1]
+
+    turn_module = _graph("turn")
+    try:
+        new_state = flights.invoke("turn", turn_module.turn_graph, turn_module.build_turn_state(
+            turn["state"], use_cache=body.get("cache", True) is not False
+        ), _requester(turn["session_id"]))
+    except Exception as e:
+        _log_turn(error=str(e))
+        return jsonify({"error": f"Graph invocation failed: {str(e)}"}), 500
+
+    payload, status = _complete_chat_turn(turn, new_state)
+    payload["evaluation"] = new_state.get("evaluation", {})
+    _log_turn(verdict=payload["evaluation"].get("verdict"))
+    return jsonify(payload), status
+
+# ==================== EVALUATE ENDPOINT ====================
+def _evaluator_state(body):
+    """Evaluator graph input for a request body; returns (state, error)."""
+    doctor_message = body.get("doctor_message", "").strip()
+    if not doctor_message:
+        return None, ({"error": "doctor_message is required"}, 400)
+    return {
+        "doctor_message": doctor_message,
+        "patient_history": body.get("patient_history", []),
+        "evaluation": {},
+        "use_cache": body.get("cache", True) is not False
+    }, None
+
+@app.route('/api/evaluate', methods=['POST', 'OPTIONS'])
+def evaluate():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    body, error = _read_body()
+    if error:
+        return jsonify(error[0]), error[1]
+
+    state, error = _evaluator_state(body)
+    if error:
+        return jsonify(error[0]), error[1]
+
+    evaluator = _graph("evaluator")
+    try:
+        result = flights.invoke("evaluator", evaluator.evaluator_graph, state,
+                                _requester(body.get("session_id")))
+    except DeadlineExceeded as e:
+        # Gave up waiting on a coalesced evaluation: answer as the node would
+        result = {"evaluation": evaluator.error_evaluation(e)}
+    except Exception as e:
+        _log_turn(error=str(e))
+        return jsonify({"error": f"Evaluation failed: {str(e)}"}), 500
+
+    evaluation = result.get("evaluation", {})
+    _log_turn(doctor_message=state["doctor_message"], verdict=evaluation.get("verdict"),
+              verdict_source=evaluation.get("source", "llm"))
+    return jsonify({
+        "evaluation": evaluation
+    }), 200
+
+@app.route('/api/evaluate/stream', methods=['POST', 'OPTIONS'])
+def evaluate_stream():
+    """
+    Server-Sent Events: "verdict" as soon as the model has produced it (for
+    the UI badge), "field" for reason/suggestion as they complete, then
+    "done" with the full evaluation.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    body, error = _read_body()
+    if error:
+        return jsonify(error[0]), error[1]
+
+    state, error = _evaluator_state(body)
+    if error:
+        return jsonify(error[0]), error[1]
+
+    stream_evaluation = _graph("evaluator").stream_evaluation
+
+    def generate():
+        try:
+            for kind, value in stream_evaluation(state):
+                if kind == "verdict":
+                    yield _sse("verdict", {"verdict": value})
+                elif kind == "field":
+                    yield _sse("field", {"name": value[0], "value": value[1]})
+                else:
+                    _log_turn(doctor_message=state["doctor_message"], verdict=value.get("verdict"),
+                              verdict_source=value.get("source", "llm"))
+                    yield _sse("done", {"evaluation": value})
+        except Exception as e:
+            _log_turn(error=str(e))
+            yield _sse("error", {"error": f"Evaluation failed: {str(e)}"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/api/evaluate/batch', methods=['POST', 'OPTIONS'])
+def evaluate_batch_route():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        body = request.get_json(force=True)
+    except Exception:
+        return jsonify({"error": "Invalid JSON body"}), 400
+
+    payload, status = _graph("evaluator").batch_request(body)
+    return jsonify(payload), status
+
+# ==================== TREATMENT ENDPOINT ====================
+def _prepare_treatment_turn(body):
+    """Treatment counterpart of _prepare_chat_turn."""
+    prescription = body.get("prescription", "").strip()
+    messages = body.get("messages", [])
+    clarification_used = body.get("clarification_used", False)
+
+    session_id, session, error = _open_session(body)
+    if error:
+        return None, error
+
+    # Delta protocol; the session is closed once the patient accepts
+    if session is not None:
+        if not prescription:
+            if session["messages"]:
+                return None, ({"error": "prescription is required"}, 400)
+            update_session(session_id, messages=session["messages"].add(PATIENT, TREATMENT_GREETING))
+            return None, ({
+                "patient_reply": TREATMENT_GREETING,
+                "conversation_end": False,
+                "clarification_used": False,
+                "session_id": session_id
+            }, 200)
+
+        # The session may carry the consultation; the prescription starts here
+        treatment_start = session.get("treatment_start")
+        if treatment_start is None:
+            treatment_start = len(session["messages"])
+
+        return {
+            "session_id": session_id,
+            "state": {
+                "messages": session["messages"].add(DOCTOR, prescription),
+                "clarification_used": session["clarification_used"],
+                "conversation_end": False,
+                "treatment_start": treatment_start,
+                **history_fields(session)
+            }
+        }, None
+
+    if not prescription and not messages:
+        return None, ({
+            "patient_reply": TREATMENT_GREETING,
+            "conversation_end": False,
+            "clarification_used": False,
+            "messages": [{"role": "patient", "content": TREATMENT_GREETING}]
+        }, 200)
+
+    transcript = Transcript.from_json(messages)
+
+    # Echoed back by the response; without it the graph infers the prescription
+    treatment_start = body.get("treatment_start")
+    if not isinstance(treatment_start, int) or isinstance(treatment_start, bool):
+        treatment_start = len(transcript) if prescription and not clarification_used else None
+
+    if prescription:
+        transcript = transcript.add(DOCTOR, prescription)
+
+    return {
+        "session_id": None,
+        "state": {
+            "messages": transcript,
+            "clarification_used": clarification_used,
+            "conversation_end": False,
+            "treatment_start": treatment_start,
+            **history_fields(body)
+        }
+    }, None
+
+def _complete_treatment_turn(turn, new_state):
+    reply = new_state["messages"].last()
+    conversation_end = new_state.get("conversation_end", False)
+    clarification_used = new_state.get("clarification_used", False)
+    _log_turn(
+        session_id=turn["session_id"],
+        doctor_message=new_state["messages"].last(DOCTOR),
+        reply=reply,
+        conversation_end=conversation_end,
+        clarification_used=clarification_used
+    )
+
+    session_id = turn["session_id"]
+    if session_id:
+        if conversation_end:
+            reset_session(session_id)
+        else:
+            update_session(
+                session_id,
+                messages=new_state["messages"],
+                clarification_used=clarification_used,
+                treatment_start=new_state.get("treatment_start"),
+                **history_fields(new_state)
+            )
+        return {
+            "patient_reply": reply,
+            "conversation_end": conversation_end,
+            "clarification_used": clarification_used,
+            "session_id": session_id
+        }, 200
+
+    return echo_history({
+        "patient_reply": reply,
+        "conversation_end": conversation_end,
+        "clarification_used": clarification_used,
+        "treatment_start": new_state.get("treatment_start"),
+        "messages": new_state["messages"].to_json()
+    }, new_state), 200
+
+@app.route('/api/treatment', methods=['POST', 'OPTIONS'])
+def treatment():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    body, error = _read_body()
+    if error:
+        return jsonify(error[0]), error[1]
+
+    turn, early = _prepare_treatment_turn(body)
+    if early:
+        return jsonify(early[0]), early[1]
+
+    try:
+        new_state = flights.invoke("treatment", _graph("treatment").treatment_graph, turn["state"],
+                                   _requester(turn["session_id"]))
+    except Exception as e:
+        _log_turn(error=str(e))
+        return jsonify({"error": f"Treatment graph error: {str(e)}"}), 500
+
+    payload, status = _complete_treatment_turn(turn, new_state)
+    return jsonify(payload), status
+
+@app.route('/api/treatment/stream', methods=['POST', 'OPTIONS'])
+def treatment_stream():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    body, error = _read_body()
+    if error:
+        return jsonify(error[0]), error[1]
+
+    turn, early = _prepare_treatment_turn(body)
+    if early:
+        if early[1] != 200:
+            return jsonify(early[0]), early[1]
+        return _stream_payload(early[0], "patient_reply")
+
+    return _stream_turn(turn, _graph("treatment").stream_treatment_reply, _complete_treatment_turn,
+                        "Treatment graph error")
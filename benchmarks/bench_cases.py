@@ -0,0 +1,75 @@
+# benchmarks/bench_cases.py
+"""
+Case library cost as it grows: library startup, first use of a case
+(read + compile) and per-turn prompt assembly, for 10/100/1000 case files
+generated from the shipped ones.
+
+    python -m benchmarks.bench_cases --sizes 10 100 1000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.case_library import CASES_DIR, CaseLibrary
+
+
+def make_library(directory, size):
+    templates = []
+    for name in sorted(os.listdir(CASES_DIR)):
+        with open(os.path.join(CASES_DIR, name), encoding="utf-8") as f:
+            templates.append(json.load(f))
+    for i in range(size):
+        spec = dict(templates[i % len(templates)], title=f"Case {i}")
+        with open(os.path.join(directory, f"case_{i:04d}.json"), "w", encoding="utf-8") as f:
+            json.dump(spec, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--turns", type=int, default=2000, help="timed prompt assemblies per size")
+    args = parser.parse_args()
+
+    from graph.patient_graph import build_patient_request
+    from utils import case_library
+    from utils.history import CompactedHistory
+
+    history = CompactedHistory([{"role": "user", "content": "How long have you had them?"}], "", 0)
+    print(f"{'cases':>6} | {'startup ms':>10} {'first use ms':>12} {'prompt us/turn':>14}")
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix="cases_")
+        try:
+            make_library(directory, size)
+
+            start = time.perf_counter()
+            library = CaseLibrary(directory)
+            startup_ms = (time.perf_counter() - start) * 1000
+
+            ids = library.ids()
+            start = time.perf_counter()
+            library.get(ids[0])
+            first_use_ms = (time.perf_counter() - start) * 1000
+
+            case_library._library = library
+            for case_id in ids:
+                library.get(case_id)
+            states = [{"case_id": random.choice(ids), "conversation_end": False} for _ in range(args.turns)]
+            start = time.perf_counter()
+            for state in states:
+                build_patient_request(state, history)
+            per_turn_us = (time.perf_counter() - start) / args.turns * 1e6
+
+            print(f"{size:>6} | {startup_ms:>10.2f} {first_use_ms:>12.2f} {per_turn_us:>14.2f}")
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/bench_eval_stream.py
+"""
+Evaluator latency: the full non-streamed call vs. time to the streamed
+verdict (what the UI badge waits for) and to the complete streamed result,
+against the local fake upstream generating at --tokens-per-s.
+
+    python -m benchmarks.bench_eval_stream --calls 20 --latency-ms 250 --tokens-per-s 60
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import add_upstream_arguments, server_from_args
+from benchmarks.load_test import percentile
+
+HISTORY = ["Patient: I've been having these headaches for about a week now."]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=20)
+    add_upstream_arguments(parser, latency_ms=250.0)
+    parser.set_defaults(tokens_per_s=60.0)
+    args = parser.parse_args()
+
+    server = server_from_args(args).start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+
+    from graph.evaluator_graph import evaluator_node, stream_evaluation
+
+    def state(i):
+        return {"doctor_message": f"Does anything make the pain worse? ({i})",
+                "patient_history": HISTORY, "evaluation": {}, "use_cache": False}
+
+    full, to_verdict, to_done = [], [], []
+    for i in range(args.calls):
+        start = time.perf_counter()
+        evaluator_node(state(i))
+        full.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for kind, _ in stream_evaluation(state(i)):
+            if kind == "verdict":
+                to_verdict.append(time.perf_counter() - start)
+        to_done.append(time.perf_counter() - start)
+
+    print(f"{'':<22} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, samples in (("non-streamed", full), ("streamed: verdict", to_verdict),
+                          ("streamed: complete", to_done)):
+        samples.sort()
+        print(f"{name:<22} {percentile(samples, 50) * 1000:>8.0f} {percentile(samples, 95) * 1000:>8.0f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/bench_fast_path.py
+"""
+Coverage and LLM agreement of the evaluator fast path on a replay corpus.
+
+Each JSONL line is {"doctor_message", "patient_history", "llm_verdict"}.
+Reports the share of calls the fast path answers locally, how often those
+answers match the LLM verdict, and the per-call cost. --record re-labels the
+corpus with the live evaluator (fast path off, GROQ_API_KEY required).
+
+    python -m benchmarks.bench_fast_path benchmarks/data/eval_replay.jsonl
+    python -m benchmarks.bench_fast_path corpus.jsonl --record --out labelled.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "eval_replay.jsonl")
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def record(items, out):
+    """Fills llm_verdict from the live evaluator with the fast path disabled."""
+    from utils import eval_fastpath
+    from graph.evaluator_graph import evaluator_graph
+
+    eval_fastpath.ENABLED = False
+    with open(out, "w", encoding="utf-8") as f:
+        for item in items:
+            result = evaluator_graph.invoke({
+                "doctor_message": item["doctor_message"],
+                "patient_history": item["patient_history"],
+                "evaluation": {},
+                "use_cache": False
+            })
+            item["llm_verdict"] = result["evaluation"].get("verdict")
+            f.write(json.dumps(item) + "\n")
+    print(f"Recorded {len(items)} verdicts to {out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    parser.add_argument("--record", action="store_true", help="re-label with the live LLM")
+    parser.add_argument("--out", help="output path for --record")
+    parser.add_argument("--repeat", type=int, default=20, help="timing passes over the corpus")
+    args = parser.parse_args()
+
+    items = load(args.corpus)
+    if args.record:
+        record(items, args.out or args.corpus)
+        return
+
+    from utils.eval_fastpath import fast_verdict
+
+    handled, agree = 0, 0
+    confusion = Counter()
+    for item in items:
+        verdict = fast_verdict(item["doctor_message"], item["patient_history"])
+        if verdict is None:
+            continue
+        handled += 1
+        agree += verdict["verdict"] == item["llm_verdict"]
+        confusion[(verdict["verdict"], item["llm_verdict"])] += 1
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for item in items:
+            fast_verdict(item["doctor_message"], item["patient_history"])
+    per_call_us = (time.perf_counter() - start) / (args.repeat * len(items)) * 1e6
+
+    by_label = Counter(item["llm_verdict"] for item in items)
+    print(json.dumps({
+        "calls": len(items),
+        "llm_verdicts": dict(by_label),
+        "fast_path_handled": handled,
+        "fast_path_share": round(handled / len(items), 3),
+        "agreement_with_llm": round(agree / handled, 3) if handled else None,
+        "confusion": {f"{fast} (llm {llm})": n for (fast, llm), n in sorted(confusion.items())},
+        "per_call_us": round(per_call_us, 1)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
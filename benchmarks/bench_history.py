@@ -0,0 +1,83 @@
+# benchmarks/bench_history.py
+"""
+Prompt tokens and latency vs. turn number, with and without history compaction.
+
+Drives one long consultation through patient_graph against the local fake
+upstream, whose latency grows with prompt size like a real model's prefill.
+
+    python -m benchmarks.bench_history --turns 40 --budget 600
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import FakeGroqServer
+
+QUESTIONS = [
+    "What brings you here today?",
+    "How long have you had these headaches?",
+    "Where exactly does it hurt, front or back of the head?",
+    "Does anything make the pain better or worse?",
+    "Have you noticed any other symptoms?",
+    "How are you sleeping at night these days?",
+    "Any changes in appetite or nausea after meals?",
+    "Are you taking any medication for it at the moment?",
+]
+
+
+def run_consult(patient_graph, server, turns, budget):
+    import utils.history as history
+    from graph.patient_graph import PATIENT_MODEL
+    from utils.transcript import DOCTOR, Transcript
+
+    history.HISTORY_TOKEN_BUDGET = budget
+    state = {"messages": Transcript(), "revealed_symptoms": [], "conversation_end": False}
+    rows = []
+    for turn in range(1, turns + 1):
+        question = QUESTIONS[(turn - 1) % len(QUESTIONS)]
+        state = {**state, "messages": state["messages"].add(DOCTOR, question)}
+
+        first_call = len(server.calls)
+        start = time.perf_counter()
+        state = patient_graph.invoke(state)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        calls = server.calls[first_call:]
+        prompt_tokens = sum(t for model, t in calls if model == PATIENT_MODEL)
+        summarized = any(model != PATIENT_MODEL for model, _ in calls)
+        rows.append((turn, prompt_tokens, latency_ms, summarized))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=600,
+                        help="HISTORY_TOKEN_BUDGET for the compacted run")
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--prompt-ms-per-1k", type=float, default=250.0)
+    args = parser.parse_args()
+
+    server = FakeGroqServer(latency_ms=args.latency_ms,
+                            prompt_ms_per_1k=args.prompt_ms_per_1k).start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+
+    from graph.patient_graph import patient_graph
+
+    full = run_consult(patient_graph, server, args.turns, budget=10 ** 9)
+    compacted = run_consult(patient_graph, server, args.turns, budget=args.budget)
+
+    print(f"{'turn':>4} | {'tokens full':>11} {'ms full':>8} | {'tokens compact':>14} {'ms compact':>10}")
+    for (turn, t_full, ms_full, _), (_, t_cmp, ms_cmp, summarized) in zip(full, compacted):
+        mark = "  (summary updated)" if summarized else ""
+        print(f"{turn:>4} | {t_full:>11} {ms_full:>8.0f} | {t_cmp:>14} {ms_cmp:>10.0f}{mark}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_llm_client.py
+"""
+Concurrent-turn throughput: thread-per-turn sync graphs vs. ainvoke on the
+shared pooled async client, both against the local fake upstream.
+
+    python -m benchmarks.bench_llm_client --turns 200 --threads 8 --latency-ms 300
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import FakeGroqServer
+
+
+def _state(i):
+    from utils.transcript import DOCTOR, Transcript
+    return {
+        "messages": Transcript().add(DOCTOR, f"What brings you here today? ({i})"),
+        "revealed_symptoms": [],
+        "conversation_end": False
+    }
+
+
+def run_sync(graph, turns, threads):
+    """Before: every turn pins a worker thread for the whole upstream round trip."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: graph.invoke(_state(i)), range(turns)))
+    return time.perf_counter() - start
+
+
+async def run_async(graph, turns):
+    """After: all turns in flight on one thread, bounded by the connection pool."""
+    start = time.perf_counter()
+    await asyncio.gather(*(graph.ainvoke(_state(i)) for i in range(turns)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8,
+                        help="worker threads for the sync baseline (e.g. Flask/gunicorn threads)")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    server = FakeGroqServer(latency_ms=args.latency_ms).start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+
+    from graph.patient_graph import patient_graph
+
+    sync_s = run_sync(patient_graph, args.turns, args.threads)
+    async_s = asyncio.run(run_async(patient_graph, args.turns))
+
+    print(f"upstream latency {args.latency_ms:.0f} ms, {args.turns} turns")
+    print(f"  sync invoke, {args.threads} threads : {sync_s:6.2f} s  {args.turns / sync_s:7.1f} turns/s")
+    print(f"  ainvoke, shared pool       : {async_s:6.2f} s  {args.turns / async_s:7.1f} turns/s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
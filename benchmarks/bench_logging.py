@@ -0,0 +1,122 @@
+# benchmarks/bench_logging.py
+"""
+Cost of conversation logging on the request path: the per-record cost of
+log_turn() (a queue put) against writing the same record synchronously,
+turn latency through /api/chat with logging off and on, and drop counting
+when the queue is too small for a burst.
+
+    python -m benchmarks.bench_logging --records 20000 --turns 200
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import add_upstream_arguments, server_from_args
+from benchmarks.load_test import HISTORY, percentile
+
+RECORD = {
+    "endpoint": "/api/chat", "status": 200, "latency_ms": 512.3, "session_id": "0f3c9a1e",
+    "case_id": "migraine", "llm_calls": 1, "prompt_tokens": 412, "completion_tokens": 38,
+    "doctor_message": "Hello, my name is Dr. Patel. Can you call me back on 555-123-4567?",
+    "reply": "I've been having these headaches for about a week now.", "conversation_end": False
+}
+
+
+def per_record_cost(records, directory):
+    from utils.conversation_log import JSONLWriter, redact_record
+
+    path = os.path.join(directory, "sync.jsonl")
+    start = time.perf_counter()
+    with open(path, "a", encoding="utf-8") as f:
+        for _ in range(records):
+            f.write(json.dumps(redact_record(RECORD)) + "\n")
+            f.flush()
+    sync = (time.perf_counter() - start) / records
+
+    writer = JSONLWriter(directory=directory, queue_size=records + 1)
+    start = time.perf_counter()
+    for _ in range(records):
+        writer.put(dict(RECORD))
+    queued = (time.perf_counter() - start) / records
+    writer.flush(30.0)
+    return sync, queued
+
+
+def turns(client, count, concurrency):
+    latencies = []
+
+    def post(i):
+        start = time.perf_counter()
+        client.post("/api/chat", json={"user_message": f"Does anything make it worse? ({i})",
+                                       "messages": HISTORY})
+        latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(post, range(count)))
+    return sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=20000, help="records for the per-record cost")
+    parser.add_argument("--turns", type=int, default=200, help="/api/chat requests per run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=3, help="alternating off/on runs")
+    parser.add_argument("--burst", type=int, default=5000, help="records put at once into a small queue")
+    parser.add_argument("--small-queue", type=int, default=100)
+    add_upstream_arguments(parser, latency_ms=50.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_logging_")
+    os.environ["CONVERSATION_LOG_DIR"] = directory
+    server = server_from_args(args).start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+
+    from utils import conversation_log
+    from utils.conversation_log import LOG_DROPPED, JSONLWriter
+
+    sync, queued = per_record_cost(args.records, directory)
+    print(f"per record: synchronous write {sync * 1e6:.1f} us, log_turn queue put {queued * 1e6:.1f} us")
+
+    from api.index import app, warm_graphs
+
+    warm_graphs()
+    client = app.test_client()
+    turns(client, args.concurrency * 2, args.concurrency)  # warm-up, not reported
+    latencies = {False: [], True: []}
+    for _ in range(args.rounds):
+        # Alternating runs, so drift on a shared machine hits both sides
+        for enabled in (False, True):
+            conversation_log.ENABLED = enabled
+            latencies[enabled] += turns(client, args.turns, args.concurrency)
+    print(f"{'logging':<8} {'p50 ms':>8} {'p95 ms':>8}")
+    for enabled in (False, True):
+        runs = sorted(latencies[enabled])
+        print(f"{'on' if enabled else 'off':<8} {percentile(runs, 50) * 1000:>8.1f} "
+              f"{percentile(runs, 95) * 1000:>8.1f}")
+    conversation_log.get_writer().flush(30.0)
+
+    small = JSONLWriter(directory=directory, prefix="burst", queue_size=args.small_queue)
+    dropped = LOG_DROPPED.labels("burst")
+    start = time.perf_counter()
+    for _ in range(args.burst):
+        small.put(dict(RECORD))
+    elapsed = time.perf_counter() - start
+    small.flush(30.0)
+    print(f"burst of {args.burst} into a queue of {args.small_queue}: {dropped.value:.0f} dropped, "
+          f"caller spent {elapsed * 1000:.1f} ms")
+
+    server.shutdown()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
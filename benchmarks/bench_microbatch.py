@@ -0,0 +1,84 @@
+# benchmarks/bench_microbatch.py
+"""
+Evaluator micro-batching under classroom load: --questions evaluator calls
+arrive spread over --spread-ms, as when a class submits at once. Reports
+upstream calls, prompt tokens sent and latency per batching window, against
+the local fake upstream.
+
+    python -m benchmarks.bench_microbatch --questions 64 --windows 0 10 25 50 --size 8
+"""
+import argparse
+import contextvars
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import add_upstream_arguments, server_from_args
+from benchmarks.load_test import percentile
+
+HISTORY = [
+    "Patient: Hello! I'm ready to discuss my symptoms with you.",
+    "Doctor: What brings you here today?",
+    "Patient: I've been having these headaches for about a week now.",
+]
+
+
+def run(questions, spread_s, seed):
+    from graph.evaluator_graph import evaluator_node
+    from utils.llm_client import usage_scope
+
+    rng = random.Random(seed)
+    arrivals = sorted(rng.uniform(0, spread_s) for _ in range(questions))
+    latencies = []
+
+    def ask(i, at):
+        time.sleep(max(0.0, at - (time.perf_counter() - start)))
+        begin = time.perf_counter()
+        evaluator_node({"doctor_message": f"Does anything make the headaches worse? ({i})",
+                        "patient_history": HISTORY, "evaluation": {}, "use_cache": False})
+        latencies.append(time.perf_counter() - begin)
+
+    with usage_scope() as usage:
+        with ThreadPoolExecutor(max_workers=questions) as pool:
+            start = time.perf_counter()
+            # Copies of this context, so usage_scope counts every call
+            futures = [pool.submit(contextvars.copy_context().run, ask, i, at) for i, at in enumerate(arrivals)]
+            for future in futures:
+                future.result()
+    return sorted(latencies), usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--questions", type=int, default=64)
+    parser.add_argument("--spread-ms", type=float, default=1000.0, help="arrivals spread over this long")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 10, 25, 50], help="batching windows in ms")
+    parser.add_argument("--size", type=int, default=8, help="max questions per batch")
+    add_upstream_arguments(parser, latency_ms=300.0)
+    parser.set_defaults(tokens_per_s=250.0, seed=7)
+    args = parser.parse_args()
+
+    server = server_from_args(args).start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+    os.environ["EVAL_FAST_PATH"] = "0"
+
+    from graph import evaluator_graph
+    from utils.micro_batch import MicroBatcher
+
+    print(f"{args.questions} questions over {args.spread_ms:.0f} ms, batches of up to {args.size}")
+    print(f"{'window ms':>9} | {'calls':>5} {'prompt tok':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for window in args.windows:
+        evaluator_graph.micro_batcher = MicroBatcher(evaluator_graph.run_microbatch, window / 1000, args.size)
+        latencies, usage = run(args.questions, args.spread_ms / 1000, args.seed)
+        print(f"{window:>9.0f} | {usage.calls:>5} {usage.prompt_tokens:>10} "
+              f"{percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 95) * 1000:>8.0f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
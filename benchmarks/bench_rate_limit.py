@@ -0,0 +1,123 @@
+# benchmarks/bench_rate_limit.py
+"""
+Mixed chat + evaluation load against a fake upstream that enforces a
+requests-per-minute limit, with and without the shared token-bucket
+scheduler. Reports upstream 429s, fallback replies and chat latency.
+
+    python -m benchmarks.bench_rate_limit --duration 15 --rpm 600 \\
+        --chat-threads 4 --eval-threads 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import FakeGroqServer
+from benchmarks.load_test import percentile
+
+
+def drive(duration, chat_threads, eval_threads, deadline_s):
+    """Runs both traffic classes for `duration`; returns {kind: [(latency_s, fallback)]}."""
+    from utils.transcript import DOCTOR, Transcript
+    from graph.evaluator_graph import evaluator_graph
+    from graph.patient_graph import patient_graph, FALLBACK_REPLY
+    from utils.resilience import deadline
+
+    results = defaultdict(list)
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def chat():
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            with deadline(deadline_s):
+                state = patient_graph.invoke({"messages": Transcript().add(DOCTOR, "Any fever?"),
+                                              "revealed_symptoms": [], "conversation_end": False})
+            fallback = state["messages"].last() == FALLBACK_REPLY
+            with lock:
+                results["chat"].append((time.perf_counter() - start, fallback))
+
+    def evaluate():
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            with deadline(deadline_s):
+                state = evaluator_graph.invoke({"doctor_message": "Any fever?", "patient_history": [],
+                                                "use_cache": False})
+            fallback = state["evaluation"]["verdict"] == "ERROR"
+            with lock:
+                results["evaluate"].append((time.perf_counter() - start, fallback))
+
+    threads = ([threading.Thread(target=chat) for _ in range(chat_threads)]
+               + [threading.Thread(target=evaluate) for _ in range(eval_threads)])
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def reset(server):
+    from utils import resilience
+    server._requests_left, server._tokens_left = server.rpm_limit, server.tpm_limit
+    server._bucket_at = time.monotonic()
+    server.rate_limited = 0
+    server.calls.clear()
+    resilience._breakers.clear()
+
+
+def report(label, server, results, duration):
+    print(f"\n{label}: upstream calls {len(server.calls)}, 429s {server.rate_limited} "
+          f"({server.rate_limited / max(len(server.calls), 1):.0%})")
+    print(f"{'class':<10} {'turns':>6} {'turns/s':>8} {'fallbacks':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for kind, samples in sorted(results.items()):
+        latencies = sorted(s for s, _ in samples)
+        fallbacks = sum(1 for _, f in samples if f)
+        print(f"{kind:<10} {len(samples):>6} {len(samples) / duration:>8.1f} "
+              f"{fallbacks / max(len(samples), 1):>10.0%} {percentile(latencies, 50) * 1000:>8.0f} "
+              f"{percentile(latencies, 95) * 1000:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--rpm", type=float, default=600.0, help="upstream requests-per-minute limit")
+    parser.add_argument("--chat-threads", type=int, default=4)
+    parser.add_argument("--eval-threads", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--deadline-s", type=float, default=10.0, help="per-turn request deadline")
+    args = parser.parse_args()
+
+    server = FakeGroqServer(latency_ms=args.latency_ms, rpm_limit=args.rpm).start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+    os.environ.setdefault("GROQ_HEDGE", "0")
+
+    from utils.rate_limiter import TokenBucketScheduler, set_scheduler
+
+    print(f"upstream limit {args.rpm:.0f} rpm, {args.chat_threads} chat + "
+          f"{args.eval_threads} evaluation threads, {args.duration:.0f} s per run")
+
+    set_scheduler(None)
+    reset(server)
+    results = drive(args.duration, args.chat_threads, args.eval_threads, args.deadline_s)
+    report("no scheduler", server, results, args.duration)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A little under the upstream limit absorbs clock skew between the two
+        set_scheduler(TokenBucketScheduler(rpm=args.rpm * 0.95, tpm=0,
+                                           path=os.path.join(tmp, "budget.sqlite")))
+        reset(server)
+        results = drive(args.duration, args.chat_threads, args.eval_threads, args.deadline_s)
+        report("scheduler", server, results, args.duration)
+        set_scheduler(None)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
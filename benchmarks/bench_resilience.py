@@ -0,0 +1,96 @@
+# benchmarks/bench_resilience.py
+"""
+Tail latency with and without hedged requests against a fake upstream that
+stalls a share of requests for seconds, and time-to-fallback for the patient
+node while the upstream is hard down (retries vs. an open circuit breaker).
+
+    python -m benchmarks.bench_resilience --calls 400 --threads 8 \\
+        --latency-ms 200 --jitter-ms 50 --stall-rate 0.03 --stall-ms 3000
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import FakeGroqServer
+from benchmarks.load_test import percentile
+
+PROMPT = [{"role": "user", "content": "What brings you here today?"}]
+
+
+def run_calls(calls, threads):
+    from utils.llm_client import chat_completion
+
+    def one(i):
+        start = time.perf_counter()
+        chat_completion(node="bench", model="fake", messages=PROMPT, max_tokens=50)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return sorted(pool.map(one, range(calls)))
+
+
+def report(label, samples, hedges):
+    print(f"{label:<10} {percentile(samples, 50) * 1000:>8.0f} {percentile(samples, 95) * 1000:>8.0f} "
+          f"{percentile(samples, 99) * 1000:>8.0f} {samples[-1] * 1000:>8.0f} {hedges:>7}")
+
+
+def hedges_sent():
+    from utils.metrics import LLM_HEDGES
+    return int(LLM_HEDGES.labels("bench", "sent").value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--stall-rate", type=float, default=0.03)
+    parser.add_argument("--stall-ms", type=float, default=3000.0)
+    args = parser.parse_args()
+
+    server = FakeGroqServer(latency_ms=args.latency_ms, latency_dist="lognormal",
+                            jitter_ms=args.jitter_ms, stall_rate=args.stall_rate,
+                            stall_ms=args.stall_ms, seed=7).start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+
+    from utils import resilience
+
+    print(f"upstream {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, "
+          f"{args.stall_rate:.0%} stalled +{args.stall_ms:.0f} ms, {args.threads} threads")
+    print(f"{'mode':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'hedges':>7}")
+
+    resilience.HEDGE_ENABLED = False
+    report("no hedge", run_calls(args.calls, args.threads), 0)
+
+    resilience.HEDGE_ENABLED = True
+    before = hedges_sent()
+    samples = run_calls(args.calls, args.threads)
+    report("hedged", samples, hedges_sent() - before)
+    print(f"hedge delay (p95 of recent attempts): {resilience.hedge_delay('bench') * 1000:.0f} ms")
+
+    # Upstream hard down: every attempt is a 500
+    server.error_rate, server.error_statuses = 1.0, (500,)
+    server.stall_rate = 0.0
+    from graph.patient_graph import patient_graph
+    from utils.transcript import DOCTOR, Transcript
+
+    state = {"messages": Transcript().add(DOCTOR, "Hello?"), "revealed_symptoms": [],
+             "conversation_end": False}
+    print("\nupstream down: patient turn -> fallback reply")
+    for turn in range(1, 9):
+        start = time.perf_counter()
+        patient_graph.invoke(state)
+        breaker = resilience.breaker_for("llama-3.3-70b-versatile").state
+        print(f"turn {turn}: {(time.perf_counter() - start) * 1000:>7.0f} ms  breaker {breaker}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
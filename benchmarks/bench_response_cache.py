@@ -0,0 +1,129 @@
+# benchmarks/bench_response_cache.py
+"""
+Patient reply cache on a cohort running the same exercise: every student
+opens with a paraphrase of the same two questions. Reports per-turn latency,
+upstream calls and cache hit rate with the cache off and on, against the
+local fake upstream, and which question pairs the cache matches: paraphrases
+must share a reply, different questions must not.
+
+    python -m benchmarks.bench_response_cache --students 200 --concurrency 16
+"""
+import argparse
+import contextvars
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import add_upstream_arguments, server_from_args
+from benchmarks.load_test import percentile
+
+OPENERS = [
+    "What brings you here today?",
+    "What brings you here today",
+    "what brings you here today?",
+    "So, what brings you here today?",
+    "What brings you in here today?",
+    "What brings you in today?",
+]
+FOLLOW_UPS = [
+    "How long have you had this?",
+    "How long have you had this for?",
+    "how long have you had this",
+    "And how long have you had this?",
+]
+
+# (stored question, new question, should match)
+PAIRS = [
+    ("What brings you here today?", "What brings you in today?", True),
+    ("How can I help you today?", "how can i help you", True),
+    ("How long have you had the headache?", "How long have you had this headache?", True),
+    ("Tell me about the chest pain", "Tell me about the back pain", False),
+    ("When did the chest pain start?", "When did the back pain start?", False),
+    ("Do you have a fever?", "Do you have a cough?", False),
+    ("Hello doctor", "Hi doctor", False),
+]
+
+
+def match_pairs():
+    """Prints whether each PAIRS question is served the other's reply; returns the wrong ones."""
+    from utils.response_cache import ResponseCache
+
+    wrong = 0
+    print(f"{'stored':<36} {'asked':<38} {'jaccard':>7} {'match':>5}")
+    for stored, asked, expected in PAIRS:
+        cache = ResponseCache(max_size=16, replies=1)
+        cache.add(cache.key("bucket", stored), "reply")
+        matched = cache.get(cache.key("bucket", asked)) is not None
+        similarity = cache.similarity(cache.key("bucket", stored), cache.key("bucket", asked))
+        wrong += matched != expected
+        print(f"{stored:<36} {asked:<38} {similarity:>7.2f} {'yes' if matched else 'no':>5}"
+              f"{'' if matched == expected else '  WRONG'}")
+    return wrong
+
+
+def run_cohort(students, concurrency, seed):
+    from graph.patient_graph import patient_graph
+    from utils.llm_client import usage_scope
+    from utils.transcript import DOCTOR, Transcript
+
+    rng = random.Random(seed)
+    scripts = [(rng.choice(OPENERS), rng.choice(FOLLOW_UPS)) for _ in range(students)]
+    latencies = [[], []]
+
+    def consult(script):
+        state = {"messages": Transcript(), "revealed_symptoms": [], "conversation_end": False}
+        for turn, question in enumerate(script):
+            start = time.perf_counter()
+            state = patient_graph.invoke({**state, "messages": state["messages"].add(DOCTOR, question)})
+            latencies[turn].append(time.perf_counter() - start)
+
+    with usage_scope() as usage:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # Each consult runs in a copy of this context so usage_scope sees its calls
+            futures = [pool.submit(contextvars.copy_context().run, consult, script) for script in scripts]
+            for future in futures:
+                future.result()
+    return latencies, usage.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--replies", type=int, default=3, help="replies sampled per cached question")
+    add_upstream_arguments(parser, latency_ms=400.0)
+    args = parser.parse_args()
+
+    server = server_from_args(args).start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+
+    from graph import patient_graph
+    from utils.response_cache import ResponseCache
+
+    wrong = match_pairs()
+    print()
+    print(f"{'cache':<6} {'turn':<10} {'p50 ms':>8} {'p95 ms':>8} | {'upstream calls':>14} {'hit rate':>8}")
+    for enabled in (False, True):
+        cache = ResponseCache(max_size=4096 if enabled else 0, replies=args.replies)
+        patient_graph.response_cache = cache
+        latencies, calls = run_cohort(args.students, args.concurrency, args.seed)
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups if lookups else 0.0
+        for turn, name in enumerate(("opening", "follow-up")):
+            samples = sorted(latencies[turn])
+            tail = f"{calls:>14} {hit_rate:>8.1%}" if turn == 0 else ""
+            print(f"{'on' if enabled else 'off':<6} {name:<10} {percentile(samples, 50) * 1000:>8.1f} "
+                  f"{percentile(samples, 95) * 1000:>8.1f} | {tail}")
+    server.shutdown()
+    if wrong:
+        sys.exit(f"{wrong} question pair(s) matched wrongly")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_server.py
+"""
+Throughput of the production server (gunicorn -c gunicorn.conf.py app:app)
+at 1, 4 and 16 workers against the local fake upstream. Each worker count
+gets a fresh server; the load is benchmarks.load_test's mixed endpoints.
+
+    python -m benchmarks.bench_server --workers 1 4 16 --concurrency 64 --duration 15
+    python -m benchmarks.bench_server --worker-class gthread   # compare worker classes
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_groq import add_upstream_arguments, server_from_args
+from benchmarks.load_test import percentile, run_load
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, worker_class, upstream_url, ready_timeout=60.0):
+    port = free_port()
+    env = dict(os.environ, GROQ_BASE_URL=upstream_url, GROQ_API_KEY="fake",
+               BIND=f"127.0.0.1:{port}", WEB_CONCURRENCY=str(workers), WORKER_CLASS=worker_class)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/api/cases", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"server with {workers} workers did not start")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)  # graceful: in-flight requests finish first
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--worker-class", default="gevent", choices=["gevent", "gthread", "sync"])
+    parser.add_argument("--endpoints", default="chat,evaluate,treatment")
+    parser.add_argument("--concurrency", type=int, default=64, help="client threads")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per worker count")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    add_upstream_arguments(parser, latency_ms=400.0)
+    args = parser.parse_args()
+
+    upstream = server_from_args(args).start()
+    endpoints = [e for e in args.endpoints.split(",") if e]
+
+    print(f"{args.worker_class} workers, {args.concurrency} clients, {args.duration:.0f} s each")
+    print(f"{'workers':>7} | {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for workers in args.workers:
+        process, url = start_server(workers, args.worker_class, upstream.base_url)
+        try:
+            results, elapsed = run_load(url, endpoints, args.concurrency, args.duration, 0, args.timeout)
+        finally:
+            stop_server(process)
+        samples = [s for rows in results.values() for s in rows]
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        print(f"{workers:>7} | {len(samples) / elapsed:>7.1f} {percentile(latencies, 50) * 1000:>8.0f} "
+              f"{percentile(latencies, 95) * 1000:>8.0f} {percentile(latencies, 99) * 1000:>8.0f} "
+              f"{errors / len(samples) if samples else 0:>7.1%}")
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
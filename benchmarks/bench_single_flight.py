@@ -0,0 +1,80 @@
+# benchmarks/bench_single_flight.py
+"""
+Retry storm: every request to /api/chat and /api/evaluate arrives
+--duplicates times at once (double submits, client retries), each copy
+with the same Idempotency-Key. Reports upstream calls and latency with
+single-flight coalescing off and on, against the local fake upstream.
+
+    python -m benchmarks.bench_single_flight --requests 32 --duplicates 4
+"""
+import argparse
+import contextvars
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import add_upstream_arguments, server_from_args
+from benchmarks.load_test import HISTORY, percentile
+
+
+def bodies(n):
+    for i in range(n):
+        yield "/api/chat", f"chat-{i}", {"user_message": f"Does anything make it worse? ({i})", "messages": HISTORY}
+        yield "/api/evaluate", f"evaluate-{i}", {
+            "doctor_message": f"How long have you had the headaches? ({i})",
+            "patient_history": [f"{m['role'].title()}: {m['content']}" for m in HISTORY],
+            "cache": False
+        }
+
+
+def storm(client, requests, duplicates):
+    from utils.llm_client import usage_scope
+
+    latencies = []
+
+    def post(path, key, body):
+        start = time.perf_counter()
+        response = client.post(path, json=body, headers={"Idempotency-Key": key})
+        latencies.append(time.perf_counter() - start)
+        return response.status_code
+
+    calls = [call for call in bodies(requests) for _ in range(duplicates)]
+    with usage_scope() as usage:
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            # Copies of this context, so usage_scope counts every handler's upstream calls
+            futures = [pool.submit(contextvars.copy_context().run, post, *call) for call in calls]
+            statuses = [f.result() for f in futures]
+    return sorted(latencies), usage.calls, sum(1 for s in statuses if s >= 400)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=32, help="distinct requests per endpoint")
+    parser.add_argument("--duplicates", type=int, default=4, help="copies of each request sent at once")
+    add_upstream_arguments(parser, latency_ms=400.0)
+    args = parser.parse_args()
+
+    server = server_from_args(args).start()
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+
+    from api.index import app, warm_graphs
+    from utils import single_flight
+
+    warm_graphs()
+    client = app.test_client()
+    print(f"{args.requests * 2} distinct requests x {args.duplicates} copies")
+    print(f"{'single-flight':<14} {'upstream calls':>14} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for enabled in (False, True):
+        single_flight.ENABLED = enabled
+        latencies, calls, errors = storm(client, args.requests, args.duplicates)
+        print(f"{'on' if enabled else 'off':<14} {calls:>14} {percentile(latencies, 50) * 1000:>8.0f} "
+              f"{percentile(latencies, 95) * 1000:>8.0f} {errors:>7}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
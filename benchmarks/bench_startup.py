@@ -0,0 +1,78 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of api/index.py: import time and first/second request
+latency per endpoint, each measured in a fresh interpreter against the
+local fake upstream. --eager imports every graph at startup, as the
+module did before graphs were loaded per route.
+
+    python -m benchmarks.bench_startup --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_groq import FakeGroqServer
+
+ENDPOINTS = {
+    "chat (greeting)": ("/api/chat", {"session": True}),
+    "chat": ("/api/chat", {"user_message": "What brings you here today?", "messages": []}),
+    "evaluate": ("/api/evaluate", {"doctor_message": "How long have you had this?", "cache": False}),
+    "treatment": ("/api/treatment", {"prescription": "Take paracetamol 500mg twice daily", "messages": []}),
+}
+
+CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+import api.index as index
+if {eager!r}:
+    index.warm_graphs()
+t1 = time.perf_counter()
+client = index.app.test_client()
+client.post({path!r}, json={body!r})
+t2 = time.perf_counter()
+client.post({path!r}, json={body!r})
+t3 = time.perf_counter()
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "first_ms": (t2 - t1) * 1000, "second_ms": (t3 - t2) * 1000}}))
+"""
+
+
+def measure(path, body, eager, env):
+    code = CHILD.format(root=ROOT, eager=eager, path=path, body=body)
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True,
+                         text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per endpoint")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--eager", action="store_true", help="import all graphs at startup")
+    args = parser.parse_args()
+
+    server = FakeGroqServer(latency_ms=args.latency_ms).start()
+    env = {**os.environ, "GROQ_BASE_URL": server.base_url,
+           "GROQ_API_KEY": os.getenv("GROQ_API_KEY", "fake")}
+
+    mode = "eager" if args.eager else "lazy"
+    print(f"{mode} graphs, upstream latency {args.latency_ms:.0f} ms, median of {args.runs} runs")
+    print(f"{'endpoint':<16} {'import ms':>9} {'first req ms':>12} {'cold total':>10} {'warm req ms':>11}")
+    for name, (path, body) in ENDPOINTS.items():
+        runs = [measure(path, body, args.eager, env) for _ in range(args.runs)]
+        imp = statistics.median(r["import_ms"] for r in runs)
+        first = statistics.median(r["first_ms"] for r in runs)
+        second = statistics.median(r["second_ms"] for r in runs)
+        print(f"{name:<16} {imp:>9.0f} {first:>12.0f} {imp + first:>10.0f} {second:>11.0f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
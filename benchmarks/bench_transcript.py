@@ -0,0 +1,114 @@
+# benchmarks/bench_transcript.py
+"""
+Per-turn transcript overhead (no upstream call) at 10/100/1000 messages.
+
+"before" replays the old path: client dicts -> LangChain messages, the
+isinstance conversion to Groq dicts in the node, `messages + [AIMessage]`,
+then the reply appended to the client list. "after" does the same turn
+with utils.transcript.Transcript. Both end with the JSON response body in
+full-transcript mode; session mode keeps the transcript server-side.
+
+    python -m benchmarks.bench_transcript --sizes 10 100 1000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage, AIMessage
+
+from utils.transcript import DOCTOR, PATIENT, Transcript
+
+QUESTION = "Does anything make the pain better or worse?"
+REPLY = "Lying down in a dark room helps a bit, doctor."
+
+
+def client_messages(n):
+    return [
+        {"role": "doctor" if i % 2 == 0 else "patient", "content": f"{QUESTION if i % 2 == 0 else REPLY} ({i})"}
+        for i in range(n)
+    ]
+
+
+# ------------------ BEFORE ------------------
+def _to_graph(messages):
+    graph_messages = []
+    for m in messages:
+        if m.get("role") == "doctor":
+            graph_messages.append(HumanMessage(content=m.get("content", "")))
+        else:
+            graph_messages.append(AIMessage(content=m.get("content", "")))
+    return graph_messages
+
+
+def _to_groq(messages):
+    groq_messages = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage):
+            groq_messages.append({"role": "user", "content": msg.content})
+        elif isinstance(msg, AIMessage):
+            groq_messages.append({"role": "assistant", "content": msg.content})
+    return groq_messages
+
+
+def before_full(messages):
+    messages = list(messages)
+    graph_messages = _to_graph(messages)
+    graph_messages.append(HumanMessage(content=QUESTION))
+    _to_groq(graph_messages)
+    graph_messages = graph_messages + [AIMessage(content=REPLY)]
+    messages.append({"role": "doctor", "content": QUESTION})
+    messages.append({"role": "patient", "content": graph_messages[-1].content})
+    return json.dumps({"reply": REPLY, "messages": messages})
+
+
+def before_session(session):
+    graph_messages = session["messages"] + [HumanMessage(content=QUESTION)]
+    _to_groq(graph_messages)
+    session["messages"] = graph_messages + [AIMessage(content=REPLY)]
+
+
+# ------------------ AFTER ------------------
+def after_full(messages):
+    transcript = Transcript.from_json(messages).add(DOCTOR, QUESTION)
+    transcript.groq_messages()
+    transcript = transcript.add(PATIENT, REPLY)
+    return json.dumps({"reply": transcript.last(), "messages": transcript.to_json()})
+
+
+def after_session(session):
+    transcript = session["messages"].add(DOCTOR, QUESTION)
+    transcript.groq_messages()
+    session["messages"] = transcript.add(PATIENT, REPLY)
+
+
+def per_turn_us(fn, arg, turns):
+    start = time.perf_counter()
+    for _ in range(turns):
+        fn(arg)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--turns", type=int, default=200, help="timed turns per size")
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} | {'full before':>11} {'full after':>10} | {'session before':>14} {'session after':>13}  (us/turn)")
+    for n in args.sizes:
+        messages = client_messages(n)
+        full_before = per_turn_us(before_full, messages, args.turns)
+        full_after = per_turn_us(after_full, messages, args.turns)
+
+        # Session transcripts grow by two messages per timed turn, as in a real consult
+        session_before = per_turn_us(before_session, {"messages": _to_graph(messages)}, args.turns)
+        session_after = per_turn_us(after_session, {"messages": Transcript.from_json(messages)}, args.turns)
+        print(f"{n:>8} | {full_before:>11.1f} {full_after:>10.1f} | {session_before:>14.1f} {session_after:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# benchmarks/fake_groq.py
+"""
+Local stand-in for the Groq OpenAI-compatible API.
+
+Serves POST /openai/v1/chat/completions (plain and stream=True) so
+benchmarks can run without spending Groq quota. Latency is sampled from a
+configurable distribution, plus an optional cost per 1k prompt tokens and a
+generation time driven by a token rate; a share of requests can be failed
+with 429/5xx, or stalled for seconds, to exercise error and tail paths.
+Optional requests/tokens-per-minute limits answer 429 with Retry-After the
+way the real API does once a key's budget is spent.
+Point the app at it with GROQ_BASE_URL=http://127.0.0.1:<port>.
+
+    python -m benchmarks.fake_groq --port 8999 --latency-ms 300 \\
+        --latency-dist lognormal --jitter-ms 150 --tokens-per-s 250 --error-rate 0.02
+"""
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATIENT_REPLY = "I've been having these headaches for about a week now."
+TREATMENT_REPLY = "Thank you doctor. Should I take it before or after meals?"
+EVALUATOR_REPLY = json.dumps({
+    "verdict": "RELEVANT",
+    "reason": "Fake upstream verdict: the question follows up on the symptoms described so far",
+    "suggestion": "Ask about triggers or what relieves the pain next"
+})
+
+ITEM = re.compile(r"^\*\*Item (\d+)\*\*$", re.MULTILINE)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+class LatencyModel:
+    """Samples upstream latency in seconds; mean and jitter are given in ms."""
+
+    def __init__(self, dist="fixed", mean_ms=300.0, jitter_ms=0.0, seed=None):
+        if dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {dist}")
+        self.dist = dist
+        self.mean = mean_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            if self.dist == "uniform":
+                value = self._random.uniform(self.mean - self.jitter, self.mean + self.jitter)
+            elif self.dist == "normal":
+                value = self._random.gauss(self.mean, self.jitter)
+            elif self.dist == "lognormal" and self.mean > 0:
+                # Parameterised so the samples have the requested mean and std-dev
+                sigma2 = math.log(1 + (self.jitter / self.mean) ** 2)
+                value = self._random.lognormvariate(math.log(self.mean) - sigma2 / 2, math.sqrt(sigma2))
+            elif self.dist == "exponential" and self.mean > 0:
+                value = self._random.expovariate(1 / self.mean)
+            else:
+                value = self.mean
+        return max(value, 0.0)
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        server = self.server
+        usage = self._usage(body, "")
+        server.record(body.get("model"), usage["prompt_tokens"])
+
+        content = self._reply_for(body)
+        wait = server.over_limit(self._usage(body, content)["total_tokens"])
+        if wait:
+            self._send_error(429, retry_after=wait)
+            return
+
+        time.sleep(server.latency.sample()
+                   + usage["prompt_tokens"] / 1000 * server.prompt_s_per_1k
+                   + server.injected_stall())
+
+        status = server.injected_error()
+        if status:
+            self._send_error(status)
+            return
+
+        if body.get("stream"):
+            self._send_stream(body, content)
+        else:
+            # Non-streamed completions arrive after the whole generation
+            time.sleep(self._usage(body, content)["completion_tokens"] * server.token_delay_s)
+            self._send_json(200, self._completion(body, content))
+
+    # ---------------- RESPONSES ----------------
+    def _reply_for(self, body):
+        prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+        if '"evaluations"' in prompt:
+            # Batched evaluator prompt: one verdict per numbered item
+            verdict = json.loads(EVALUATOR_REPLY)
+            return json.dumps({"evaluations": [dict(item=int(n), **verdict) for n in ITEM.findall(prompt)]})
+        if '"verdict"' in prompt:
+            return EVALUATOR_REPLY
+        if "prescription" in prompt:
+            return TREATMENT_REPLY
+        return PATIENT_REPLY
+
+    def _usage(self, body, content):
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+        prompt_tokens = prompt_chars // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    def _completion(self, body, content):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": self._usage(body, content)
+        }
+
+    def _send_error(self, status, retry_after=1.0):
+        kind = "rate_limit_exceeded" if status == 429 else "internal_server_error"
+        data = json.dumps({"error": {"message": f"Injected {status}", "type": kind}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", f"{retry_after:.2f}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, body, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for token in content.split(" "):
+            self._write_chunk(self._delta(body, token + " "))
+            time.sleep(self.server.token_delay_s)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._write_chunk(json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [],
+                "usage": self._usage(body, content)
+            }))
+        self._write_chunk("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _delta(self, body, token):
+        return json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+        })
+
+    def _write_chunk(self, data):
+        payload = f"data: {data}\n\n".encode()
+        self.wfile.write(f"{len(payload):X}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self, port=0, latency_ms=300.0, tokens_per_s=0.0, prompt_ms_per_1k=0.0,
+                 latency_dist="fixed", jitter_ms=0.0, error_rate=0.0,
+                 error_statuses=(429, 500), stall_rate=0.0, stall_ms=0.0,
+                 rpm_limit=0.0, tpm_limit=0.0, seed=None):
+        super().__init__(("127.0.0.1", port), FakeGroqHandler)
+        self.latency = LatencyModel(latency_dist, latency_ms, jitter_ms, seed)
+        self.token_delay_s = 1 / tokens_per_s if tokens_per_s > 0 else 0.0
+        self.prompt_s_per_1k = prompt_ms_per_1k / 1000
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.stall_rate = stall_rate
+        self.stall_s = stall_ms / 1000
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = []  # (model, prompt_tokens) per request, for benchmarks
+        self.errors = 0
+        self.stalls = 0
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self._requests_left = rpm_limit
+        self._tokens_left = tpm_limit
+        self._bucket_at = time.monotonic()
+        self.rate_limited = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, model, prompt_tokens):
+        with self._lock:
+            self.calls.append((model, prompt_tokens))
+
+    def over_limit(self, tokens):
+        """Seconds until the RPM/TPM budget covers this request; 0 admits it."""
+        if not (self.rpm_limit or self.tpm_limit):
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self._bucket_at = now - self._bucket_at, now
+            self._requests_left = min(self.rpm_limit, self._requests_left + elapsed * self.rpm_limit / 60)
+            self._tokens_left = min(self.tpm_limit, self._tokens_left + elapsed * self.tpm_limit / 60)
+            wait = 0.0
+            if self.rpm_limit and self._requests_left < 1:
+                wait = (1 - self._requests_left) * 60 / self.rpm_limit
+            elif self.tpm_limit and self._tokens_left < tokens:
+                wait = (tokens - self._tokens_left) * 60 / self.tpm_limit
+            if wait:
+                self.rate_limited += 1
+                return wait
+            self._requests_left -= 1
+            self._tokens_left -= tokens
+            return 0.0
+
+    def injected_error(self):
+        """Returns an HTTP status to fail this request with, or None."""
+        with self._lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return self._random.choice(self.error_statuses)
+        return None
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (timeouts, cancelled hedges) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def injected_stall(self):
+        """Extra seconds to hold this request for, simulating an upstream stall."""
+        with self._lock:
+            if self.stall_rate and self._random.random() < self.stall_rate:
+                self.stalls += 1
+                return self.stall_s
+        return 0.0
+
+    def start(self):
+        """Serves on a daemon thread; returns self for chaining."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def add_upstream_arguments(parser, latency_ms=300.0):
+    """Fake-upstream options shared by the benchmark scripts."""
+    group = parser.add_argument_group("fake upstream")
+    group.add_argument("--latency-ms", type=float, default=latency_ms, help="mean upstream latency")
+    group.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    group.add_argument("--jitter-ms", type=float, default=0.0,
+                       help="spread: std-dev (normal/lognormal) or half-width (uniform)")
+    group.add_argument("--tokens-per-s", type=float, default=0.0,
+                       help="generation rate; 0 returns completions instantly")
+    group.add_argument("--prompt-ms-per-1k", type=float, default=0.0,
+                       help="extra latency per 1000 prompt tokens")
+    group.add_argument("--error-rate", type=float, default=0.0,
+                       help="share of requests failed with --error-statuses")
+    group.add_argument("--error-statuses", default="429,500")
+    group.add_argument("--stall-rate", type=float, default=0.0,
+                       help="share of requests held for an extra --stall-ms")
+    group.add_argument("--stall-ms", type=float, default=3000.0)
+    group.add_argument("--rpm-limit", type=float, default=0.0, help="requests per minute (0 = none)")
+    group.add_argument("--tpm-limit", type=float, default=0.0, help="tokens per minute (0 = none)")
+    group.add_argument("--seed", type=int, default=None)
+    return parser
+
+
+def server_from_args(args, port=0):
+    return FakeGroqServer(
+        port=port,
+        latency_ms=args.latency_ms,
+        tokens_per_s=args.tokens_per_s,
+        prompt_ms_per_1k=args.prompt_ms_per_1k,
+        latency_dist=args.latency_dist,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(",") if s],
+        stall_rate=args.stall_rate,
+        stall_ms=args.stall_ms,
+        rpm_limit=args.rpm_limit,
+        tpm_limit=args.tpm_limit,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8999)
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, port=args.port)
+    print(f"Fake Groq listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
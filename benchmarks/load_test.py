@@ -0,0 +1,180 @@
+# benchmarks/load_test.py
+"""
+Load test for the HTTP API against the local fake Groq upstream.
+
+Serves api/index.py (or app.py) in-process on a threaded WSGI server, or
+targets an already running server with --url, then drives the chosen
+endpoints from --concurrency client threads and reports throughput,
+p50/p95/p99 latency and error rate per endpoint.
+
+    python -m benchmarks.load_test --concurrency 16 --duration 20 \\
+        --latency-ms 400 --latency-dist lognormal --jitter-ms 200 --error-rate 0.01
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import add_upstream_arguments, server_from_args
+
+HISTORY = [
+    {"role": "patient", "content": "Hello! I'm ready to discuss my symptoms with you."},
+    {"role": "doctor", "content": "What brings you here today?"},
+    {"role": "patient", "content": "I've been having these headaches for about a week now."},
+]
+
+REQUESTS = {
+    "chat": ("/api/chat", lambda i: {
+        "user_message": f"Does anything make it worse? ({i})",
+        "messages": HISTORY
+    }),
+    "evaluate": ("/api/evaluate", lambda i: {
+        "doctor_message": f"How long have you had the headaches? ({i})",
+        "patient_history": [f"{m['role'].title()}: {m['content']}" for m in HISTORY],
+        "cache": False
+    }),
+    "turn": ("/api/turn", lambda i: {
+        "user_message": f"Does anything make it worse? ({i})",
+        "messages": HISTORY,
+        "cache": False
+    }),
+    "treatment": ("/api/treatment", lambda i: {
+        "prescription": f"Take paracetamol 500mg twice daily for 5 days ({i})",
+        "messages": HISTORY
+    }),
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def serve_in_process(target):
+    """Starts the chosen Flask app on a threaded WSGI server; returns (server, url)."""
+    from werkzeug.serving import make_server
+
+    if target == "app":
+        from app import app
+    else:
+        from api.index import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_load(url, endpoints, concurrency, duration, max_requests, timeout):
+    """Drives the endpoints round-robin; returns {endpoint: [(latency_s, ok), ...]}."""
+    results = defaultdict(list)
+    lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        with httpx.Client(base_url=url, timeout=timeout) as client:
+            while time.perf_counter() < deadline:
+                i = next(counter)
+                if max_requests and i >= max_requests:
+                    return
+                name = endpoints[i % len(endpoints)]
+                path, body = REQUESTS[name]
+                start = time.perf_counter()
+                try:
+                    response = client.post(path, json=body(i))
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                with lock:
+                    results[name].append((time.perf_counter() - start, ok))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    report = {}
+    for name, samples in sorted(results.items()):
+        latencies = sorted(s for s, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        report[name] = {
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "error_rate": round(errors / len(samples), 4) if samples else 0.0
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{'endpoint':<10} {'reqs':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, r in report.items():
+        print(f"{name:<10} {r['requests']:>6} {r['throughput_rps']:>7.1f} {r['p50_ms']:>8.0f} "
+              f"{r['p95_ms']:>8.0f} {r['p99_ms']:>8.0f} {r['error_rate']:>7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target", choices=["index", "app"], default="index",
+                        help="app served in-process (ignored with --url)")
+    parser.add_argument("--url", help="drive an already running server instead")
+    parser.add_argument("--endpoints", default="chat,evaluate,treatment")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--requests", type=int, default=0, help="stop after N requests (0 = no cap)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    unknown = set(endpoints) - set(REQUESTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    upstream = app_server = None
+    url = args.url
+    if not url:
+        upstream = server_from_args(args).start()
+        os.environ["GROQ_BASE_URL"] = upstream.base_url
+        os.environ.setdefault("GROQ_API_KEY", "fake")
+        app_server, url = serve_in_process(args.target)
+
+    results, elapsed = run_load(url, endpoints, args.concurrency, args.duration,
+                                args.requests, args.timeout)
+    report = summarize(results, elapsed)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        target = args.url or args.target
+        print(f"{target}: {args.concurrency} clients, {elapsed:.1f} s")
+        print_report(report)
+
+    if app_server:
+        app_server.shutdown()
+    if upstream:
+        upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,109 +1,591 @@
-# graph/evaluator_graph.py
-from typing import TypedDict, List, Dict
-from langgraph.graph import StateGraph, END
-from groq import Groq
-from dotenv import load_dotenv
-import os
-import json
-import logging
-
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-logging.basicConfig(level=logging.INFO)
-
-class EvaluatorState(TypedDict):
-    doctor_message: str
-    patient_history: List[str]
-    evaluation: Dict
-
-def evaluator_node(state: EvaluatorState):
-    """
-    Evaluates the doctor's question against patient history using Groq.
-    Returns classification: RELEVANT, IRRELEVANT, or REPETITIVE
-    """
-    history_text = "\n".join(state.get("patient_history", []))
-    doctor_msg = state.get("doctor_message", "")
-
-    prompt = f"""You are a medical conversation evaluator. Analyze this doctor's question.
-
-**Patient conversation history:**
-{history_text if history_text else "No prior conversation"}
-
-**Doctor's current question:**
-"{doctor_msg}"
-
-**Task:** Classify this question into ONE of these categories:
-
-1. **RELEVANT** - The question appropriately follows the conversation and helps diagnose the patient
-2. **IRRELEVANT** - The question is off-topic or unrelated to the patient's medical concern
-3. **REPETITIVE** - The question asks about something already discussed in detail
-
-**Response format (JSON only):**
-{{
-  "verdict": "RELEVANT" | "IRRELEVANT" | "REPETITIVE",
-  "reason": "Brief explanation (one sentence)",
-  "suggestion": "Optional suggestion for improvement (if verdict is not RELEVANT)"
-}}
-
-**Examples:**
-
-Example 1:
-History: "Patient: I've been having headaches. Doctor: How long? Patient: About a week."
-Question: "Are the headaches getting worse?"
-Response: {{"verdict": "RELEVANT", "reason": "Asking about symptom progression is medically appropriate"}}
-
-Example 2:
-History: "Patient: I have a headache."
-Question: "What's your favorite color?"
-Response: {{"verdict": "IRRELEVANT", "reason": "Question unrelated to medical concern", "suggestion": "Ask about symptom characteristics or duration"}}
-
-Example 3:
-History: "Patient: Headache for a week. Doctor: How long? Patient: I said about a week."
-Question: "How long have you had the headache?"
-Response: {{"verdict": "REPETITIVE", "reason": "Patient already stated duration twice", "suggestion": "Move to other aspects like severity or triggers"}}
-
-Now evaluate the current question. Respond ONLY with valid JSON, no other text.
-"""
-
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # ✅ FIXED: Valid Groq model
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=200
-        )
-        raw_content = response.choices[0].message.content.strip()
-        
-        # Try to extract JSON from response
-        if "```json" in raw_content:
-            raw_content = raw_content.split("```json")[1].split("```")[0].strip()
-        elif "```" in raw_content:
-            raw_content = raw_content.split("```")[1].split("```")[0].strip()
-        
-        evaluation = json.loads(raw_content)
-        
-        # Validate structure
-        if "verdict" not in evaluation:
-            evaluation = {"verdict": "RELEVANT", "reason": "Evaluation parsing failed"}
-            
-    except json.JSONDecodeError as e:
-        logging.warning(f"Invalid JSON from Groq: {raw_content}")
-        evaluation = {"verdict": "RELEVANT", "reason": "Could not parse evaluation", "raw": raw_content}
-    except Exception as e:
-        logging.error(f"Groq API error: {e}")
-        evaluation = {"verdict": "ERROR", "reason": str(e)}
-
-    return {
-        "doctor_message": state.get("doctor_message", ""),
-        "patient_history": state.get("patient_history", []),
-        "evaluation": evaluation
-    }
-
-# Build the state graph
-builder = StateGraph(EvaluatorState)
-builder.add_node("evaluator", evaluator_node)
-builder.set_entry_point("evaluator")
-builder.add_edge("evaluator", END)
-evaluator_graph = builder.compile()
-
-
+# graph/evaluator_graph.py
+from typing import TypedDict, List, Dict
+from langgraph.graph import StateGraph, END
+from langgraph.utils.runnable import RunnableCallable
+from utils.llm_client import chat_completion, achat_completion, current_usage, run_async, usage_scope
+from utils.ttl_cache import LRUTTLCache
+from utils.history import trim_lines
+from utils.eval_fastpath import fast_verdict
+from utils.json_stream import JSONFieldStream
+from utils.metrics import NODE_FALLBACKS, CallbackGauge, Counter, Histogram, instrument_node
+from utils.micro_batch import MicroBatcher
+from utils.resilience import fallback_kind, remaining
+import asyncio
+import groq
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+EVALUATOR_MODEL = "llama-3.3-70b-versatile"  # ✅ FIXED: Valid Groq model
+EVALUATOR_TEMPERATURE = 0.3
+VERDICTS = ("RELEVANT", "IRRELEVANT", "REPETITIVE")
+
+# "json_schema" constrains the output to VERDICT_SCHEMA (models with structured
+# output support), "json_object" is JSON mode, "text" relies on the prompt alone
+EVAL_RESPONSE_FORMAT = os.getenv("EVAL_RESPONSE_FORMAT", "json_object")
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        # Listed first so it is generated (and can be streamed) first
+        "verdict": {"type": "string", "enum": list(VERDICTS)},
+        "reason": {"type": "string"},
+        "suggestion": {"type": "string"}
+    },
+    "required": ["verdict", "reason", "suggestion"],
+    "additionalProperties": False
+}
+
+# Verdict cache: scripted openers are evaluated against identical histories
+# over and over, so identical (history, question) pairs reuse the verdict.
+evaluation_cache = LRUTTLCache(
+    max_size=int(os.getenv("EVAL_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("EVAL_CACHE_TTL", "3600"))
+)
+
+CallbackGauge(
+    "evaluator_cache_events_total", "Evaluator verdict cache lookups and removals",
+    lambda: {(k,): v for k, v in evaluation_cache.stats().items()
+             if k in ("hits", "misses", "evictions", "expirations")},
+    ["event"], type="counter"
+)
+CallbackGauge(
+    "evaluator_cache_entries", "Verdicts currently cached",
+    lambda: {(): len(evaluation_cache)}
+)
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("EVAL_BATCH_MAX_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("EVAL_BATCH_MAX_ITEMS", "200"))
+
+class EvaluatorState(TypedDict):
+    doctor_message: str
+    patient_history: List[str]
+    evaluation: Dict
+    use_cache: bool
+    history_summary: str
+
+# Shared by the single-question and batched prompts
+CATEGORIES = """1. **RELEVANT** - The question appropriately follows the conversation and helps diagnose the patient
+2. **IRRELEVANT** - The question is off-topic or unrelated to the patient's medical concern
+3. **REPETITIVE** - The question asks about something already discussed in detail"""
+
+EXAMPLES = """**Examples:**
+
+Example 1:
+History: "Patient: I've been having headaches. Doctor: How long? Patient: About a week."
+Question: "Are the headaches getting worse?"
+Response: {"verdict": "RELEVANT", "reason": "Asking about symptom progression is medically appropriate"}
+
+Example 2:
+History: "Patient: I have a headache."
+Question: "What's your favorite color?"
+Response: {"verdict": "IRRELEVANT", "reason": "Question unrelated to medical concern", "suggestion": "Ask about symptom characteristics or duration"}
+
+Example 3:
+History: "Patient: Headache for a week. Doctor: How long? Patient: I said about a week."
+Question: "How long have you had the headache?"
+Response: {"verdict": "REPETITIVE", "reason": "Patient already stated duration twice", "suggestion": "Move to other aspects like severity or triggers"}"""
+
+def _history_text(state: EvaluatorState) -> str:
+    # Long histories are cut to the token budget (newest lines win)
+    history_text = "\n".join(trim_lines(state.get("patient_history", []),
+                                        state.get("history_summary", "")))
+    return history_text if history_text else "No prior conversation"
+
+def build_evaluator_prompt(state: EvaluatorState) -> str:
+    """Builds the classification prompt for the doctor's current question."""
+    doctor_msg = state.get("doctor_message", "")
+
+    prompt = f"""You are a medical conversation evaluator. Analyze this doctor's question.
+
+**Patient conversation history:**
+{_history_text(state)}
+
+**Doctor's current question:**
+"{doctor_msg}"
+
+**Task:** Classify this question into ONE of these categories:
+
+{CATEGORIES}
+
+**Response format (JSON only):**
+{{
+  "verdict": "RELEVANT" | "IRRELEVANT" | "REPETITIVE",
+  "reason": "Brief explanation (one sentence)",
+  "suggestion": "Optional suggestion for improvement (if verdict is not RELEVANT)"
+}}
+
+{EXAMPLES}
+
+Now evaluate the current question. Respond ONLY with valid JSON, no other text, and give "verdict" first.
+"""
+    return prompt
+
+def _strip_fences(raw_content: str) -> str:
+    raw_content = raw_content.strip()
+
+    # Try to extract JSON from response
+    if "```json" in raw_content:
+        raw_content = raw_content.split("```json")[1].split("```")[0].strip()
+    elif "```" in raw_content:
+        raw_content = raw_content.split("```")[1].split("```")[0].strip()
+    return raw_content
+
+def parse_evaluation(raw_content: str) -> Dict:
+    """Extracts the verdict JSON from the model output, tolerating code fences."""
+    raw_content = _strip_fences(raw_content)
+
+    try:
+        evaluation = json.loads(raw_content)
+    except json.JSONDecodeError:
+        # Length only: the output may quote the consultation
+        logger.warning(f"Invalid JSON from Groq ({len(raw_content)} chars)")
+        NODE_FALLBACKS.labels("evaluator", "parse_error").inc()
+        return {"verdict": "RELEVANT", "reason": "Could not parse evaluation", "raw": raw_content}
+
+    # Validate structure
+    if "verdict" not in evaluation:
+        NODE_FALLBACKS.labels("evaluator", "parse_error").inc()
+        evaluation = {"verdict": "RELEVANT", "reason": "Evaluation parsing failed", "raw": raw_content}
+
+    return evaluation
+
+def response_format_kwargs() -> Dict:
+    """The response_format argument for EVAL_RESPONSE_FORMAT (empty for "text")."""
+    if EVAL_RESPONSE_FORMAT == "json_schema":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "evaluation", "strict": True, "schema": VERDICT_SCHEMA}
+        }}
+    if EVAL_RESPONSE_FORMAT == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+def _clean(evaluation: Dict) -> Dict:
+    # Strict schemas always emit "suggestion"; an empty one means none
+    if not evaluation.get("suggestion"):
+        evaluation.pop("suggestion", None)
+    return evaluation
+
+def evaluation_from_stream(parser: JSONFieldStream) -> Dict:
+    """Final evaluation of a streamed reply; the fields seen so far if it was cut short."""
+    evaluation = parser.result()
+    if evaluation is None and "verdict" in parser.fields:
+        evaluation = dict(parser.fields)
+    if evaluation is None or "verdict" not in evaluation:
+        return parse_evaluation(parser.text)
+    return _clean(evaluation)
+
+# ------------------ VERDICT CACHE ------------------
+def _normalize(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+def evaluation_cache_key(state: EvaluatorState, model: str = EVALUATOR_MODEL,
+                         temperature: float = EVALUATOR_TEMPERATURE) -> str:
+    """Hash of the normalized (history, question, model, temperature) tuple."""
+    payload = json.dumps([
+        [_normalize(line) for line in state.get("patient_history", [])],
+        _normalize(state.get("history_summary", "")),
+        _normalize(state.get("doctor_message", "")),
+        model,
+        temperature
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _cache_lookup(state: EvaluatorState):
+    """Returns (key, cached_evaluation); key is None when caching is off for this call."""
+    if not evaluation_cache.enabled or not state.get("use_cache", True):
+        return None, None
+    key = evaluation_cache_key(state)
+    return key, evaluation_cache.get(key)
+
+def _cache_store(key, evaluation: Dict):
+    # Fallback and error verdicts are not worth remembering
+    if key and evaluation.get("verdict") in VERDICTS and "raw" not in evaluation:
+        evaluation_cache.set(key, dict(evaluation))
+
+def _evaluator_result(state: EvaluatorState, evaluation: Dict):
+    return {
+        "doctor_message": state.get("doctor_message", ""),
+        "patient_history": state.get("patient_history", []),
+        "evaluation": evaluation
+    }
+
+# ------------------ MICRO-BATCHING ------------------
+# Questions arriving within EVAL_MICROBATCH_WINDOW_MS of each other (up to
+# EVAL_MICROBATCH_SIZE) are graded by one call, so the instructions and
+# examples are sent once per batch. Off (0 ms) by default.
+MICROBATCH_WINDOW_S = float(os.getenv("EVAL_MICROBATCH_WINDOW_MS", "0")) / 1000
+MICROBATCH_SIZE = int(os.getenv("EVAL_MICROBATCH_SIZE", "8"))
+
+MICROBATCH_SIZES = Histogram("evaluator_microbatch_size", "Questions collected per evaluator micro-batch",
+                             buckets=(1, 2, 4, 8, 16, 32))
+MICROBATCH_FALLBACKS = Counter("evaluator_microbatch_fallbacks_total",
+                               "Batched questions re-evaluated with their own call", ["reason"])
+
+def _batch_item(number: int, state: EvaluatorState) -> str:
+    return (f"**Item {number}**\n"
+            f"Patient conversation history:\n{_history_text(state)}\n"
+            f"Doctor's question:\n\"{state.get('doctor_message', '')}\"")
+
+def build_batch_prompt(states: List[EvaluatorState]) -> str:
+    """One prompt grading several questions; the shared instructions come first."""
+    items = "\n\n".join(_batch_item(number, state) for number, state in enumerate(states, 1))
+
+    prompt = f"""You are a medical conversation evaluator. Each item below is a doctor's question from a separate consultation, with that consultation's history. Evaluate every item on its own.
+
+**Task:** Classify each item's question into ONE of these categories:
+
+{CATEGORIES}
+
+**Response format (JSON only):**
+{{
+  "evaluations": [
+    {{"item": 1, "verdict": "RELEVANT" | "IRRELEVANT" | "REPETITIVE", "reason": "Brief explanation (one sentence)", "suggestion": "Optional suggestion for improvement (if verdict is not RELEVANT)"}}
+  ]
+}}
+Give exactly one entry per item, in item order.
+
+{EXAMPLES}
+
+**Items:**
+
+{items}
+
+Now evaluate every item. Respond ONLY with valid JSON, no other text.
+"""
+    return prompt
+
+def batch_response_format_kwargs() -> Dict:
+    if EVAL_RESPONSE_FORMAT == "json_schema":
+        entry = dict(VERDICT_SCHEMA, properties={"item": {"type": "integer"}, **VERDICT_SCHEMA["properties"]},
+                     required=["item"] + VERDICT_SCHEMA["required"])
+        schema = {"type": "object", "properties": {"evaluations": {"type": "array", "items": entry}},
+                  "required": ["evaluations"], "additionalProperties": False}
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "evaluations", "strict": True, "schema": schema}
+        }}
+    return response_format_kwargs()
+
+def parse_batch_evaluations(raw_content: str, count: int) -> List:
+    """Per-item evaluations from a batched reply; None where an item is missing or invalid."""
+    results = [None] * count
+    try:
+        data = json.loads(_strip_fences(raw_content))
+    except json.JSONDecodeError:
+        return results
+    entries = data.get("evaluations") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return results
+
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict) or entry.get("verdict") not in VERDICTS:
+            continue
+        try:
+            index = int(entry.pop("item", position + 1)) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < count and results[index] is None:
+            results[index] = _clean(entry)
+    return results
+
+def _shares(total: int, weights: List[int]) -> List[int]:
+    """total split in proportion to weights, rounded so the shares add up to total."""
+    if not sum(weights):
+        weights = [1] * len(weights)
+    exact = [total * w / sum(weights) for w in weights]
+    shares = [int(x) for x in exact]
+    by_remainder = sorted(range(len(exact)), key=lambda i: shares[i] - exact[i])
+    for i in by_remainder[:total - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+def _share_usage(usage, states: List[EvaluatorState], scopes: List):
+    """
+    Charges a batched call to the usage scopes of the questions in it. Prompt
+    tokens follow each item's share of the prompt, completion tokens are
+    split evenly, and the call itself counts once, for the leader.
+    """
+    weights = [len(_batch_item(number, state)) for number, state in enumerate(states, 1)]
+    prompt = _shares(usage.prompt_tokens, weights)
+    completion = _shares(usage.completion_tokens, [1] * len(states))
+    for i, scope in enumerate(scopes):
+        if scope is not None:
+            scope.add(calls=usage.calls if i == 0 else 0, errors=usage.errors if i == 0 else 0,
+                      prompt_tokens=prompt[i], completion_tokens=completion[i])
+
+def evaluate_microbatch(states: List[EvaluatorState], scopes: List = None) -> List:
+    """
+    Grades the batch with one upstream call. Items the reply does not answer
+    (or all of them, if the call fails) come back as None and are
+    re-evaluated on their own by their callers. scopes are the callers'
+    usage scopes, one per state; the call's usage is split between them
+    rather than landing in the leader's alone.
+    """
+    MICROBATCH_SIZES.labels().observe(len(states))
+    if len(states) == 1:
+        return [None]  # nothing to share; the single-question prompt is used
+    with usage_scope(inherit=False) as usage:
+        try:
+            return _evaluate_microbatch(states)
+        finally:
+            _share_usage(usage, states, scopes or [None] * len(states))
+
+def run_microbatch(items: List) -> List:
+    """MicroBatcher entry point; items are (state, usage scope) pairs from evaluator_node."""
+    states, scopes = zip(*items)
+    return evaluate_microbatch(list(states), list(scopes))
+
+def _evaluate_microbatch(states: List[EvaluatorState]) -> List:
+    try:
+        response = chat_completion(
+            node="evaluator",
+            model=EVALUATOR_MODEL,
+            messages=[{"role": "user", "content": build_batch_prompt(states)}],
+            temperature=EVALUATOR_TEMPERATURE,
+            max_tokens=200 * len(states),
+            **batch_response_format_kwargs()
+        )
+        results = parse_batch_evaluations(response.choices[0].message.content, len(states))
+    except Exception as e:
+        logger.error(f"Batched evaluator call failed: {e}")
+        MICROBATCH_FALLBACKS.labels(fallback_kind(e)).inc(len(states))
+        return [None] * len(states)
+
+    missed = results.count(None)
+    if missed:
+        logger.warning(f"Batched evaluator reply missed {missed} of {len(states)} items")
+        MICROBATCH_FALLBACKS.labels("parse_error").inc(missed)
+    return results
+
+micro_batcher = MicroBatcher(run_microbatch, MICROBATCH_WINDOW_S, MICROBATCH_SIZE)
+
+def evaluator_node(state: EvaluatorState):
+    """
+    Evaluates the doctor's question against patient history using Groq.
+    Returns classification: RELEVANT, IRRELEVANT, or REPETITIVE
+    """
+    # Verbatim repeats and plainly off-topic questions are answered locally
+    evaluation = fast_verdict(state.get("doctor_message", ""), state.get("patient_history", []))
+    if evaluation is not None:
+        return _evaluator_result(state, evaluation)
+
+    key, cached = _cache_lookup(state)
+    if cached is not None:
+        return _evaluator_result(state, dict(cached))
+
+    # Under load, questions arriving together share one batched call
+    evaluation = micro_batcher.submit((state, current_usage()), remaining()) if micro_batcher.enabled else None
+    if evaluation is None:
+        evaluation = _evaluate_one(state)
+
+    _cache_store(key, evaluation)
+    return _evaluator_result(state, evaluation)
+
+def _evaluate_one(state: EvaluatorState) -> Dict:
+    try:
+        response = chat_completion(
+            node="evaluator",
+            model=EVALUATOR_MODEL,
+            messages=[{"role": "user", "content": build_evaluator_prompt(state)}],
+            temperature=EVALUATOR_TEMPERATURE,
+            max_tokens=200,
+            **response_format_kwargs()
+        )
+        return _clean(parse_evaluation(response.choices[0].message.content))
+    except Exception as e:
+        logger.error(f"Groq API error: {e}")
+        return error_evaluation(e)
+
+def error_evaluation(e: Exception) -> Dict:
+    """The ERROR verdict served when a question could not be graded."""
+    NODE_FALLBACKS.labels("evaluator", fallback_kind(e)).inc()
+    return {"verdict": "ERROR", "reason": str(e)}
+
+async def aevaluator_node(state: EvaluatorState):
+    """Async twin of evaluator_node, used by evaluator_graph.ainvoke."""
+    evaluation = fast_verdict(state.get("doctor_message", ""), state.get("patient_history", []))
+    if evaluation is not None:
+        return _evaluator_result(state, evaluation)
+
+    key, cached = _cache_lookup(state)
+    if cached is not None:
+        return _evaluator_result(state, dict(cached))
+
+    try:
+        response = await achat_completion(
+            node="evaluator",
+            model=EVALUATOR_MODEL,
+            messages=[{"role": "user", "content": build_evaluator_prompt(state)}],
+            temperature=EVALUATOR_TEMPERATURE,
+            max_tokens=200,
+            **response_format_kwargs()
+        )
+        evaluation = _clean(parse_evaluation(response.choices[0].message.content))
+    except Exception as e:
+        logger.error(f"Groq API error: {e}")
+        evaluation = error_evaluation(e)
+
+    _cache_store(key, evaluation)
+    return _evaluator_result(state, evaluation)
+
+# ------------------ STREAMING ------------------
+# Cleared when the provider rejects response_format on a streamed request
+_stream_format_supported = True
+
+def _open_verdict_stream(state: EvaluatorState):
+    global _stream_format_supported
+    kwargs = dict(
+        node="evaluator",
+        model=EVALUATOR_MODEL,
+        messages=[{"role": "user", "content": build_evaluator_prompt(state)}],
+        temperature=EVALUATOR_TEMPERATURE,
+        max_tokens=200,
+        stream=True
+    )
+    if _stream_format_supported:
+        kwargs.update(response_format_kwargs())
+    try:
+        return chat_completion(**kwargs)
+    except groq.BadRequestError:
+        if "response_format" not in kwargs:
+            raise
+        # Not every model streams structured output; the prompt still asks for JSON
+        logger.warning("Streaming with response_format rejected; streaming without it")
+        _stream_format_supported = False
+        kwargs.pop("response_format")
+        return chat_completion(**kwargs)
+
+def stream_evaluation(state: EvaluatorState):
+    """
+    Streaming variant of evaluator_node.
+    Yields ("verdict", verdict) as soon as that field of the JSON is complete,
+    ("field", (name, value)) for the fields after it, then ("evaluation",
+    evaluation) with the whole result. Fast-path and cached verdicts are
+    yielded immediately.
+    """
+    evaluation = fast_verdict(state.get("doctor_message", ""), state.get("patient_history", []))
+    key = None
+    if evaluation is None:
+        key, cached = _cache_lookup(state)
+        evaluation = dict(cached) if cached is not None else None
+    if evaluation is not None:
+        yield "verdict", evaluation["verdict"]
+        yield "evaluation", evaluation
+        return
+
+    parser = JSONFieldStream()
+    sent_verdict = False
+    try:
+        for chunk in _open_verdict_stream(state):
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if not token:
+                continue
+            for name, value in parser.feed(token):
+                if name == "verdict" and not sent_verdict:
+                    sent_verdict = True
+                    yield "verdict", value
+                elif name != "verdict" and value:
+                    yield "field", (name, value)
+        evaluation = evaluation_from_stream(parser)
+    except Exception as e:
+        logger.error(f"Groq API error: {e}")
+        NODE_FALLBACKS.labels("evaluator", fallback_kind(e)).inc()
+        key = None  # a cut-short reply is not cached
+        if "verdict" in parser.fields:
+            evaluation = _clean(dict(parser.fields))
+        else:
+            evaluation = {"verdict": "ERROR", "reason": str(e)}
+
+    if not sent_verdict:
+        yield "verdict", evaluation["verdict"]
+    _cache_store(key, evaluation)
+    yield "evaluation", evaluation
+
+# Build the state graph
+builder = StateGraph(EvaluatorState)
+builder.add_node("evaluator", RunnableCallable(
+    instrument_node("evaluator", evaluator_node), instrument_node("evaluator", aevaluator_node)
+))
+builder.set_entry_point("evaluator")
+builder.add_edge("evaluator", END)
+evaluator_graph = builder.compile()
+
+
+
+# ------------------ BATCH EVALUATION ------------------
+async def aevaluate_batch(items: List[Dict], max_concurrency: int = BATCH_MAX_CONCURRENCY,
+                          use_cache: bool = True):
+    """
+    Runs evaluator_graph over many (doctor_message, patient_history) items with
+    at most max_concurrency upstream calls in flight. Results keep input order;
+    a failing item is reported in its own slot instead of failing the batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(index, item):
+        # Latency is measured from when the item gets a slot, not from batch start
+        start = time.perf_counter()
+        result = {"index": index}
+        try:
+            doctor_message = str(item.get("doctor_message", "")).strip()
+            if not doctor_message:
+                raise ValueError("doctor_message is required")
+            async with semaphore:
+                start = time.perf_counter()
+                state = await evaluator_graph.ainvoke({
+                    "doctor_message": doctor_message,
+                    "patient_history": item.get("patient_history", []),
+                    "evaluation": {},
+                    "use_cache": use_cache
+                })
+            evaluation = state.get("evaluation", {})
+            result["evaluation"] = evaluation
+            if evaluation.get("verdict") == "ERROR":
+                result["error"] = evaluation.get("reason", "Evaluation failed")
+        except Exception as e:
+            result["error"] = str(e)
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    return await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+
+def evaluate_batch(items: List[Dict], max_concurrency: int = BATCH_MAX_CONCURRENCY,
+                   use_cache: bool = True):
+    """Sync entry point for request handlers; see aevaluate_batch."""
+    return run_async(aevaluate_batch(items, max_concurrency, use_cache))
+
+def batch_request(body: Dict):
+    """
+    Serves a /api/evaluate/batch request body: validates the items and the
+    requested concurrency, grades the batch and returns (payload, status).
+    """
+    items = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        return {"error": "items must be a non-empty list"}, 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return {"error": f"At most {BATCH_MAX_ITEMS} items per batch"}, 400
+    if not all(isinstance(item, dict) for item in items):
+        return {"error": "Each item must be an object"}, 400
+
+    try:
+        max_concurrency = int(body.get("max_concurrency", BATCH_MAX_CONCURRENCY))
+    except (TypeError, ValueError):
+        return {"error": "max_concurrency must be an integer"}, 400
+    max_concurrency = min(max(max_concurrency, 1), BATCH_MAX_CONCURRENCY)
+
+    start = time.perf_counter()
+    results = evaluate_batch(items, max_concurrency, body.get("cache", True) is not False)
+    return {
+        "results": results,
+        "summary": {
+            "count": len(results),
+            "failed": sum(1 for r in results if "error" in r),
+            "max_concurrency": max_concurrency,
+            "total_latency_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+    }, 200
@@ -1,107 +1,315 @@
-# graph/treatment_graph.py
-from typing import TypedDict, List
-from langgraph.graph import StateGraph, END
-from groq import Groq
-from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage, AIMessage
-import os
-
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
-# ------------------ STATE ------------------
-class TreatmentState(TypedDict):
-    messages: List[HumanMessage | AIMessage]
-    clarification_used: bool
-    conversation_end: bool
-
-# ------------------ NODE ------------------
-def treatment_node(state: TreatmentState):
-    messages = state.get("messages", [])
-    clarification_used = state.get("clarification_used", False)
-    conversation_end = state.get("conversation_end", False)
-
-    if conversation_end:
-        return state
-
-    # Convert to Groq format
-    groq_messages = []
-    for msg in messages:
-        role = "user" if isinstance(msg, HumanMessage) else "assistant"
-        groq_messages.append({"role": role, "content": msg.content})
-
-    # ---------------- SYSTEM PROMPT ----------------
-    if not clarification_used:
-        system_prompt = """You are a patient receiving a prescription from a doctor.
-
-**Instructions:**
-- Read the doctor's prescription carefully
-- If ANYTHING is unclear (dosage, timing, duration, how to take it), ask ONE clarifying question
-- Be natural and conversational
-- Do NOT accept the prescription yet - first clarify if needed
-- If everything is clear, say you understand and will follow it
-
-**Examples:**
-- Doctor: "Take this paracetamol twice daily" → Patient: "Thank you doctor. Should I take it before or after meals?"
-- Doctor: "Apply this cream on the affected area" → Patient: "How many times a day should I apply it?"
-- Doctor: "Take 500mg of amoxicillin three times a day for 5 days, preferably after meals" → Patient: "Thank you doctor, I understand. I'll take it as prescribed."
-"""
-    else:
-        system_prompt = """You are a patient whose question has been answered by the doctor.
-
-**Instructions:**
-- Thank the doctor politely
-- Confirm you understand and will follow the prescription
-- Keep it brief (1-2 sentences)
-- End the conversation naturally
-
-**Example:**
-"Thank you doctor, that's clear now. I'll make sure to take it as you've explained."
-"""
-
-    # ---------------- MODEL CALL ----------------
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # ✅ FIXED: Valid Groq model
-            messages=[{"role": "system", "content": system_prompt}, *groq_messages],
-            temperature=0.7,
-            max_tokens=100
-        )
-        reply = response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Groq API Error: {e}")
-        reply = "Thank you doctor, I understand and will follow your advice."
-        clarification_used = True
-        conversation_end = True
-
-    # ---------------- CLARIFICATION LOGIC ----------------
-    clarification_indicators = ["?", "how", "when", "should i", "do i", "which", "what"]
-    asked_question = any(indicator in reply.lower() for indicator in clarification_indicators)
-
-    if clarification_used:
-        # Already asked a question, now accept
-        conversation_end = True
-    elif asked_question:
-        # First clarification
-        clarification_used = True
-        conversation_end = False
-    else:
-        # Accepted directly without questions
-        conversation_end = True
-
-    return {
-        "messages": messages + [AIMessage(content=reply)],
-        "clarification_used": clarification_used,
-        "conversation_end": conversation_end
-    }
-
-# ------------------ GRAPH ------------------
-builder = StateGraph(TreatmentState)
-builder.add_node("treatment", treatment_node)
-builder.set_entry_point("treatment")
-builder.add_edge("treatment", END)
-treatment_graph = builder.compile()
-
-
-
-
+# graph/treatment_graph.py
+from typing import TypedDict, Optional
+from langgraph.graph import StateGraph, END
+from langgraph.utils.runnable import RunnableCallable
+from utils.llm_client import chat_completion, achat_completion
+from utils.history import CompactedHistory, compact_history, acompact_history, with_history
+from utils.metrics import NODE_FALLBACKS, Counter, instrument_node
+from utils.resilience import fallback_kind
+from utils.transcript import DOCTOR, PATIENT, Transcript, as_transcript
+from utils.prescription import (
+    FIELD_DESCRIPTIONS, Prescription, acceptance_reply, clarification_question, parse_prescription
+)
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+TREATMENT_MODEL = "llama-3.3-70b-versatile"  # ✅ FIXED: Valid Groq model
+FALLBACK_REPLY = "Thank you doctor, I understand and will follow your advice."
+
+# "1" lets the LLM phrase the parser's clarification question (the field stays fixed)
+LLM_PHRASING = os.getenv("TREATMENT_LLM_PHRASING", "0") == "1"
+
+TREATMENT_TURNS = Counter("treatment_turns_total", "Treatment turns by how the reply was produced", ["path"])
+
+# ------------------ STATE ------------------
+class TreatmentState(TypedDict):
+    messages: Transcript
+    clarification_used: bool
+    conversation_end: bool
+    treatment_start: Optional[int]  # index in messages of the prescription
+    history_summary: str
+    summarized_count: int
+
+# ------------------ PROMPT ------------------
+def build_treatment_request(state: TreatmentState, history: CompactedHistory):
+    """Returns the Groq chat payload (system prompt + history) for a treatment turn."""
+    clarification_used = state.get("clarification_used", False)
+
+    # ---------------- SYSTEM PROMPT ----------------
+    if not clarification_used:
+        system_prompt = """You are a patient receiving a prescription from a doctor.
+
+**Instructions:**
+- Read the doctor's prescription carefully
+- If ANYTHING is unclear (dosage, timing, duration, how to take it), ask ONE clarifying question
+- Be natural and conversational
+- Do NOT accept the prescription yet - first clarify if needed
+- If everything is clear, say you understand and will follow it
+
+**Examples:**
+- Doctor: "Take this paracetamol twice daily" → Patient: "Thank you doctor. Should I take it before or after meals?"
+- Doctor: "Apply this cream on the affected area" → Patient: "How many times a day should I apply it?"
+- Doctor: "Take 500mg of amoxicillin three times a day for 5 days, preferably after meals" → Patient: "Thank you doctor, I understand. I'll take it as prescribed."
+"""
+    else:
+        system_prompt = """You are a patient whose question has been answered by the doctor.
+
+**Instructions:**
+- Thank the doctor politely
+- Confirm you understand and will follow the prescription
+- Keep it brief (1-2 sentences)
+- End the conversation naturally
+
+**Example:**
+"Thank you doctor, that's clear now. I'll make sure to take it as you've explained."
+"""
+
+    return with_history(system_prompt, history)
+
+# ------------------ CLARIFICATION LOGIC ------------------
+def finalize_treatment_turn(state: TreatmentState, reply: str, history: CompactedHistory,
+                            failed: bool = False, asked: Optional[bool] = None):
+    """
+    Appends the patient reply and advances the clarification state machine.
+    asked is known exactly on the parser path; free-form LLM replies are
+    classified by looking for question words.
+    """
+    messages = as_transcript(state.get("messages"))
+    clarification_used = state.get("clarification_used", False)
+
+    if failed:
+        clarification_used = True
+
+    if asked is not None:
+        asked_question = asked
+    else:
+        clarification_indicators = ["?", "how", "when", "should i", "do i", "which", "what"]
+        asked_question = any(indicator in reply.lower() for indicator in clarification_indicators)
+
+    if clarification_used:
+        # Already asked a question, now accept
+        conversation_end = True
+    elif asked_question:
+        # First clarification
+        clarification_used = True
+        conversation_end = False
+    else:
+        # Accepted directly without questions
+        conversation_end = True
+
+    return {
+        "messages": messages.add(PATIENT, reply),
+        "clarification_used": clarification_used,
+        "conversation_end": conversation_end,
+        "treatment_start": state.get("treatment_start"),
+        "history_summary": history.summary,
+        "summarized_count": history.summarized
+    }
+
+# ------------------ PRESCRIPTION PARSER ------------------
+def prescription_messages(state: TreatmentState):
+    """
+    The doctor's prescription and at most one clarification answer. Earlier
+    consultation questions in the same session are not part of it.
+    """
+    messages = as_transcript(state.get("messages"))
+    start = state.get("treatment_start")
+    if start is None:
+        # Client that does not send treatment_start: the prescription is the
+        # latest doctor message, or the one before it once a question was asked
+        doctor = messages.contents(DOCTOR)
+        return doctor[-2:] if state.get("clarification_used", False) else doctor[-1:]
+    return [content for role, content in list(messages)[start:] if role == DOCTOR][:2]
+
+def plan_treatment_turn(state: TreatmentState):
+    """
+    Decides the turn from the parsed prescription (see prescription_messages).
+    Returns (prescription, field): field is the one missing detail to ask
+    about, or None to accept. Returns None when the text is not a
+    single-drug prescription the parser understands; the LLM answers those.
+    """
+    prescription = parse_prescription(" ".join(prescription_messages(state)))
+    if not prescription.is_medication:
+        return None
+
+    # One clarification per prescription, as before: the doctor's answer is accepted
+    if state.get("clarification_used", False):
+        return prescription, None
+
+    missing = prescription.missing()
+    return prescription, (missing[0] if missing else None)
+
+def build_question_request(state: TreatmentState, field: str):
+    """Groq payload asking the LLM to phrase a question about exactly one field."""
+    doctor_message = as_transcript(state.get("messages")).last(DOCTOR)
+    system_prompt = f"""You are a patient receiving a prescription from a doctor.
+The prescription does not say {FIELD_DESCRIPTIONS[field]}.
+Thank the doctor and ask ONE short, natural question about exactly that. Ask about nothing else."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": doctor_message}
+    ]
+
+def scripted_treatment_turn(state: TreatmentState, prescription: Prescription, field: Optional[str],
+                            question: Optional[str] = None):
+    """Finalizes a parser-decided turn without an upstream call (question may be LLM-phrased)."""
+    history = CompactedHistory([], state.get("history_summary", ""), state.get("summarized_count", 0))
+    if field is None:
+        TREATMENT_TURNS.labels("scripted_accept").inc()
+        reply = acceptance_reply(prescription, clarified=state.get("clarification_used", False))
+        return finalize_treatment_turn(state, reply, history, asked=False)
+
+    TREATMENT_TURNS.labels("scripted_clarify").inc()
+    reply = question or clarification_question(prescription, field)
+    return finalize_treatment_turn(state, reply, history, asked=True)
+
+def phrase_question(state: TreatmentState, field: Optional[str]):
+    """LLM phrasing of the clarification question, or None to use the template."""
+    if field is None or not LLM_PHRASING:
+        return None
+    try:
+        response = chat_completion(
+            node="treatment",
+            model=TREATMENT_MODEL,
+            messages=build_question_request(state, field),
+            temperature=0.7,
+            max_tokens=60
+        )
+        return response.choices[0].message.content.strip() or None
+    except Exception as e:
+        logger.error(f"Groq API error: {e}")
+        NODE_FALLBACKS.labels("treatment", fallback_kind(e)).inc()
+        return None
+
+async def aphrase_question(state: TreatmentState, field: Optional[str]):
+    if field is None or not LLM_PHRASING:
+        return None
+    try:
+        response = await achat_completion(
+            node="treatment",
+            model=TREATMENT_MODEL,
+            messages=build_question_request(state, field),
+            temperature=0.7,
+            max_tokens=60
+        )
+        return response.choices[0].message.content.strip() or None
+    except Exception as e:
+        logger.error(f"Groq API error: {e}")
+        NODE_FALLBACKS.labels("treatment", fallback_kind(e)).inc()
+        return None
+
+# ------------------ NODE ------------------
+def treatment_node(state: TreatmentState):
+    if state.get("conversation_end", False):
+        return state
+
+    plan = plan_treatment_turn(state)
+    if plan is not None:
+        prescription, field = plan
+        return scripted_treatment_turn(state, prescription, field, phrase_question(state, field))
+
+    TREATMENT_TURNS.labels("llm").inc()
+    history = compact_history(state)
+    try:
+        response = chat_completion(
+            node="treatment",
+            model=TREATMENT_MODEL,
+            messages=build_treatment_request(state, history),
+            temperature=0.7,
+            max_tokens=100
+        )
+        reply = response.choices[0].message.content.strip()
+    except Exception as e:
+        logger.error(f"Groq API error: {e}")
+        NODE_FALLBACKS.labels("treatment", fallback_kind(e)).inc()
+        return finalize_treatment_turn(state, FALLBACK_REPLY, history, failed=True)
+
+    return finalize_treatment_turn(state, reply, history)
+
+async def atreatment_node(state: TreatmentState):
+    """Async twin of treatment_node, used by treatment_graph.ainvoke."""
+    if state.get("conversation_end", False):
+        return state
+
+    plan = plan_treatment_turn(state)
+    if plan is not None:
+        prescription, field = plan
+        return scripted_treatment_turn(state, prescription, field, await aphrase_question(state, field))
+
+    TREATMENT_TURNS.labels("llm").inc()
+    history = await acompact_history(state)
+    try:
+        response = await achat_completion(
+            node="treatment",
+            model=TREATMENT_MODEL,
+            messages=build_treatment_request(state, history),
+            temperature=0.7,
+            max_tokens=100
+        )
+        reply = response.choices[0].message.content.strip()
+    except Exception as e:
+        logger.error(f"Groq API error: {e}")
+        NODE_FALLBACKS.labels("treatment", fallback_kind(e)).inc()
+        return finalize_treatment_turn(state, FALLBACK_REPLY, history, failed=True)
+
+    return finalize_treatment_turn(state, reply, history)
+
+def stream_treatment_reply(state: TreatmentState):
+    """
+    Streaming variant of treatment_node.
+    Yields ("token", text) as Groq produces them, then ("state", new_state)
+    once the clarification logic has run on the complete reply.
+    """
+    if state.get("conversation_end", False):
+        yield "state", state
+        return
+
+    plan = plan_treatment_turn(state)
+    if plan is not None:
+        prescription, field = plan
+        new_state = scripted_treatment_turn(state, prescription, field, phrase_question(state, field))
+        yield "token", new_state["messages"].last()
+        yield "state", new_state
+        return
+
+    TREATMENT_TURNS.labels("llm").inc()
+    history = compact_history(state)
+    parts = []
+    try:
+        stream = chat_completion(
+            node="treatment",
+            model=TREATMENT_MODEL,
+            messages=build_treatment_request(state, history),
+            temperature=0.7,
+            max_tokens=100,
+            stream=True
+        )
+        for chunk in stream:
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                parts.append(token)
+                yield "token", token
+    except Exception as e:
+        logger.error(f"Groq API error: {e}")
+        NODE_FALLBACKS.labels("treatment", fallback_kind(e)).inc()
+        if not parts:
+            yield "token", FALLBACK_REPLY
+            yield "state", finalize_treatment_turn(state, FALLBACK_REPLY, history, failed=True)
+            return
+
+    yield "state", finalize_treatment_turn(state, "".join(parts).strip(), history)
+
+# ------------------ GRAPH ------------------
+builder = StateGraph(TreatmentState)
+builder.add_node("treatment", RunnableCallable(
+    instrument_node("treatment", treatment_node), instrument_node("treatment", atreatment_node)
+))
+builder.set_entry_point("treatment")
+builder.add_edge("treatment", END)
+treatment_graph = builder.compile()
+
+
+
+
@@ -0,0 +1,62 @@
+# graph/turn_graph.py
+from typing import TypedDict, List, Dict
+from langgraph.graph import StateGraph, START, END
+from langgraph.utils.runnable import RunnableCallable
+from graph.patient_graph import patient_node, apatient_node
+from graph.evaluator_graph import evaluator_node, aevaluator_node
+from utils.metrics import instrument_node
+from utils.transcript import Transcript, as_transcript
+
+class TurnState(TypedDict):
+    # Patient branch
+    messages: Transcript
+    revealed_symptoms: List[str]
+    conversation_end: bool
+    history_summary: str
+    summarized_count: int
+    case_id: str
+    # Evaluator branch
+    doctor_message: str
+    patient_history: List[str]
+    evaluation: Dict
+    use_cache: bool
+
+# ------------------ INPUT ------------------
+def history_lines(messages, start: int = 0, stop: int = None) -> List[str]:
+    """Formats graph messages as the "Doctor: ..." / "Patient: ..." lines the evaluator reads."""
+    return as_transcript(messages).lines(start, stop)
+
+def build_turn_state(patient_state: Dict, use_cache: bool = True) -> TurnState:
+    """
+    Extends a patient graph input (ending with the doctor's new message) with
+    the evaluator fields, so both branches grade and answer the same turn.
+    Messages already folded into history_summary are passed as that summary
+    rather than as lines.
+    """
+    messages = as_transcript(patient_state["messages"])
+    summarized = patient_state.get("summarized_count", 0)
+    return {
+        **patient_state,
+        "messages": messages,
+        "doctor_message": messages.last(),
+        "patient_history": history_lines(messages, summarized, -1),
+        "evaluation": {},
+        "use_cache": use_cache
+    }
+
+# ------------------ GRAPH ------------------
+# Both nodes start from START, so LangGraph runs them in the same superstep:
+# concurrently on the executor for invoke, as tasks for ainvoke. They write
+# disjoint keys, so no reducers are needed.
+builder = StateGraph(TurnState)
+builder.add_node("patient", RunnableCallable(
+    instrument_node("patient", patient_node), instrument_node("patient", apatient_node)
+))
+builder.add_node("evaluator", RunnableCallable(
+    instrument_node("evaluator", evaluator_node), instrument_node("evaluator", aevaluator_node)
+))
+builder.add_edge(START, "patient")
+builder.add_edge(START, "evaluator")
+builder.add_edge("patient", END)
+builder.add_edge("evaluator", END)
+turn_graph = builder.compile()
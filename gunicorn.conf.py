@@ -0,0 +1,62 @@
+# gunicorn.conf.py
+"""
+Production server for running the backend outside Vercel:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each request spends almost all of its time waiting on Groq, so workers use
+gevent: one process serves WORKER_CONNECTIONS requests cooperatively
+instead of one per thread, and one worker per core is enough (more only
+add context switching; see benchmarks/bench_server.py). SQLite calls (the
+rate limiter, SESSION_BACKEND=sqlite) run on gevent's native threadpool
+(utils/blocking.py), so a busy database parks one request, not the worker.
+Every worker imports and compiles the graphs before it accepts traffic. On
+SIGTERM, in-flight requests (streams included) get GRACEFUL_TIMEOUT seconds
+to finish.
+
+Sessions must be shared between workers: use SESSION_BACKEND=sqlite when
+WEB_CONCURRENCY > 1 (the in-memory store is per process).
+
+    BIND                address (default 0.0.0.0:$PORT, PORT default 8000)
+    WEB_CONCURRENCY     worker processes (default one per CPU)
+    WORKER_CLASS        gevent (default), gthread or sync
+    WORKER_CONNECTIONS  concurrent requests per gevent worker (default 1000)
+    THREADS             threads per gthread worker (default 8)
+    TIMEOUT             seconds before a silent worker is restarted (default 60)
+    GRACEFUL_TIMEOUT    seconds to drain on shutdown (default 30)
+    KEEPALIVE           keep-alive seconds for client connections (default 5)
+    WARM_GRAPHS         "0" skips compiling the graphs at worker start
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = os.getenv("WORKER_CLASS", "gevent")
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", "1000"))
+threads = int(os.getenv("THREADS", "8"))
+# Above the per-request deadline (REQUEST_DEADLINE_S), so only a stuck worker is killed
+timeout = int(os.getenv("TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# The app is loaded in each worker, after gevent has patched the standard
+# library, so the Groq client, locks and session writer are cooperative
+preload_app = False
+accesslog = os.getenv("ACCESS_LOG") or None
+errorlog = "-"
+
+
+def when_ready(server):
+    if workers > 1 and os.getenv("SESSION_BACKEND", "memory") == "memory":
+        server.log.warning("In-memory sessions are per worker; set SESSION_BACKEND=sqlite "
+                           "so every worker sees every session")
+
+
+def post_worker_init(worker):
+    # The app module is loaded at this point; compile every graph before traffic
+    if os.getenv("WARM_GRAPHS", "1") != "0":
+        from api.index import warm_graphs
+
+        warm_graphs()
+        worker.log.info("Graphs warmed in worker %s", worker.pid)
@@ -0,0 +1,260 @@
+# tools/replay.py
+"""
+Replays recorded consults through the graphs for regression and throughput
+testing, e.g. last week's traffic before a prompt change.
+
+Each JSONL line is one session: {"session_id", "kind": "consult" |
+"treatment", "case_id", "turns": [doctor messages...]}, or a stored API
+transcript {"session_id", "messages": [{"role", "content"}, ...]} whose
+doctor messages are replayed as a consult. Consult turns go through
+evaluator_graph and patient_graph, treatment turns through
+treatment_graph. Sessions run --concurrency at a time, turns within a
+session in order.
+
+Every graph call is written to --out as one record (latency, upstream calls
+and tokens, reply or verdict). The printed summary has latency percentiles,
+tokens per turn, fallbacks and the verdict distribution per graph, plus the
+differences against --baseline (a previous --out file).
+
+    python -m tools.replay benchmarks/data/replay_consults.jsonl --out before.jsonl
+    python -m tools.replay benchmarks/data/replay_consults.jsonl --baseline before.jsonl
+    python -m tools.replay consults.jsonl --upstream groq --concurrency 4   # GROQ_API_KEY required
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_groq import add_upstream_arguments, server_from_args
+from benchmarks.load_test import percentile
+
+
+def load_sessions(path, limit=0):
+    sessions = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            session = json.loads(line)
+            session.setdefault("session_id", f"s{i:05d}")
+            if "turns" not in session:
+                session["turns"] = [m.get("content", "") for m in session.get("messages", [])
+                                    if m.get("role") == "doctor"]
+            session.setdefault("kind", "consult")
+            sessions.append(session)
+            if limit and len(sessions) >= limit:
+                break
+    return sessions
+
+
+# ------------------ REPLAY ------------------
+def _timed(graph, state):
+    from utils.llm_client import usage_scope
+
+    with usage_scope() as usage:
+        start = time.perf_counter()
+        result = graph.invoke(state)
+        latency_ms = (time.perf_counter() - start) * 1000
+    return result, {"latency_ms": round(latency_ms, 2), **usage.as_dict()}
+
+
+def replay_consult(session, use_cache, evaluate):
+    from graph.evaluator_graph import evaluator_graph
+    from graph.patient_graph import patient_graph, FALLBACK_REPLY
+    from utils.transcript import DOCTOR, Transcript
+
+    records = []
+    state = {
+        "messages": Transcript(),
+        "revealed_symptoms": [],
+        "conversation_end": False,
+        "case_id": session.get("case_id"),
+        "use_cache": use_cache
+    }
+    for turn, doctor_message in enumerate(session["turns"]):
+        key = {"session_id": session["session_id"], "turn": turn, "doctor_message": doctor_message}
+        messages = state["messages"]
+        if evaluate:
+            result, stats = _timed(evaluator_graph, {
+                "doctor_message": doctor_message,
+                "patient_history": messages.lines(state.get("summarized_count", 0)),
+                "history_summary": state.get("history_summary", ""),
+                "evaluation": {},
+                "use_cache": use_cache
+            })
+            evaluation = result.get("evaluation", {})
+            records.append({**key, "graph": "evaluator", **stats,
+                            "verdict": evaluation.get("verdict"),
+                            "source": evaluation.get("source", "llm")})
+
+        state, stats = _timed(patient_graph, {**state, "messages": messages.add(DOCTOR, doctor_message)})
+        reply = state["messages"].last()
+        records.append({**key, "graph": "patient", **stats, "reply": reply,
+                        "fallback": reply == FALLBACK_REPLY,
+                        "revealed_symptoms": state.get("revealed_symptoms", [])})
+    return records
+
+
+def replay_treatment(session):
+    from graph.treatment_graph import treatment_graph, FALLBACK_REPLY
+    from utils.transcript import DOCTOR, Transcript
+
+    records = []
+    state = {"messages": Transcript(), "clarification_used": False, "conversation_end": False,
+             "treatment_start": 0}
+    for turn, prescription in enumerate(session["turns"]):
+        if state.get("conversation_end"):
+            break
+        state, stats = _timed(treatment_graph, {**state, "messages": state["messages"].add(DOCTOR, prescription)})
+        reply = state["messages"].last()
+        records.append({"session_id": session["session_id"], "turn": turn, "doctor_message": prescription,
+                        "graph": "treatment", **stats, "reply": reply,
+                        "fallback": reply == FALLBACK_REPLY,
+                        "conversation_end": state.get("conversation_end", False)})
+    return records
+
+
+def replay(sessions, concurrency, use_cache=False, evaluate=True):
+    records = []
+    lock = threading.Lock()
+
+    def run(session):
+        try:
+            if session["kind"] == "treatment":
+                result = replay_treatment(session)
+            else:
+                result = replay_consult(session, use_cache, evaluate)
+        except Exception as e:
+            result = [{"session_id": session["session_id"], "turn": -1, "graph": session["kind"],
+                       "error": str(e)}]
+        with lock:
+            records.extend(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        list(pool.map(run, sessions))
+    elapsed = time.perf_counter() - start
+    records.sort(key=lambda r: (r["session_id"], r["turn"], r["graph"]))
+    return records, elapsed
+
+
+# ------------------ REPORTS ------------------
+def summarize(records, elapsed):
+    by_graph = defaultdict(list)
+    for record in records:
+        by_graph[record["graph"]].append(record)
+
+    report = {"sessions": len({r["session_id"] for r in records}), "elapsed_s": round(elapsed, 2),
+              "graph_calls_per_s": round(len(records) / elapsed, 2) if elapsed else None, "graphs": {}}
+    for graph, rows in sorted(by_graph.items()):
+        ok = [r for r in rows if "error" not in r]
+        latencies = sorted(r["latency_ms"] for r in ok)
+        summary = {
+            "turns": len(rows),
+            "failed": len(rows) - len(ok),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "upstream_calls": sum(r["calls"] for r in ok),
+            "upstream_errors": sum(r["errors"] for r in ok),
+            "prompt_tokens_per_turn": round(sum(r["prompt_tokens"] for r in ok) / len(ok), 1) if ok else 0,
+            "completion_tokens_per_turn": round(sum(r["completion_tokens"] for r in ok) / len(ok), 1) if ok else 0
+        }
+        if graph == "evaluator":
+            summary["verdicts"] = dict(Counter(r["verdict"] for r in ok))
+            summary["fast_path"] = sum(1 for r in ok if r.get("source") == "fast_path")
+        else:
+            summary["fallbacks"] = sum(1 for r in ok if r.get("fallback"))
+        report["graphs"][graph] = summary
+    return report
+
+
+def diff(records, baseline, examples=10):
+    """Turn-by-turn comparison with a previous run, matched on (session, turn, graph)."""
+    def keyed(rows):
+        return {(r["session_id"], r["turn"], r["graph"]): r for r in rows if "error" not in r}
+
+    now, before = keyed(records), keyed(baseline)
+    common = sorted(set(now) & set(before))
+    result = {
+        "matched_turns": len(common),
+        "only_in_baseline": len(set(before) - set(now)),
+        "only_in_this_run": len(set(now) - set(before)),
+        "graphs": {}
+    }
+
+    by_graph = defaultdict(list)
+    for key in common:
+        by_graph[key[2]].append((before[key], now[key]))
+    for graph, pairs in sorted(by_graph.items()):
+        old_latency = sorted(b["latency_ms"] for b, _ in pairs)
+        new_latency = sorted(n["latency_ms"] for _, n in pairs)
+        summary = {
+            "turns": len(pairs),
+            "p50_ms": [round(percentile(old_latency, 50), 1), round(percentile(new_latency, 50), 1)],
+            "p95_ms": [round(percentile(old_latency, 95), 1), round(percentile(new_latency, 95), 1)],
+            "prompt_tokens": [sum(b["prompt_tokens"] for b, _ in pairs), sum(n["prompt_tokens"] for _, n in pairs)],
+            "completion_tokens": [sum(b["completion_tokens"] for b, _ in pairs),
+                                  sum(n["completion_tokens"] for _, n in pairs)]
+        }
+        field = "verdict" if graph == "evaluator" else "reply"
+        changed = [(b, n) for b, n in pairs if b.get(field) != n.get(field)]
+        summary["verdicts_changed" if graph == "evaluator" else "replies_changed"] = len(changed)
+        if graph == "evaluator":
+            summary["verdict_transitions"] = dict(Counter(f"{b['verdict']} -> {n['verdict']}" for b, n in changed))
+        summary["examples"] = [
+            {"session_id": n["session_id"], "turn": n["turn"], "doctor_message": n.get("doctor_message"),
+             "before": b.get(field), "after": n.get(field)}
+            for b, n in changed[:examples]
+        ]
+        result["graphs"][graph] = summary
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("sessions", help="JSONL of recorded sessions")
+    parser.add_argument("--upstream", choices=["fake", "groq"], default="fake",
+                        help="local fake upstream (default) or the real Groq API")
+    parser.add_argument("--concurrency", type=int, default=8, help="sessions replayed at once")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N sessions")
+    parser.add_argument("--out", help="write per-turn records (JSONL) here")
+    parser.add_argument("--baseline", help="per-turn records of a previous run to diff against")
+    parser.add_argument("--cache", action="store_true", help="let the evaluator and patient use their caches")
+    parser.add_argument("--no-evaluate", action="store_true", help="skip evaluator_graph on consult turns")
+    add_upstream_arguments(parser, latency_ms=100.0)
+    args = parser.parse_args()
+
+    sessions = load_sessions(args.sessions, args.limit)
+    upstream = None
+    if args.upstream == "fake":
+        upstream = server_from_args(args).start()
+        os.environ["GROQ_BASE_URL"] = upstream.base_url
+        os.environ.setdefault("GROQ_API_KEY", "fake")
+    elif not os.getenv("GROQ_API_KEY"):
+        parser.error("--upstream groq needs GROQ_API_KEY")
+
+    records, elapsed = replay(sessions, args.concurrency, args.cache, not args.no_evaluate)
+    if upstream:
+        upstream.shutdown()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    report = summarize(records, elapsed)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["diff"] = diff(records, [json.loads(line) for line in f if line.strip()])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
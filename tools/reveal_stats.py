@@ -0,0 +1,53 @@
+# tools/reveal_stats.py
+"""
+Symptom reveal statistics over stored consults.
+
+Reads JSONL where each line is one consult, either {"messages": [{"role",
+"content"}, ...]} (the API's transcript format) or {"replies": [...]} with
+the patient replies only, and prints per-symptom reveal rates, mean turn of
+first reveal and the most common reveal orders as JSON.
+
+    python -m tools.reveal_stats consults.jsonl --case headache_fatigue
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.case_library import DEFAULT_CASE, get_case
+
+
+def iter_replies(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            consult = json.loads(line)
+            if "replies" in consult:
+                yield consult["replies"]
+            else:
+                yield [m.get("content", "") for m in consult.get("messages", [])
+                       if m.get("role") == "patient"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("corpus", help="JSONL file of consults")
+    parser.add_argument("--case", default=DEFAULT_CASE, help="case whose symptoms are tracked")
+    args = parser.parse_args()
+
+    matcher = get_case(args.case).matcher
+    start = time.perf_counter()
+    stats = matcher.scan_corpus(iter_replies(args.corpus))
+    elapsed = time.perf_counter() - start
+
+    stats["elapsed_s"] = round(elapsed, 3)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
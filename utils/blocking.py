@@ -0,0 +1,30 @@
+# utils/blocking.py
+"""
+Blocking calls that must not stall a gevent worker.
+
+Under gevent (gunicorn WORKER_CLASS=gevent) every request is a greenlet on
+one hub thread. Socket I/O yields to the hub, but SQLite does not: its busy
+handler sleeps in C, so one contended BEGIN IMMEDIATE would stall every
+request in the worker. run_blocking() sends such calls to gevent's pool of
+native threads and parks only the calling greenlet. Without gevent it just
+calls the function.
+
+Keep locks, events and caches on the calling side: gevent's patched
+primitives are not meant to be shared with native threads.
+"""
+import sys
+
+
+def _gevent_patched():
+    if "gevent.monkey" not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched("threading")
+
+
+def run_blocking(fn, *args):
+    """fn(*args), on gevent's native threadpool when the process is monkey-patched."""
+    if _gevent_patched():
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
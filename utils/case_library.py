@@ -0,0 +1,149 @@
+# utils/case_library.py
+"""
+Library of simulated patient cases.
+
+Each case is a JSON file in CASES_DIR; the file name (without .json) is the
+case_id sessions select it by:
+
+    {
+      "title": "Headaches, fatigue and occasional nausea",
+      "condition": "You have been experiencing ... for the past week.",
+      "duration": "about a week",
+      "jargon": "experiencing persistent cephalgia",
+      "symptoms": {"headache": ["headache", "head pain"], ...},
+      "examples": [["What brings you here today?", "I've been having ..."], ...]
+    }
+
+Startup only lists the directory. A case is read and compiled the first time
+it is used: its system prompts (normal and consultation-ending), symptom
+matcher and prompt token count are built once and held in an immutable
+PatientCase. Startup and per-turn cost stay flat as the library grows.
+
+    CASES_DIR       directory of case files (default <repo>/cases)
+    DEFAULT_CASE    case used when a session does not choose one (default headache_fatigue)
+"""
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Tuple
+
+from utils.symptom_matcher import SymptomMatcher
+
+CASES_DIR = os.getenv("CASES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cases"))
+DEFAULT_CASE = os.getenv("DEFAULT_CASE", "headache_fatigue")
+
+PATIENT_PROMPT = """You are a simulated patient in a medical consultation.
+
+**Your condition:** {condition}
+
+**Behavior rules:**
+- Speak naturally like a real patient, not like a medical textbook
+- Keep answers SHORT (1-3 sentences maximum)
+- Answer ONLY what the doctor directly asks
+- Do NOT volunteer information unless asked
+- Do NOT summarize or list all symptoms at once
+- Do NOT use bullet points or medical terminology
+- Reveal symptoms gradually and naturally
+- Show slight concern but remain cooperative
+- If asked about duration, say "{duration}"
+- If asked about severity, describe it conversationally (e.g., "quite bad" or "manageable")
+
+**Examples of good responses:**
+{examples}
+
+**Examples of bad responses (avoid these):**
+- Listing symptoms with bullets
+- Using medical terms like "{jargon}"
+- Giving too much detail at once
+- Summarizing the entire medical history"""
+
+ENDING_NOTE = "\n\nThe consultation is ending. Respond briefly and politely."
+
+
+class PatientCase(NamedTuple):
+    case_id: str
+    title: str
+    symptoms: Mapping[str, Tuple[str, ...]]
+    system_prompt: str
+    ending_prompt: str
+    prompt_tokens: int
+    matcher: SymptomMatcher
+
+    def prompt(self, conversation_end: bool = False) -> str:
+        return self.ending_prompt if conversation_end else self.system_prompt
+
+
+def compile_case(case_id: str, spec: Dict) -> PatientCase:
+    """Builds the immutable, ready-to-use form of one case file."""
+    # Imported here to keep utils.history (and the Groq client) out of the import chain
+    from utils.history import estimate_tokens
+
+    symptoms = MappingProxyType({name: tuple(keywords) for name, keywords in spec["symptoms"].items()})
+    examples = "\n".join(f'- Doctor: "{question}" → Patient: "{answer}"'
+                         for question, answer in spec.get("examples", []))
+    system_prompt = PATIENT_PROMPT.format(
+        condition=spec["condition"],
+        duration=spec.get("duration", "a few days"),
+        examples=examples,
+        jargon=spec.get("jargon", "experiencing acute symptoms")
+    )
+    return PatientCase(
+        case_id=case_id,
+        title=spec.get("title", case_id),
+        symptoms=symptoms,
+        system_prompt=system_prompt,
+        ending_prompt=system_prompt + ENDING_NOTE,
+        prompt_tokens=estimate_tokens(system_prompt),
+        matcher=SymptomMatcher(symptoms)
+    )
+
+
+class CaseLibrary:
+    """Case files indexed by id; each is compiled on first use and then shared."""
+
+    def __init__(self, directory: str = CASES_DIR):
+        self.directory = directory
+        self._paths = {
+            entry.name[:-len(".json")]: entry.path
+            for entry in os.scandir(directory)
+            if entry.name.endswith(".json") and entry.is_file()
+        } if os.path.isdir(directory) else {}
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, case_id) -> bool:
+        return case_id in self._paths
+
+    def ids(self) -> List[str]:
+        return sorted(self._paths)
+
+    def get(self, case_id: str) -> PatientCase:
+        """The compiled case; raises KeyError for an unknown case_id."""
+        case = self._compiled.get(case_id)
+        if case is None:
+            path = self._paths[case_id]
+            with self._lock:
+                case = self._compiled.get(case_id)
+                if case is None:
+                    with open(path, encoding="utf-8") as f:
+                        case = compile_case(case_id, json.load(f))
+                    self._compiled[case_id] = case
+        return case
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_library() -> CaseLibrary:
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                _library = CaseLibrary()
+    return _library
+
+
+def get_case(case_id: str = None) -> PatientCase:
+    return get_library().get(case_id or DEFAULT_CASE)
@@ -0,0 +1,286 @@
+# utils/conversation_log.py
+"""
+Non-blocking logging: structured per-turn conversation records and the
+application log, both handed to background threads.
+
+The request path only puts a record on a bounded queue. When a queue is
+full, the record is dropped and counted in log_records_dropped_total;
+the caller never waits. Everything else happens on the background thread:
+formatting, redaction, JSON encoding and file I/O.
+
+- Conversation records (log_turn) are JSON lines: endpoint, status,
+  latency, session and case id, verdict, token counts, and the doctor
+  message and reply. The writer drains up to CONVERSATION_LOG_BATCH records
+  per write and rotates its file at CONVERSATION_LOG_MAX_BYTES. Each process
+  writes its own file, conversations.<pid>.jsonl, so gunicorn workers never
+  rotate a file under each other.
+- Application logs (the standard logging module) go through a bounded
+  QueueHandler to a JSON stderr handler (setup_logging).
+
+Free-text fields pass through redact() before they are written. It masks
+emails, phone numbers, dates, ID and record numbers, street addresses and
+introduced names. CONVERSATION_LOG_TEXT=off keeps no message text at all.
+
+    CONVERSATION_LOG            "0" disables conversation records (default on)
+    CONVERSATION_LOG_DIR        directory of the JSONL files (default <tmpdir>/conversation_logs)
+    CONVERSATION_LOG_TEXT       "redacted" (default) keeps redacted message text, "off" drops it
+    CONVERSATION_LOG_MAX_BYTES  rotation size per file (default 10 MB)
+    CONVERSATION_LOG_BACKUPS    rotated files kept (default 5)
+    CONVERSATION_LOG_BATCH      records per write (default 256)
+    LOG_QUEUE_SIZE              records buffered per queue before dropping (default 10000)
+    LOG_LEVEL                   application log level (default INFO)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from utils.metrics import Counter
+
+ENABLED = os.getenv("CONVERSATION_LOG", "1") != "0"
+LOG_DIR = os.getenv("CONVERSATION_LOG_DIR", os.path.join(tempfile.gettempdir(), "conversation_logs"))
+LOG_TEXT = os.getenv("CONVERSATION_LOG_TEXT", "redacted")
+MAX_BYTES = int(os.getenv("CONVERSATION_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+BACKUPS = int(os.getenv("CONVERSATION_LOG_BACKUPS", "5"))
+BATCH_SIZE = int(os.getenv("CONVERSATION_LOG_BATCH", "256"))
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = ("doctor_message", "reply", "error")
+TEXT_MAX_CHARS = 500
+
+LOG_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the queue was full", ["stream"])
+LOG_WRITTEN = Counter("log_records_written_total", "Log records written by the background writers", ["stream"])
+
+
+# ------------------ REDACTION ------------------
+_REDACTIONS = [
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "[EMAIL]"),
+    (re.compile(r"\b\d{3}-\d{2}-\d{4}\b"), "[ID]"),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b"), "[DATE]"),
+    (re.compile(r"(?:\+\d{1,3}[\s.-]?)?(?:\(\d{3}\)|\b\d{3})[\s.-]?\d{3}[\s.-]?\d{4}\b"), "[PHONE]"),
+    (re.compile(r"\b\d{6,}\b"), "[ID]"),
+    (re.compile(r"\b\d+\s+(?:[A-Z][a-z]+\s+){1,3}(?:Street|St|Avenue|Ave|Road|Rd|Lane|Ln|Drive|Dr|"
+                r"Boulevard|Blvd|Court|Ct|Way)\b\.?"), "[ADDRESS]"),
+    (re.compile(r"(?i:\b(my name is|name is|name:|call me)\s+)[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?"), r"\1 [NAME]"),
+    (re.compile(r"\b(Mr|Mrs|Ms|Miss|Dr)\.?\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?"), r"\1 [NAME]"),
+]
+
+
+def redact(text):
+    """Masks direct identifiers in free text and caps its length."""
+    text = str(text)
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    if len(text) > TEXT_MAX_CHARS:
+        text = text[:TEXT_MAX_CHARS] + "…"
+    return text
+
+
+def redact_record(record):
+    record = dict(record)
+    for field in TEXT_FIELDS:
+        if record.get(field) is not None:
+            if LOG_TEXT == "off" and field != "error":
+                del record[field]
+            else:
+                record[field] = redact(record[field])
+    return record
+
+
+# ------------------ CONVERSATION RECORDS ------------------
+class JSONLWriter:
+    """
+    Bounded queue drained by one writer thread per process, restarted in a
+    forked child. Records are written in batches to a size-rotated file.
+    """
+
+    def __init__(self, directory=LOG_DIR, prefix="conversations", max_bytes=MAX_BYTES, backups=BACKUPS,
+                 queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE, transform=redact_record):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.transform = transform
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.prefix}.{os.getpid()}.jsonl")
+
+    def put(self, record):
+        """Queues a record without blocking; drops (and counts) it when the queue is full."""
+        try:
+            self._writer_queue().put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.labels(self.prefix).inc()
+
+    def flush(self, timeout=5.0):
+        """Waits until everything queued so far is written (tools, tests, exit)."""
+        if self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _writer_queue(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(self.queue_size)
+                    self._file = None
+                    threading.Thread(target=self._run, args=(self._queue,),
+                                     name=f"{self.prefix}-log-writer", daemon=True).start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def _run(self, records):
+        while True:
+            # Whatever queued up while the last batch was written goes out in one write
+            batch = [records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            waiters = [r for r in batch if isinstance(r, threading.Event)]
+            lines = []
+            for record in batch:
+                if isinstance(record, dict):
+                    try:
+                        lines.append(json.dumps(self.transform(record), default=str) + "\n")
+                    except Exception as e:
+                        logger.error(f"Unloggable conversation record dropped: {e}")
+            try:
+                if lines:
+                    self._write("".join(lines))
+                    LOG_WRITTEN.labels(self.prefix).inc(len(lines))
+            except OSError as e:
+                LOG_DROPPED.labels(self.prefix).inc(len(lines))
+                logger.error(f"Conversation log write failed: {e}")
+            for done in waiters:
+                done.set()
+
+    def _write(self, data):
+        path = self.path
+        if self._file is None or self._path != path:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file, self._path = open(path, "a", encoding="utf-8"), path
+        if self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self._path}.{i}"):
+                os.replace(f"{self._path}.{i}", f"{self._path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self._path, f"{self._path}.1")
+        else:
+            os.remove(self._path)
+        self._file = open(self._path, "a", encoding="utf-8")
+
+
+_writer = JSONLWriter()
+atexit.register(_writer.flush, 2.0)
+
+
+def get_writer():
+    return _writer
+
+
+def log_turn(**fields):
+    """Queues one per-turn record; returns immediately."""
+    if ENABLED:
+        _writer.put({"ts": round(time.time(), 3), **fields})
+
+
+# ------------------ APPLICATION LOG ------------------
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": redact(record.getMessage())
+        }
+        if record.exc_info:
+            entry["exc"] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler with a bounded queue: a full queue drops the record instead
+    of blocking the caller. Formatting is left to the listener thread, which
+    is restarted in a forked child.
+    """
+
+    def __init__(self, handlers, maxsize=QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = handlers
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.labels("app").inc()
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self.queue = queue.Queue(self.queue.maxsize)
+                self._listener = logging.handlers.QueueListener(self.queue, *self.handlers,
+                                                                respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        super().close()
+
+
+_logging_ready = False
+
+
+def setup_logging(level=LOG_LEVEL):
+    """Routes the root logger through a BoundedQueueHandler to JSON lines on stderr (idempotent)."""
+    global _logging_ready
+    if _logging_ready:
+        return
+    _logging_ready = True
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JSONFormatter())
+    root = logging.getLogger()
+    root.addHandler(BoundedQueueHandler([stream]))
+    root.setLevel(level)
@@ -0,0 +1,145 @@
+# utils/eval_fastpath.py
+"""
+Local fast path for the evaluator: answers the obvious REPETITIVE and
+IRRELEVANT cases without calling the 70B model, and defers everything else.
+
+- REPETITIVE: the question's character 3-gram vector (hashed, TF-IDF
+  weighted over the consult's doctor questions) has cosine similarity of at
+  least FAST_PATH_REPEAT with an earlier doctor question.
+- IRRELEVANT: the question uses off-topic vocabulary and no clinical
+  vocabulary at all.
+
+Both rules only fire when they are confident. A question that repeats a
+topic in new words, or a chatty question with a clinical hook, still goes to
+the LLM.
+
+    EVAL_FAST_PATH          "0" disables the fast path (default on)
+    EVAL_FAST_PATH_REPEAT   cosine threshold for REPETITIVE (default 0.85)
+"""
+import os
+import re
+
+import numpy as np
+
+from utils.metrics import Counter
+
+ENABLED = os.getenv("EVAL_FAST_PATH", "1") != "0"
+REPEAT_THRESHOLD = float(os.getenv("EVAL_FAST_PATH_REPEAT", "0.85"))
+
+NGRAM = 3
+DIMENSIONS = 1 << 20  # hashed n-gram space; collisions are negligible at consult sizes
+
+FAST_PATH = Counter("evaluator_fast_path_total", "Evaluator calls answered locally or deferred to the LLM",
+                    ["result"])
+
+CLINICAL_TERMS = frozenset("""
+    pain ache aches aching hurt hurts hurting sore headache headaches migraine fever temperature chills
+    sweat sweats sweating cough coughing breath breathing chest heart pulse pressure dizzy dizziness
+    faint nausea nauseous vomit vomiting sick queasy diarrhea constipation stomach appetite eat eating
+    food meal meals drink drinking water alcohol smoke smoking weight tired fatigue fatigued exhausted
+    energy sleep sleeping insomnia stress stressed anxious anxiety mood depressed vision eyes blurry
+    light noise neck back head rash itch swelling swollen bleeding blood urine medication medications
+    medicine medicines pill pills tablet tablets dose drug drugs allergy allergies allergic treatment
+    prescription ibuprofen paracetamol aspirin symptom symptoms condition illness injury accident
+    history family pregnant period surgery doctor hospital clinic test tests scan worse better severe
+    mild frequent often started start begin began long week weeks days day morning night trigger
+    triggers relieve relief caffeine coffee screen work exercise feel feeling felt health medical
+    travel travelled traveled travelling traveling trip abroad pet pets animal animals sport sports
+    activity active
+""".split())
+
+# Only words with no clinical reading. Weather (a trigger), phones and
+# screens, sport, hobbies, travel and pets are social or exposure history,
+# and words like "colour" or "show" turn up in clinical questions ("what
+# colour is the phlegm?"), so none of them are listed.
+OFF_TOPIC_TERMS = frozenset("""
+    favorite favourite movie movies film films celebrity celebrities actor actress politics political
+    election president zodiac horoscope crypto bitcoin lottery joke jokes fashion recipe
+""".split())
+
+_WORD = re.compile(r"[a-z']+")
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize(text):
+    text = _NON_WORD.sub(" ", text.lower())
+    return " " + _SPACES.sub(" ", text).strip() + " "
+
+
+def ngram_ids(text):
+    """Hashed character 3-gram ids of the normalized text, vectorized over its bytes."""
+    data = np.frombuffer(_normalize(text).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if data.size < NGRAM:
+        return np.zeros(0, dtype=np.int64)
+    codes = (data[:-2] << np.uint64(16)) | (data[1:-1] << np.uint64(8)) | data[2:]
+    # Multiplicative hashing keeps the ids deterministic across processes
+    return ((codes * np.uint64(2654435761)) % np.uint64(DIMENSIONS)).astype(np.int64)
+
+
+def tfidf_matrix(texts):
+    """
+    Rows are L2-normalized sublinear-TF x IDF vectors over the 3-grams the
+    texts actually contain, so the matrix stays len(texts) x (a few hundred).
+    """
+    ids = [ngram_ids(text) for text in texts]
+    rows = np.repeat(np.arange(len(texts)), [len(i) for i in ids])
+    vocab, cols = np.unique(np.concatenate(ids), return_inverse=True)
+    counts = np.bincount(rows * len(vocab) + cols, minlength=len(texts) * len(vocab))
+    counts = counts.reshape(len(texts), len(vocab)).astype(np.float64)
+
+    present = counts > 0
+    idf = np.log((1 + len(texts)) / (1 + present.sum(axis=0))) + 1
+    weights = np.where(present, 1 + np.log(np.maximum(counts, 1)), 0) * idf
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    return weights / np.maximum(norms, 1e-12)
+
+
+def doctor_questions(patient_history):
+    """Earlier doctor turns from "Doctor: ..." history lines."""
+    questions = []
+    for line in patient_history:
+        role, _, content = str(line).partition(":")
+        if role.strip().lower() == "doctor" and content.strip():
+            questions.append(content.strip())
+    return questions
+
+
+def most_similar(question, previous):
+    """(cosine, text) of the earlier question closest to `question`."""
+    matrix = tfidf_matrix([question] + previous)
+    scores = matrix[1:] @ matrix[0]
+    best = int(np.argmax(scores))
+    return float(scores[best]), previous[best]
+
+
+def fast_verdict(doctor_message, patient_history):
+    """Returns a confident verdict dict, or None to defer to the LLM."""
+    if not ENABLED:
+        return None
+
+    previous = doctor_questions(patient_history)
+    if previous:
+        score, match = most_similar(doctor_message, previous)
+        if score >= REPEAT_THRESHOLD:
+            FAST_PATH.labels("REPETITIVE").inc()
+            return {
+                "verdict": "REPETITIVE",
+                "reason": f'The same question was already asked: "{match}"',
+                "suggestion": "Build on the patient's earlier answer instead of asking again",
+                "source": "fast_path",
+                "similarity": round(score, 3)
+            }
+
+    words = set(_WORD.findall(doctor_message.lower()))
+    if words & OFF_TOPIC_TERMS and not words & CLINICAL_TERMS:
+        FAST_PATH.labels("IRRELEVANT").inc()
+        return {
+            "verdict": "IRRELEVANT",
+            "reason": "Question is unrelated to the patient's medical concern",
+            "suggestion": "Ask about symptom characteristics, duration or triggers",
+            "source": "fast_path"
+        }
+
+    FAST_PATH.labels("deferred").inc()
+    return None
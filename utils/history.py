@@ -0,0 +1,206 @@
+# utils/history.py
+"""
+Token-budgeted conversation history.
+
+Once the verbatim history exceeds the budget, everything but the last
+HISTORY_KEEP_MESSAGES messages is folded into a running summary. The
+summary is only updated when messages fall out of the window, and the
+caller carries (summary, summarized) between turns, so the summarizer
+sees each message at most once:
+
+    HISTORY_TOKEN_BUDGET     tokens of history sent verbatim (default 1200)
+    HISTORY_KEEP_MESSAGES    newest messages always kept verbatim (default 8)
+    HISTORY_SUMMARY_MODEL    model used to fold old turns into the summary
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, NamedTuple
+
+from utils.metrics import NODE_FALLBACKS
+from utils.resilience import fallback_kind
+from utils.transcript import as_transcript
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+HISTORY_KEEP_MESSAGES = int(os.getenv("HISTORY_KEEP_MESSAGES", "8"))
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "llama-3.1-8b-instant")
+SUMMARY_MAX_CHARS = 1200
+
+_ROLE_NAMES = {"user": "Doctor", "assistant": "Patient"}
+
+
+class CompactedHistory(NamedTuple):
+    messages: List[Dict]   # Groq-format messages still sent verbatim
+    summary: str           # running summary of everything before them
+    summarized: int        # how many leading messages the summary covers
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def messages_tokens(messages: List[Dict]) -> int:
+    # +4 per message for role and framing tokens
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+
+def summary_message(summary: str) -> Dict:
+    return {"role": "system", "content": f"Summary of the consultation so far: {summary}"}
+
+
+def _needs_compaction(messages, summary, summarized, budget, keep):
+    tail = messages[summarized:]
+    if len(tail) <= keep:
+        return False
+    return messages_tokens(tail) + estimate_tokens(summary) > budget
+
+
+def _format_turns(messages: List[Dict]) -> str:
+    return "\n".join(f"{_ROLE_NAMES.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+
+
+def summarize_turns(summary: str, dropped: List[Dict]) -> str:
+    """Folds the dropped messages into the running summary with a small, fast model."""
+    # Imported here: request handlers use history_fields() without the client
+    from utils.llm_client import chat_completion
+
+    prompt = f"""Update the running summary of a doctor-patient consultation.
+
+**Current summary:**
+{summary if summary else "None yet"}
+
+**New turns to fold in:**
+{_format_turns(dropped)}
+
+Write the updated summary in at most 120 words. Keep every symptom, duration,
+severity and answer the patient has already given, and every question the
+doctor has already asked. Respond with the summary text only."""
+
+    try:
+        response = chat_completion(
+            node="history_summary",
+            model=HISTORY_SUMMARY_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.0,
+            max_tokens=200
+        )
+        return response.choices[0].message.content.strip()[:SUMMARY_MAX_CHARS]
+    except Exception as e:
+        logger.error(f"History summarization failed: {e}")
+        NODE_FALLBACKS.labels("history_summary", fallback_kind(e)).inc()
+        # Extractive fallback: keep the most recent text that fits
+        merged = f"{summary}\n{_format_turns(dropped)}".strip()
+        return merged[-SUMMARY_MAX_CHARS:]
+
+
+def _progress(messages: List[Dict], summary: str, summarized: int) -> int:
+    # A summary that covers nothing (or more than exists) is treated as absent
+    return min(max(summarized, 0), len(messages)) if summary else 0
+
+
+def compact_messages(messages: List[Dict], summary: str = "", summarized: int = 0,
+                     budget: int = None, keep: int = None,
+                     summarize=summarize_turns) -> CompactedHistory:
+    """
+    Returns the verbatim window plus the updated summary for a Groq-format history.
+    summary/summarized are the values returned for the previous turn.
+    """
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    keep = HISTORY_KEEP_MESSAGES if keep is None else keep
+    summarized = _progress(messages, summary, summarized)
+
+    if _needs_compaction(messages, summary, summarized, budget, keep):
+        cut = len(messages) - keep
+        summary = summarize(summary, messages[summarized:cut])
+        summarized = cut
+
+    return CompactedHistory(messages[summarized:], summary, summarized)
+
+
+async def acompact_messages(messages: List[Dict], summary: str = "", summarized: int = 0,
+                            budget: int = None, keep: int = None) -> CompactedHistory:
+    """Async variant: the (rare) summarization call runs off the event loop."""
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    keep = HISTORY_KEEP_MESSAGES if keep is None else keep
+    if _needs_compaction(messages, summary, _progress(messages, summary, summarized), budget, keep):
+        return await asyncio.to_thread(compact_messages, messages, summary, summarized, budget, keep)
+    return compact_messages(messages, summary, summarized, budget, keep)
+
+
+def trim_lines(lines: List[str], summary: str = "", budget: int = None) -> List[str]:
+    """
+    Budgeting for stateless callers such as the evaluator. lines are the turns
+    not covered by summary; the newest ones that fit are kept, preceded by the
+    summary (if any) or an omission note. No model call is made.
+    """
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    kept = []
+    used = estimate_tokens(summary) if summary else 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget and kept:
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+
+    omitted = len(lines) - len(kept)
+    if summary:
+        return [f"Summary of earlier conversation: {summary}", *kept]
+    if omitted:
+        return [f"({omitted} earlier lines omitted)", *kept]
+    return kept
+
+
+# ------------------ GRAPH HELPERS ------------------
+def to_groq_messages(messages) -> List[Dict]:
+    """Groq chat format of a graph state's messages (cached on the Transcript)."""
+    return as_transcript(messages).groq_messages()
+
+
+def compact_history(state) -> CompactedHistory:
+    """Token-budgeted view of a graph state's messages, using its carried summary."""
+    return compact_messages(
+        to_groq_messages(state.get("messages", [])),
+        state.get("history_summary", ""),
+        state.get("summarized_count", 0)
+    )
+
+
+async def acompact_history(state) -> CompactedHistory:
+    return await acompact_messages(
+        to_groq_messages(state.get("messages", [])),
+        state.get("history_summary", ""),
+        state.get("summarized_count", 0)
+    )
+
+
+def history_fields(source) -> Dict:
+    """The running summary a request body or graph state carries between turns."""
+    return {
+        "history_summary": source.get("history_summary", "") or "",
+        "summarized_count": int(source.get("summarized_count", 0) or 0)
+    }
+
+
+def echo_history(payload: Dict, state) -> Dict:
+    """
+    Adds the state's running summary to a response, so a full-transcript
+    client sends it back and the summary is not rebuilt every turn.
+    """
+    fields = history_fields(state)
+    if fields["history_summary"]:
+        payload.update(fields)
+    return payload
+
+
+def with_history(system_prompt: str, history: CompactedHistory) -> List[Dict]:
+    """Assembles a Groq payload: system prompt, running summary, verbatim window."""
+    request = [{"role": "system", "content": system_prompt}]
+    if history.summary:
+        request.append(summary_message(history.summary))
+    request.extend(history.messages)
+    return request
@@ -0,0 +1,78 @@
+# utils/json_stream.py
+"""
+Incremental parsing of a JSON object arriving as a token stream.
+
+JSONFieldStream reports each top-level string field as soon as its closing
+quote has arrived. A caller can act on {"verdict": "RELEVANT", ... as soon
+as that field is complete, while the rest of the object is still being
+generated. Text before the opening brace (such as a ```json fence) is
+skipped. Nested values are tracked but not reported.
+"""
+import json
+from typing import Dict, List, Optional, Tuple
+
+
+class JSONFieldStream:
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, str] = {}
+        self.done = False        # the top-level object has closed
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = 0
+        self._key = None
+        self._expect_key = True
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Consumes the next chunk; returns the (name, value) fields it completed."""
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        value = json.loads(text[self._start:i + 1])
+                        if self._expect_key:
+                            self._key = value
+                        else:
+                            self.fields[self._key] = value
+                            completed.append((self._key, value))
+                continue
+
+            if self.done:
+                break
+            if ch == '"' and self._depth > 0:
+                self._in_string = True
+                self._start = i
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]" and self._depth > 0:
+                self._depth -= 1
+                self.done = self._depth == 0
+            elif self._depth == 1:
+                if ch == ":":
+                    self._expect_key = False
+                elif ch == ",":
+                    self._expect_key = True
+        self._pos = len(text)
+        return completed
+
+    def result(self) -> Optional[Dict]:
+        """The whole object once it has closed (None if it is not valid JSON)."""
+        if not self.done:
+            return None
+        start = self.text.find("{")
+        try:
+            value, _ = json.JSONDecoder().raw_decode(self.text[start:])
+        except json.JSONDecodeError:
+            return None
+        return value if isinstance(value, dict) else None
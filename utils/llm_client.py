@@ -0,0 +1,484 @@
+# utils/llm_client.py
+"""
+Shared Groq clients used by every graph.
+
+One sync and one async client per process, both backed by a pooled httpx
+transport with HTTP keep-alive, so consecutive turns reuse warm TLS
+connections instead of each graph holding its own client. Pool sizes come
+from the environment:
+
+    GROQ_MAX_CONNECTIONS    total open connections per client (default 100)
+    GROQ_MAX_KEEPALIVE      idle connections kept warm (default 20)
+    GROQ_KEEPALIVE_EXPIRY   seconds an idle connection is kept (default 30)
+    GROQ_TIMEOUT            per-request timeout in seconds (default 60)
+    GROQ_BASE_URL           upstream override, e.g. a local fake server
+
+Every call goes through the deadline, retry, hedging and circuit-breaker
+policy in utils.resilience; the SDK's own retries are disabled so attempts
+are not multiplied. When GROQ_RPM/GROQ_TPM are set, each attempt also
+reserves budget from the shared scheduler in utils.rate_limiter first.
+
+usage_scope() attributes token usage to a unit of work (a replayed turn, a
+request): every call made inside the block, on any graph thread, adds to it.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import httpx
+from dotenv import load_dotenv
+
+from utils.metrics import (
+    LLM_HEDGES, LLM_INFLIGHT, LLM_LATENCY, LLM_RETRIES, CallbackGauge, record_tokens, record_usage
+)
+from utils.rate_limiter import BATCH, estimate_request_tokens, get_scheduler, priority_for
+from utils.resilience import (
+    attempt_timeout, breaker_for, breaker_states, cancelled, counts_timeout, failure_reason, hedge_budget,
+    hedge_delay, latencies, retry_after, retry_delay
+)
+
+load_dotenv()
+
+MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("GROQ_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "30"))
+TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+_hedge_pool = None
+_loop = None
+
+CallbackGauge(
+    "llm_circuit_open", "1 while the circuit breaker for a model is open or probing",
+    lambda: {(model,): int(state != "closed") for model, state in breaker_states().items()},
+    ["model"]
+)
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+
+
+def get_client():
+    """Returns the process-wide sync Groq client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from groq import Groq
+                _client = Groq(
+                    api_key=os.getenv("GROQ_API_KEY"),
+                    timeout=TIMEOUT,
+                    max_retries=0,
+                    http_client=httpx.Client(limits=_limits(), timeout=TIMEOUT)
+                )
+    return _client
+
+
+def get_async_client():
+    """
+    Returns the async Groq client for the running event loop.
+    httpx connection pools are bound to the loop that opened them, so each
+    loop gets its own client; a long-lived loop reuses one pool throughout.
+    Sync code should go through run_async() rather than asyncio.run(), which
+    would open (and leak) a fresh client and pool on every call.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        from groq import AsyncGroq
+        client = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            timeout=TIMEOUT,
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=_limits(), timeout=TIMEOUT)
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _background_loop():
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="groq-async", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_async(coro):
+    """
+    Runs a coroutine on the process-wide background event loop and returns
+    its result, blocking the caller. Every sync caller shares that loop and
+    so its async client and warm pool. The coroutine runs in a copy of the
+    caller's context, so deadlines and usage scopes still apply.
+    """
+    context = contextvars.copy_context()
+
+    async def in_context():
+        return await asyncio.get_running_loop().create_task(coro, context=context)
+
+    return asyncio.run_coroutine_threadsafe(in_context(), _background_loop()).result()
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS,
+                                                 thread_name_prefix="groq-hedge")
+    return _hedge_pool
+
+
+def _spare_budget(kwargs):
+    """Hedges only use budget that evaluation traffic could have used."""
+    scheduler = get_scheduler()
+    return scheduler is None or not scheduler.try_acquire(estimate_request_tokens(kwargs), BATCH)
+
+
+def _settle(scheduler, cost, response):
+    usage = getattr(response, "usage", None)
+    scheduler.settle(cost, getattr(usage, "total_tokens", None))
+
+
+def _rate_limited(scheduler, exc):
+    from groq import RateLimitError
+    if isinstance(exc, RateLimitError):
+        scheduler.penalize(retry_after(exc) or 1.0)
+
+
+async def _asettle(scheduler, cost, response):
+    usage = getattr(response, "usage", None)
+    await scheduler.asettle(cost, getattr(usage, "total_tokens", None))
+
+
+async def _arate_limited(scheduler, exc):
+    from groq import RateLimitError
+    if isinstance(exc, RateLimitError):
+        await scheduler.apenalize(retry_after(exc) or 1.0)
+
+
+def _timed(node, create, kwargs, timeout):
+    """One upstream attempt; successful latencies feed the hedge p95."""
+    start = time.perf_counter()
+    response = create(timeout=timeout, **kwargs)
+    latencies.observe(node, time.perf_counter() - start)
+    return response
+
+
+def _attempt(node, kwargs):
+    """
+    Sync attempt, hedged: if no answer arrives within the node's recent p95,
+    the same request is sent again and whichever succeeds first is returned.
+    Streams are never hedged since their tokens are already being relayed.
+    """
+    create = get_client().chat.completions.create
+    delay = None if kwargs.get("stream") else hedge_delay(node)
+    hedge_budget.earn()
+    # Resolved here: the deadline lives in this thread's context, not the pool's
+    timeout = attempt_timeout(TIMEOUT)
+    if delay is None or delay >= timeout:
+        return _timed(node, create, kwargs, timeout)
+
+    pool = _get_hedge_pool()
+    primary = pool.submit(_timed, node, create, kwargs, timeout)
+    done, _ = wait([primary], timeout=delay)
+    if done or cancelled() or not hedge_budget.try_spend() or not _spare_budget(kwargs):
+        return primary.result()
+
+    LLM_HEDGES.labels(node, "sent").inc()
+    hedge = pool.submit(_timed, node, create, kwargs, timeout - delay)
+    pending, error = {primary, hedge}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    LLM_HEDGES.labels(node, "won").inc()
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def _atimed(node, create, kwargs, timeout):
+    start = time.perf_counter()
+    response = await create(timeout=timeout, **kwargs)
+    latencies.observe(node, time.perf_counter() - start)
+    return response
+
+
+async def _aattempt(node, kwargs):
+    """Async twin of _attempt; the losing request is cancelled."""
+    create = get_async_client().chat.completions.create
+    delay = None if kwargs.get("stream") else hedge_delay(node)
+    hedge_budget.earn()
+    timeout = attempt_timeout(TIMEOUT)
+    if delay is None or delay >= timeout:
+        return await _atimed(node, create, kwargs, timeout)
+
+    primary = asyncio.ensure_future(_atimed(node, create, kwargs, timeout))
+    done, _ = await asyncio.wait([primary], timeout=delay)
+    if done or cancelled() or not hedge_budget.try_spend() or not _spare_budget(kwargs):
+        return await primary
+
+    LLM_HEDGES.labels(node, "sent").inc()
+    hedge = asyncio.ensure_future(_atimed(node, create, kwargs, timeout - delay))
+    pending, error = {primary, hedge}, None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        LLM_HEDGES.labels(node, "won").inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _with_retries(node, model, kwargs):
+    breaker = breaker_for(model)
+    scheduler = get_scheduler()
+    cost = estimate_request_tokens(kwargs)
+    attempt = 0
+    while True:
+        attempt_timeout(TIMEOUT)  # fail before the breaker if the budget is gone
+        if scheduler:
+            scheduler.acquire(cost, priority_for(node))
+        breaker.before_call()
+        # A timeout only counts against the upstream if the deadline left it long enough
+        full_timeout = counts_timeout(TIMEOUT)
+        try:
+            response = _attempt(node, kwargs)
+        except Exception as e:
+            breaker.record(e, full_timeout)
+            if scheduler:
+                _rate_limited(scheduler, e)
+            delay = retry_delay(e, attempt)
+            if delay is None:
+                raise
+            LLM_RETRIES.labels(node, failure_reason(e)).inc()
+            time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        if scheduler:
+            _settle(scheduler, cost, response)
+        return response
+
+
+async def _awith_retries(node, model, kwargs):
+    breaker = breaker_for(model)
+    scheduler = get_scheduler()
+    cost = estimate_request_tokens(kwargs)
+    attempt = 0
+    while True:
+        attempt_timeout(TIMEOUT)
+        if scheduler:
+            await scheduler.aacquire(cost, priority_for(node))
+        breaker.before_call()
+        full_timeout = counts_timeout(TIMEOUT)
+        try:
+            response = await _aattempt(node, kwargs)
+        except Exception as e:
+            breaker.record(e, full_timeout)
+            if scheduler:
+                await _arate_limited(scheduler, e)
+            delay = retry_delay(e, attempt)
+            if delay is None:
+                raise
+            LLM_RETRIES.labels(node, failure_reason(e)).inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        if scheduler:
+            await _asettle(scheduler, cost, response)
+        return response
+
+
+# ------------------ USAGE SCOPES ------------------
+class Usage:
+    """
+    Calls and tokens of the upstream calls made inside one usage_scope().
+    A scope opened inside another also adds everything to the outer one.
+    """
+    __slots__ = ("calls", "errors", "prompt_tokens", "completion_tokens", "parent", "_lock")
+
+    def __init__(self, parent=None):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.parent = parent
+        self._lock = threading.Lock()  # parallel graph branches share the scope
+
+    def record(self, response):
+        usage = getattr(response, "usage", None)
+        self.add(calls=1, errors=int(response is None), prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                 completion_tokens=getattr(usage, "completion_tokens", 0) or 0)
+
+    def add(self, calls=0, errors=0, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            self.calls += calls
+            self.errors += errors
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        if self.parent is not None:
+            self.parent.add(calls, errors, prompt_tokens, completion_tokens)
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens
+        }
+
+
+_usage_scope = contextvars.ContextVar("llm_usage_scope", default=None)
+
+
+def start_usage_scope(inherit=True):
+    """
+    Opens a usage scope without a with-block (request hooks); returns
+    (usage, token). With inherit=False the scope does not add to the
+    enclosing one.
+    """
+    usage = Usage(_usage_scope.get() if inherit else None)
+    return usage, _usage_scope.set(usage)
+
+
+def end_usage_scope(token):
+    try:
+        _usage_scope.reset(token)
+    except ValueError:
+        # Opened in another context (see end_deadline)
+        _usage_scope.set(None)
+
+
+@contextmanager
+def usage_scope(inherit=True):
+    """Yields a Usage that collects every call made in this context."""
+    usage, token = start_usage_scope(inherit)
+    try:
+        yield usage
+    finally:
+        end_usage_scope(token)
+
+
+def current_usage():
+    """The innermost open usage scope, or None."""
+    return _usage_scope.get()
+
+
+def _record_scope(response):
+    usage = _usage_scope.get()
+    if usage is not None:
+        usage.record(response)
+
+
+def _stream_usage(chunk):
+    """Token usage on a stream's final chunk (OpenAI-style usage, or Groq's x_groq.usage)."""
+    usage = getattr(chunk, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+    return usage
+
+
+class _UsageStream:
+    """A completion stream that records the usage its final chunk reports."""
+
+    def __init__(self, stream, node, model, scope):
+        self._stream = stream
+        self._node = node
+        self._model = model
+        self._scope = scope
+
+    def __iter__(self):
+        for chunk in self._stream:
+            usage = _stream_usage(chunk)
+            if usage is not None:
+                record_tokens(self._node, self._model, usage)
+                if self._scope is not None:
+                    self._scope.add(prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                                    completion_tokens=getattr(usage, "completion_tokens", 0) or 0)
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+def _with_stream_usage(kwargs):
+    """Asks the upstream to end a stream with a usage chunk (groq 0.13 has no stream_options argument)."""
+    extra_body = dict(kwargs.get("extra_body") or {})
+    extra_body.setdefault("stream_options", {"include_usage": True})
+    return {**kwargs, "extra_body": extra_body}
+
+
+def chat_completion(node="llm", **kwargs):
+    """
+    client.chat.completions.create on the shared sync client, with the
+    deadline/retry/hedge/breaker policy applied. Raises CircuitOpenError or
+    DeadlineExceeded without calling upstream when either applies.
+    node labels the latency/token metrics; for streams the latency is the
+    time until the stream opens.
+    """
+    model = kwargs.get("model", "")
+    stream = kwargs.get("stream")
+    if stream:
+        kwargs = _with_stream_usage(kwargs)
+    inflight = LLM_INFLIGHT.labels(node)
+    inflight.inc()
+    start = time.perf_counter()
+    outcome = "error"
+    response = None
+    try:
+        response = _with_retries(node, model, kwargs)
+        outcome = "ok"
+    finally:
+        LLM_LATENCY.labels(node, model, outcome).observe(time.perf_counter() - start)
+        inflight.dec()
+        _record_scope(response)
+    if stream:
+        # Tokens are known only once the stream has been read to its end
+        return _UsageStream(response, node, model, _usage_scope.get())
+    record_usage(node, model, response)
+    return response
+
+
+async def achat_completion(node="llm", **kwargs):
+    """Async twin of chat_completion on the shared async client."""
+    model = kwargs.get("model", "")
+    inflight = LLM_INFLIGHT.labels(node)
+    inflight.inc()
+    start = time.perf_counter()
+    outcome = "error"
+    response = None
+    try:
+        response = await _awith_retries(node, model, kwargs)
+        outcome = "ok"
+    finally:
+        LLM_LATENCY.labels(node, model, outcome).observe(time.perf_counter() - start)
+        inflight.dec()
+        _record_scope(response)
+    if not kwargs.get("stream"):
+        record_usage(node, model, response)
+    return response
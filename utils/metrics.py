@@ -0,0 +1,232 @@
+# utils/metrics.py
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms keyed by label values. An update is a dict
+lookup plus a few additions under a lock, so instrumenting the hot path
+costs microseconds against upstream calls that take hundreds of ms.
+Each worker process keeps its own registry; scrape every worker.
+"""
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        """Returns the child for these label values (created on first use)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name, labelnames, values):
+        lines, cumulative = [], 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+
+class CallbackGauge:
+    """Gauge or counter whose values are read from a callback at scrape time."""
+
+    def __init__(self, name, help, callback, labelnames=(), type="gauge", registry=None):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labelnames = tuple(labelnames)
+        self.callback = callback  # -> {label_values_tuple: value}
+        (registry or REGISTRY).register(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for values, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ------------------ APPLICATION METRICS ------------------
+NODE_LATENCY = Histogram("graph_node_duration_seconds", "Wall time of a LangGraph node", ["node"])
+NODE_INFLIGHT = Gauge("graph_node_inflight", "LangGraph node executions in progress", ["node"])
+NODE_FALLBACKS = Counter("graph_node_fallbacks_total",
+                         "Canned fallback replies or error verdicts served by a node", ["node", "kind"])
+
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "Upstream chat completion latency",
+                        ["node", "model", "outcome"])
+LLM_INFLIGHT = Gauge("llm_requests_inflight", "Upstream chat completions in progress", ["node"])
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the upstream usage field",
+                     ["node", "model", "kind"])
+LLM_RETRIES = Counter("llm_retries_total", "Upstream attempts retried after a failure", ["node", "reason"])
+LLM_HEDGES = Counter("llm_hedges_total", "Hedged duplicate requests sent, and how many won",
+                     ["node", "event"])
+
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP handler latency", ["endpoint", "status"])
+HTTP_INFLIGHT = Gauge("http_requests_inflight", "HTTP requests being handled", ["endpoint"])
+
+
+def record_usage(node, model, response):
+    """Adds response.usage (when present) to the token counters."""
+    record_tokens(node, model, getattr(response, "usage", None))
+
+
+def record_tokens(node, model, usage):
+    if usage is None:
+        return
+    LLM_TOKENS.labels(node, model, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.labels(node, model, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def instrument_node(name, func):
+    """Wraps a sync or async LangGraph node with latency and in-flight tracking."""
+    latency = NODE_LATENCY.labels(name)
+    inflight = NODE_INFLIGHT.labels(name)
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state):
+            inflight.inc()
+            start = time.perf_counter()
+            try:
+                return await func(state)
+            finally:
+                latency.observe(time.perf_counter() - start)
+                inflight.dec()
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state):
+        inflight.inc()
+        start = time.perf_counter()
+        try:
+            return func(state)
+        finally:
+            latency.observe(time.perf_counter() - start)
+            inflight.dec()
+    return wrapper
@@ -0,0 +1,71 @@
+# utils/micro_batch.py
+"""
+Micro-batching of concurrent calls into one.
+
+submit(item) joins the open batch. The first caller in a batch is its
+leader: it waits up to `window_s` for more items (or until `max_size`
+have joined), then runs `run_batch(items)` once for everyone. The other
+callers block until the results are in. run_batch returns one result per
+item, or None for an item it could not answer, and the caller then handles
+that item on its own.
+"""
+import logging
+import threading
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    __slots__ = ("items", "results", "full", "done")
+
+    def __init__(self):
+        self.items = []
+        self.results = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    def __init__(self, run_batch: Callable[[List[Any]], List[Optional[Any]]],
+                 window_s: float = 0.0, max_size: int = 8):
+        self.run_batch = run_batch
+        self.window_s = window_s
+        self.max_size = max_size
+        self._open = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.window_s > 0 and self.max_size > 1
+
+    def submit(self, item, timeout: Optional[float] = None):
+        """The batch's result for item, or None when the caller should handle it itself."""
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_size:
+                self._open = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window_s)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            try:
+                results = self.run_batch(list(batch.items))
+            except Exception as e:
+                logger.error(f"Batch of {len(batch.items)} failed: {e}")
+                results = None
+            if results is None or len(results) != len(batch.items):
+                results = [None] * len(batch.items)
+            batch.results = results
+            batch.done.set()
+        elif not batch.done.wait(timeout):
+            return None
+        return batch.results[index]
@@ -0,0 +1,198 @@
+# utils/prescription.py
+"""
+Rule-based prescription parser for the treatment flow.
+
+Extracts drug, dose, frequency, timing relative to meals and duration from
+the doctor's free text, keeping each field as the phrase the doctor used so
+replies can quote it back. Only single-drug prescriptions are handled;
+anything with several drugs or no recognisable medication is left to the LLM.
+"""
+import re
+from typing import List, NamedTuple, Optional
+
+FIELDS = ("drug", "dose", "frequency", "timing", "duration")
+
+# Order in which a missing field is asked about (the most natural question first)
+QUESTION_ORDER = ("drug", "frequency", "timing", "dose", "duration")
+
+FIELD_DESCRIPTIONS = {
+    "drug": "which medicine to take",
+    "dose": "how much to take each time",
+    "frequency": "how many times a day to take it",
+    "timing": "whether to take it before or after meals",
+    "duration": "for how many days to keep taking it"
+}
+
+KNOWN_DRUGS = frozenset("""
+    paracetamol acetaminophen ibuprofen aspirin naproxen diclofenac amoxicillin azithromycin
+    ciprofloxacin doxycycline metronidazole cetirizine loratadine fexofenadine omeprazole
+    pantoprazole ranitidine metformin amlodipine atorvastatin lisinopril losartan prednisolone
+    prednisone salbutamol albuterol sumatriptan ondansetron domperidone metoclopramide codeine
+    tramadol vitamin iron multivitamin antacid antibiotic antibiotics painkiller painkillers
+""".split())
+
+# Generic-name stems ("-cillin", "-prazole", ...): an unlisted word after "take"
+# or "start" is only taken for a drug if it has one, or a dose or dosage form
+# follows it ("take Crocin 500mg", "use Otrivin drops")
+DRUG_SUFFIX = re.compile(
+    r"[a-z]{2,}(?:cillin|mycin|micin|floxacin|cycline|azole|prazole|tidine|sartan|pril|olol|dipine"
+    r"|statin|triptan|setron|profen|fenac|oxetine|pramine|azepam|zolam|olone|asone|terol|formin"
+    r"|gliptin|parin|vir|dronate|tadine|zine|mide|thiazide|caine|codone|morphine|phylline)$"
+)
+
+APPLIED_FORMS = frozenset("cream ointment gel lotion patch".split())
+TOPICAL_FORMS = APPLIED_FORMS | frozenset("drops spray inhaler".split())
+FORMS = TOPICAL_FORMS | frozenset("tablet tablets pill pills capsule capsules syrup medicine medication".split())
+
+_NUMBER = r"(?:\d+(?:\.\d+)?|one|two|three|four|five|six|seven|eight|nine|ten|a|an|half(?: a)?)"
+_UNIT = r"(?:mg|mcg|µg|g|ml|iu|units?|tablets?|tabs?|pills?|capsules?|caps?|puffs?|drops?|sprays?|teaspoons?|tsp|spoons?)"
+
+DOSE = re.compile(rf"\b{_NUMBER}\s*-?\s*{_UNIT}\b|\b(?:a )?thin layer\b|\b(?:a )?small amount\b")
+
+FREQUENCY = re.compile(
+    r"\b(?:once|twice|thrice|one time|two times|three times|four times|\d+\s*(?:x|times))\s*"
+    r"(?:a|per|every|each)?\s*(?:day|daily|night|week)\b"
+    r"|\bevery\s+(?:\d+|one|two|three|four|six|eight|twelve)\s*(?:-\s*\d+\s*)?hours?\b"
+    r"|\bevery\s+(?:morning|night|evening|day)\b"
+    r"|\b(?:morning and (?:night|evening))\b"
+    r"|\b(?:as|when|if) (?:needed|required)\b|\bprn\b|\bat bed\s?time\b|\bat night\b"
+    r"|\b(?:od|bd|bid|tds|tid|qds|qid)\b"
+    r"|\bdaily\b|\bnightly\b"
+)
+
+TIMING = re.compile(
+    r"\b(?:before|after|with|without|between)\s+(?:your\s+|a\s+|each\s+)?"
+    r"(?:meals?|food|eating|breakfast|lunch|dinner|supper)\b"
+    r"|\bon an empty stomach\b|\bat bed\s?time\b|\bbefore (?:bed|sleep|sleeping)\b"
+    r"|\b(?:regardless|irrespective) of (?:meals|food)\b"
+)
+
+DURATION = re.compile(
+    r"\bfor\s+(?:the\s+)?(?:next\s+)?(?:\d+|a|an|one|two|three|four|five|six|seven|eight|nine|ten|fourteen)"
+    r"\s*(?:-\s*)?(?:days?|weeks?|months?)\b"
+    r"|\b\d+\s*-?\s*(?:day|week|month)\s+course\b"
+    r"|\buntil\s+(?:the\s+)?(?:course is (?:complete|finished)|(?:it is |they are )?finished"
+    r"|(?:the )?symptoms? (?:improve|resolve|go away|settle)|you feel better|the pain (?:stops|goes away))"
+    r"|\b(?:long[- ]term|ongoing|indefinitely)\b"
+)
+
+_VERB_OBJECT = re.compile(
+    r"\b(?:take|apply|use|start|give|continue|try)\s+(?:this|the|these|some|your)?\s*([a-z][a-z-]+)"
+)
+_NOT_A_DRUG = frozenset("""
+    it them one two three four five a an this that these those some more medicine medication
+    rest care plenty lots time off
+""".split())
+
+
+class Prescription(NamedTuple):
+    drug: Optional[str]
+    dose: Optional[str]
+    frequency: Optional[str]
+    timing: Optional[str]
+    duration: Optional[str]
+    topical: bool
+    drugs: List[str]
+
+    @property
+    def is_medication(self) -> bool:
+        """
+        True when the text is a single-drug prescription this parser can reason
+        about. A dose or count without a drug ("take two tablets twice a day")
+        and advice ("try yoga twice a week") are left to the LLM.
+        """
+        return len(self.drugs) == 1
+
+    def missing(self) -> List[str]:
+        """Fields still needed before the patient can follow it, in asking order."""
+        required = [f for f in QUESTION_ORDER if not (self.topical and f in ("timing", "dose"))]
+        return [f for f in required if not getattr(self, f)]
+
+
+def _first(pattern, text):
+    match = pattern.search(text)
+    return match.group(0).strip() if match else None
+
+
+def find_drugs(text: str) -> List[str]:
+    """Distinct medication names (or dosage forms) mentioned, in order."""
+    found = []
+    for word in re.findall(r"[a-z][a-z-]+", text):
+        if word in KNOWN_DRUGS and word not in found:
+            found.append(word)
+    if not found:
+        for match in _VERB_OBJECT.finditer(text):
+            word = match.group(1)
+            if word not in _NOT_A_DRUG and _names_drug(word, text[match.end():]):
+                found.append(word)
+                break
+    if not found:
+        # "Apply a thin layer of the cream": the dosage form stands in for the
+        # name, unless it is only counted ("take two tablets")
+        found = [word for word in re.findall(r"[a-z]+", DOSE.sub(" ", text)) if word in FORMS][:1]
+    return found
+
+
+def _names_drug(word: str, rest: str) -> bool:
+    """Whether the object of "take/start/..." is a drug rather than advice ("try yoga")."""
+    if word in FORMS or DRUG_SUFFIX.match(word):
+        return True
+    following = rest.lstrip()
+    return bool(DOSE.match(following) or following.split(" ", 1)[0] in FORMS)
+
+
+def parse_prescription(text: str) -> Prescription:
+    """Parses the doctor's (possibly multi-turn) prescription text."""
+    text = " ".join(text.lower().split())
+    drugs = find_drugs(text)
+    words = set(re.findall(r"[a-z]+", text))
+    topical = bool(words & TOPICAL_FORMS) and not words & (FORMS - TOPICAL_FORMS)
+    return Prescription(
+        drug=drugs[0] if len(drugs) == 1 else None,
+        dose=_first(DOSE, text),
+        frequency=_first(FREQUENCY, text),
+        timing=_first(TIMING, text),
+        duration=_first(DURATION, text),
+        topical=topical,
+        drugs=drugs
+    )
+
+
+# ------------------ REPLIES ------------------
+def _name(p: Prescription) -> str:
+    if not p.drug or p.drug in FORMS:
+        return f"the {p.drug}" if p.drug else "it"
+    return p.drug
+
+
+def _verbs(p: Prescription):
+    if p.drug in APPLIED_FORMS:
+        return "apply", "applying"
+    return ("use", "using") if p.topical else ("take", "taking")
+
+
+def clarification_question(p: Prescription, field: str) -> str:
+    """The patient's question about exactly one missing field."""
+    verb, gerund = _verbs(p)
+    name = _name(p)
+    questions = {
+        "drug": "Thank you doctor. Which medicine should I take?",
+        "dose": f"Thank you doctor. How much {'of ' if name.startswith(('the ', 'it')) else ''}{name} should I {verb} each time?",
+        "frequency": f"Thank you doctor. How many times a day should I {verb} {name}?",
+        "timing": f"Thank you doctor. Should I {verb} {name} before or after meals?",
+        "duration": f"Thank you doctor. For how many days should I keep {gerund} {name}?"
+    }
+    return questions[field]
+
+
+def acceptance_reply(p: Prescription, clarified: bool = False) -> str:
+    """Templated acceptance quoting back the parts of the prescription that were given."""
+    verb, _ = _verbs(p)
+    parts = []
+    for part in (p.frequency, p.timing, p.duration):
+        if part and part not in parts:  # "at bedtime" can be both frequency and timing
+            parts.append(part)
+    plan = f"I'll {verb} {_name(p)}" + (f", {p.dose}," if p.dose else "")
+    plan = " ".join([plan] + parts).rstrip(",") + "."
+    opener = "Thank you doctor, that's clear now." if clarified else "Thank you doctor, I understand."
+    return f"{opener} {plan}"
@@ -0,0 +1,220 @@
+# utils/rate_limiter.py
+"""
+Token-bucket scheduler for the shared Groq requests/tokens-per-minute limits.
+
+Every upstream attempt reserves one request and its estimated tokens (prompt
+characters / 4 plus max_tokens) before it is sent; the estimate is settled
+against the usage the response reports. The buckets live in a small SQLite
+file so every worker process on the host draws from the same budget.
+
+Interactive calls (patient, treatment, history summaries) may drain the
+buckets completely; evaluation calls stop at a reserved share, so a burst of
+/api/evaluate traffic queues behind itself instead of starving live turns.
+
+    GROQ_RPM                requests per minute for the key (0 = unlimited, default)
+    GROQ_TPM                tokens per minute for the key (0 = unlimited, default)
+    GROQ_LIMITER_DB         bucket file (default <tmpdir>/groq_budget.sqlite)
+    GROQ_LIMITER_RESERVE    share of each bucket kept for interactive calls (default 0.2)
+    GROQ_LIMITER_MAX_WAIT   longest a call queues without a request deadline (default 30)
+
+The scheduler is off unless GROQ_RPM or GROQ_TPM is set.
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from utils.blocking import run_blocking
+from utils.metrics import Counter, Histogram
+from utils.resilience import RateLimitTimeout, remaining
+
+RPM = float(os.getenv("GROQ_RPM", "0"))
+TPM = float(os.getenv("GROQ_TPM", "0"))
+DB_PATH = os.getenv("GROQ_LIMITER_DB", os.path.join(tempfile.gettempdir(), "groq_budget.sqlite"))
+RESERVE = float(os.getenv("GROQ_LIMITER_RESERVE", "0.2"))
+MAX_WAIT = float(os.getenv("GROQ_LIMITER_MAX_WAIT", "30"))
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {"evaluator": BATCH}  # nodes not listed are interactive
+
+# Longest single sleep while queued, so freed budget is noticed quickly
+POLL_S = 0.25
+
+WAIT_TIME = Histogram("llm_rate_limit_wait_seconds", "Time queued for upstream rate-limit budget",
+                      ["priority"], buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+THROTTLED = Counter("llm_rate_limit_rejections_total",
+                    "Calls that gave up waiting for rate-limit budget", ["priority"])
+
+
+def priority_for(node):
+    return PRIORITIES.get(node, INTERACTIVE)
+
+
+def estimate_request_tokens(kwargs):
+    """Tokens a chat completion may spend: prompt chars / 4 plus max_tokens."""
+    chars = sum(len(str(m.get("content", ""))) for m in kwargs.get("messages", ()))
+    return chars // 4 + 1 + int(kwargs.get("max_tokens") or 256)
+
+
+class TokenBucketScheduler:
+    """
+    Requests-per-minute and tokens-per-minute buckets shared through SQLite.
+    Each reservation is one short IMMEDIATE transaction, which serialises
+    competing processes without a separate lock service.
+    """
+
+    def __init__(self, rpm=RPM, tpm=TPM, path=DB_PATH, reserve=RESERVE):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.path = path
+        self.reserve = reserve
+        self._local = threading.local()
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS budget (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                "requests REAL, tokens REAL, updated REAL, blocked_until REAL)"
+            )
+            db.execute("INSERT OR IGNORE INTO budget VALUES (1, ?, ?, ?, 0)",
+                       (rpm, tpm, time.time()))
+
+    def _connection(self):
+        # Connections are per thread and per process (reopened after a fork)
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")  # losing the buckets in a crash is harmless
+            self._local.db, self._local.pid = db, os.getpid()
+        return _Transaction(db)
+
+    def try_acquire(self, cost, priority=INTERACTIVE):
+        """Reserves one request and `cost` tokens; returns 0, or seconds to wait."""
+        return run_blocking(self._try_acquire, cost, priority)
+
+    def _try_acquire(self, cost, priority):
+        floor = self.reserve if priority == BATCH else 0.0
+        if self.tpm:
+            cost = min(cost, self.tpm * (1 - floor))  # oversized prompts still get through
+        with self._connection() as db:
+            requests, tokens, updated, blocked_until = db.execute(
+                "SELECT requests, tokens, updated, blocked_until FROM budget WHERE id = 1"
+            ).fetchone()
+            now = time.time()
+            elapsed = max(now - updated, 0.0)
+            requests = min(self.rpm, requests + elapsed * self.rpm / 60)
+            tokens = min(self.tpm, tokens + elapsed * self.tpm / 60)
+
+            wait = 0.0
+            if now < blocked_until:
+                wait = blocked_until - now
+            elif self.rpm and requests - 1 < self.rpm * floor:
+                wait = (self.rpm * floor + 1 - requests) * 60 / self.rpm
+            elif self.tpm and tokens - cost < self.tpm * floor:
+                wait = (self.tpm * floor + cost - tokens) * 60 / self.tpm
+            else:
+                requests -= 1 if self.rpm else 0
+                tokens -= cost if self.tpm else 0
+
+            db.execute("UPDATE budget SET requests = ?, tokens = ?, updated = ? WHERE id = 1",
+                       (requests, tokens, now))
+        return wait
+
+    def _max_wait(self):
+        left = remaining()
+        return MAX_WAIT if left is None else left
+
+    def acquire(self, cost, priority=INTERACTIVE):
+        """Blocks until the reservation is granted or the deadline would pass."""
+        start = time.monotonic()
+        limit = self._max_wait()
+        while True:
+            wait = self.try_acquire(cost, priority)
+            waited = time.monotonic() - start
+            if not wait:
+                WAIT_TIME.labels(priority).observe(waited)
+                return
+            if waited + wait > limit:
+                THROTTLED.labels(priority).inc()
+                raise RateLimitTimeout(f"No upstream budget within {limit:.1f}s")
+            time.sleep(min(wait, POLL_S) * random.uniform(0.8, 1.2))
+
+    async def aacquire(self, cost, priority=INTERACTIVE):
+        """
+        Async twin of acquire; queues on the event loop instead of a thread.
+        The SQLite transaction runs on a worker thread, since its busy
+        handler would otherwise stall every coroutine on the loop.
+        """
+        start = time.monotonic()
+        limit = self._max_wait()
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, cost, priority)
+            waited = time.monotonic() - start
+            if not wait:
+                WAIT_TIME.labels(priority).observe(waited)
+                return
+            if waited + wait > limit:
+                THROTTLED.labels(priority).inc()
+                raise RateLimitTimeout(f"No upstream budget within {limit:.1f}s")
+            await asyncio.sleep(min(wait, POLL_S) * random.uniform(0.8, 1.2))
+
+    def settle(self, reserved, actual):
+        """Returns over-reserved tokens once the real usage is known."""
+        if not self.tpm or actual is None or actual >= reserved:
+            return
+        run_blocking(self._execute, "UPDATE budget SET tokens = MIN(?, tokens + ?) WHERE id = 1",
+                     (self.tpm, reserved - actual))
+
+    async def asettle(self, reserved, actual):
+        if not self.tpm or actual is None or actual >= reserved:
+            return
+        await asyncio.to_thread(self._execute, "UPDATE budget SET tokens = MIN(?, tokens + ?) WHERE id = 1",
+                                (self.tpm, reserved - actual))
+
+    def penalize(self, seconds):
+        """Upstream answered 429: hold every caller on the host for Retry-After."""
+        run_blocking(self._execute, "UPDATE budget SET blocked_until = MAX(blocked_until, ?) WHERE id = 1",
+                     (time.time() + seconds,))
+
+    async def apenalize(self, seconds):
+        await asyncio.to_thread(self._execute,
+                                "UPDATE budget SET blocked_until = MAX(blocked_until, ?) WHERE id = 1",
+                                (time.time() + seconds,))
+
+    def _execute(self, sql, params):
+        with self._connection() as db:
+            db.execute(sql, params)
+
+    def reset(self):
+        with self._connection() as db:
+            db.execute("UPDATE budget SET requests = ?, tokens = ?, updated = ?, blocked_until = 0 "
+                       "WHERE id = 1", (self.rpm, self.tpm, time.time()))
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+_scheduler = TokenBucketScheduler() if (RPM or TPM) else None
+
+
+def get_scheduler():
+    """The process-wide scheduler, or None when no limits are configured."""
+    return _scheduler
+
+
+def set_scheduler(scheduler):
+    """Swaps the scheduler (None disables it); used by benchmarks and tools."""
+    global _scheduler
+    _scheduler = scheduler
@@ -0,0 +1,333 @@
+# utils/resilience.py
+"""
+Deadlines, retry backoff, hedge timing and circuit breaking for Groq calls.
+
+The HTTP layer opens a deadline per request; every upstream attempt made
+while serving it is capped to the time left, so a stalled completion can
+no longer hold a worker past the request budget. Settings:
+
+    REQUEST_DEADLINE_S      default per-request budget in seconds (default 25)
+    GROQ_RETRIES            extra attempts on 429/5xx/connection errors (default 2)
+    GROQ_BACKOFF_BASE_MS    first backoff step, full jitter (default 200)
+    GROQ_BACKOFF_MAX_MS     backoff cap (default 2000)
+    GROQ_HEDGE              "0" disables hedged requests (default on)
+    GROQ_HEDGE_MIN_MS       floor for the hedge delay (default 250)
+    GROQ_HEDGE_MAX_RATIO    share of calls allowed to send a hedge (default 0.1)
+    GROQ_BREAKER_FAILURES   consecutive failed attempts that open the breaker (default 5)
+    GROQ_BREAKER_COOLDOWN   seconds before a half-open probe is let through (default 30)
+    GROQ_BREAKER_MIN_TIMEOUT_S
+                            a timed-out attempt counts against the breaker only if it
+                            was allowed this long, or the whole GROQ_TIMEOUT (default 10)
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "25"))
+RETRIES = int(os.getenv("GROQ_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE_MS", "200")) / 1000
+BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX_MS", "2000")) / 1000
+HEDGE_ENABLED = os.getenv("GROQ_HEDGE", "1") != "0"
+HEDGE_MIN = float(os.getenv("GROQ_HEDGE_MIN_MS", "250")) / 1000
+HEDGE_MAX_RATIO = float(os.getenv("GROQ_HEDGE_MAX_RATIO", "0.1"))
+BREAKER_FAILURES = int(os.getenv("GROQ_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("GROQ_BREAKER_COOLDOWN", "30"))
+BREAKER_MIN_TIMEOUT = float(os.getenv("GROQ_BREAKER_MIN_TIMEOUT_S", "10"))
+
+# Hedge delays are only derived once a node has this many recent samples
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+class DeadlineExceeded(Exception):
+    """The request budget ran out before the upstream call could be made."""
+
+
+class Cancelled(DeadlineExceeded):
+    """No caller is waiting for the result any more (see utils/single_flight.py)."""
+
+
+class CircuitOpenError(Exception):
+    """The upstream is failing; callers should serve their fallback at once."""
+
+
+class RateLimitTimeout(Exception):
+    """No rate-limit budget became available before the caller's deadline."""
+
+
+# ------------------ DEADLINES ------------------
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+def start_deadline(seconds):
+    """
+    Opens a deadline `seconds` from now (kept tighter if one is already set)
+    and returns the token for end_deadline.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    return _deadline.set(deadline)
+
+
+def end_deadline(token):
+    try:
+        _deadline.reset(token)
+    except ValueError:
+        # Token created in another context (e.g. a streamed response torn
+        # down elsewhere); clearing is the right outcome either way
+        _deadline.set(None)
+
+
+@contextmanager
+def deadline(seconds):
+    """Deadline scope for code running outside a request (scripts, tools)."""
+    token = start_deadline(seconds)
+    try:
+        yield
+    finally:
+        end_deadline(token)
+
+
+def remaining():
+    """Seconds left on the current deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def attempt_timeout(default):
+    """Timeout for the next upstream attempt: default, capped to the deadline."""
+    if cancelled():
+        raise Cancelled("No caller is waiting for this call any more")
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded before calling upstream")
+    return min(default, left)
+
+
+# ------------------ CANCELLATION ------------------
+_cancel_event = contextvars.ContextVar("llm_cancel_event", default=None)
+
+
+def set_cancel_event(event):
+    """
+    Ties the calls made in this context to `event`: once it is set, no
+    further upstream attempt, retry or hedge is started.
+    """
+    return _cancel_event.set(event)
+
+
+def cancelled():
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+# ------------------ RETRIES ------------------
+def is_retryable(exc):
+    """Rate limits, 5xx, timeouts and connection failures are worth retrying."""
+    from groq import APIConnectionError, InternalServerError, RateLimitError
+    return isinstance(exc, (APIConnectionError, InternalServerError, RateLimitError))
+
+
+def failure_reason(exc):
+    from groq import APITimeoutError, RateLimitError
+    if isinstance(exc, APITimeoutError):
+        return "timeout"
+    if isinstance(exc, RateLimitError):
+        return "rate_limited"
+    return "upstream_error"
+
+
+def retry_after(exc):
+    """Seconds from the Retry-After header of a failed response, or 0."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return 0.0
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except ValueError:
+        return 0.0
+
+
+def retry_delay(exc, attempt):
+    """
+    Sleep before retry number attempt + 1, or None when the call should give
+    up: out of attempts, not retryable, or no time left on the deadline.
+    Full jitter, raised to the server's Retry-After when it sends one.
+    """
+    if attempt >= RETRIES or not is_retryable(exc):
+        return None
+    delay = max(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)), retry_after(exc))
+    left = remaining()
+    if left is not None and delay >= left:
+        return None
+    return delay
+
+
+# ------------------ HEDGING ------------------
+class LatencyTracker:
+    """Rolling window of successful attempt latencies per node."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key, seconds):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, key, p):
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class HedgeBudget:
+    """Each call earns `ratio` of a hedge; a hedge spends one. Caps extra load."""
+
+    def __init__(self, ratio=HEDGE_MAX_RATIO, burst=10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+latencies = LatencyTracker()
+hedge_budget = HedgeBudget()
+
+
+def hedge_delay(node):
+    """Seconds to wait before duplicating a call: the node's recent p95."""
+    if not HEDGE_ENABLED:
+        return None
+    p95 = latencies.percentile(node, 95)
+    return None if p95 is None else max(p95, HEDGE_MIN)
+
+
+# ------------------ CIRCUIT BREAKER ------------------
+class CircuitBreaker:
+    """
+    Closed -> open after `failures` consecutive failed attempts; while open,
+    calls fail fast with CircuitOpenError. After `cooldown` one probe call
+    is let through (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, name, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+                return
+            raise CircuitOpenError(f"Circuit open for {self.name}")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._consecutive = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """Gives back a half-open probe slot whose call never reached the upstream."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"  # cooldown has passed, so the next call probes
+
+    def record(self, exc, full_timeout=True):
+        """
+        Counts an attempt outcome. Errors the upstream answered (4xx) count as
+        success, and so do 429s: a throttling upstream is healthy, and the
+        rate limiter rather than the breaker is what should back off. Errors
+        raised locally (deadline, cancellation) say nothing about the upstream
+        and only release the probe slot, as does a timeout on an attempt the
+        caller's deadline cut short (full_timeout=False, see counts_timeout):
+        otherwise any client could open the breaker with a tiny deadline.
+        """
+        from groq import APIStatusError, APITimeoutError, RateLimitError
+        if exc is None or isinstance(exc, RateLimitError):
+            self.record_success()
+        elif isinstance(exc, APITimeoutError) and not full_timeout:
+            self.release()
+        elif is_retryable(exc):
+            self.record_failure()
+        elif isinstance(exc, APIStatusError):
+            self.record_success()
+        else:
+            self.release()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def counts_timeout(default):
+    """
+    Whether the next attempt timing out would say the upstream is stalling:
+    the deadline leaves it its whole `default` timeout, or BREAKER_MIN_TIMEOUT.
+    """
+    left = remaining()
+    return left is None or left >= min(default, BREAKER_MIN_TIMEOUT)
+
+
+def breaker_for(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breaker_states():
+    return {name: breaker.state for name, breaker in _breakers.items()}
+
+
+def fallback_kind(exc):
+    """Label for graph_node_fallbacks_total when a node serves its fallback."""
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, Cancelled):
+        return "cancelled"
+    if isinstance(exc, DeadlineExceeded):
+        return "deadline"
+    if isinstance(exc, RateLimitTimeout):
+        return "rate_limited"
+    return failure_reason(exc)
@@ -0,0 +1,200 @@
+# utils/response_cache.py
+"""
+Near-duplicate reply cache for patient turns.
+
+Students running the same exercise open with almost the same lines ("What
+brings you here today?", "what brings you in today") against the same short
+history. Entries are grouped by an exact bucket (case, prompt variant,
+normalized earlier history). Within a bucket the doctor's new message is
+matched on the character 3-gram shingles of its content words: fillers
+such as "here", "in" or "today" are dropped, so "What brings you here
+today?" and "What brings you in today?" match while "chest pain" and
+"back pain" questions stay apart. MinHash LSH bands find the candidates,
+and the best one is accepted when its exact Jaccard similarity (on the
+stored shingle sets, not the MinHash estimate) is at least the threshold.
+
+An entry holds up to `replies` sampled replies. Until it is full a lookup
+misses, so the caller generates a fresh reply and adds it. Once it is full,
+lookups rotate through the stored replies and the simulated patient still
+varies between students. Entries expire after `ttl` seconds and the least
+recently used one is evicted beyond `max_size`.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from utils.eval_fastpath import ngram_ids
+
+PRIME = np.uint64(4294967291)  # largest prime below 2**32; shingle ids are below 2**20
+
+# Words that change how a question is phrased but not what it asks. Negations
+# and question words stay: "any pain?" and "no pain?" are different questions.
+FILLER_WORDS = frozenset("""
+    a an the this that these those i you your me my we us it is are am be do does did can could would
+    will please here there in on at to today now so just well okay ok oh hello hi hey good morning
+    afternoon evening doctor dr and of
+""".split())
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def content_words(text: str) -> str:
+    return " ".join(word for word in _WORD.findall(text.lower()) if word not in FILLER_WORDS)
+
+
+class CacheKey(NamedTuple):
+    bucket: str
+    signature: np.ndarray
+    shingles: np.ndarray  # sorted unique shingle ids, for the exact Jaccard check
+
+
+class _Entry:
+    __slots__ = ("key", "replies", "served", "expires_at")
+
+    def __init__(self, key, expires_at):
+        self.key = key
+        self.replies = []
+        self.served = 0
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    def __init__(self, max_size=0, replies=3, ttl=3600.0, threshold=0.8, num_perm=128, bands=32):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.max_size = max_size
+        self.replies = max(replies, 1)
+        self.ttl = ttl
+        self.threshold = threshold
+        self.bands = bands
+        self._rows = num_perm // bands
+        # Fixed seed: signatures are comparable across processes and restarts
+        rng = np.random.default_rng(0x5EED)
+        self._a = rng.integers(1, int(PRIME), num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, int(PRIME), num_perm, dtype=np.uint64)[:, None]
+        self._entries = OrderedDict()  # id -> _Entry, least recently used first
+        self._index = {}               # (bucket, band, band bytes) -> set of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    # ------------------ MINHASH ------------------
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        if shingles.size == 0:
+            return np.zeros(self._a.shape[0], dtype=np.uint64)
+        return ((self._a * shingles.astype(np.uint64) + self._b) % PRIME).min(axis=1)
+
+    def key(self, bucket: str, text: str) -> CacheKey:
+        shingles = np.unique(ngram_ids(content_words(text)))
+        return CacheKey(bucket, self.signature(shingles), shingles)
+
+    @staticmethod
+    def similarity(a: CacheKey, b: CacheKey) -> float:
+        """Exact Jaccard similarity of the two keys' shingle sets."""
+        union = np.union1d(a.shingles, b.shingles).size
+        if union == 0:
+            return 0.0  # nothing but fillers ("hello doctor"): never a match
+        return np.intersect1d(a.shingles, b.shingles, assume_unique=True).size / union
+
+    def _band_keys(self, key: CacheKey):
+        rows = self._rows
+        return [(key.bucket, band, key.signature[band * rows:(band + 1) * rows].tobytes())
+                for band in range(self.bands)]
+
+    def _match(self, key: CacheKey, now: float) -> Optional[int]:
+        """Id of the most similar live entry at or above the threshold (lock held)."""
+        candidates = set()
+        for band_key in self._band_keys(key):
+            candidates.update(self._index.get(band_key, ()))
+        best, best_similarity = None, self.threshold
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if entry.expires_at <= now:
+                self._remove(entry_id)
+                self.expirations += 1
+                continue
+            similarity = self.similarity(entry.key, key)
+            if similarity >= best_similarity:
+                best, best_similarity = entry_id, similarity
+        return best
+
+    # ------------------ LOOKUP / STORE ------------------
+    def get(self, key: CacheKey) -> Optional[str]:
+        """A stored reply for a near-duplicate turn, or None while the entry is still filling."""
+        with self._lock:
+            entry_id = self._match(key, time.monotonic())
+            if entry_id is None or len(self._entries[entry_id].replies) < self.replies:
+                self.misses += 1
+                return None
+            entry = self._entries[entry_id]
+            self._entries.move_to_end(entry_id)
+            reply = entry.replies[entry.served % len(entry.replies)]
+            entry.served += 1
+            self.hits += 1
+            return reply
+
+    def add(self, key: CacheKey, reply: str):
+        """Adds a freshly generated reply to the matching entry (or a new one) until it is full."""
+        if not self.enabled or key.shingles.size == 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            entry_id = self._match(key, now)
+            if entry_id is None:
+                entry_id = self._next_id
+                self._next_id += 1
+                self._entries[entry_id] = _Entry(key, now + self.ttl)
+                for band_key in self._band_keys(key):
+                    self._index.setdefault(band_key, set()).add(entry_id)
+            entry = self._entries[entry_id]
+            self._entries.move_to_end(entry_id)
+            if len(entry.replies) < self.replies:
+                entry.replies.append(reply)
+                self.fills += 1
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for band_key in self._band_keys(entry.key):
+            ids = self._index.get(band_key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._index[band_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "replies_per_entry": self.replies,
+                "ttl": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fills": self.fills,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,28 +1,369 @@
-import uuid
-from langchain_core.messages import HumanMessage, AIMessage
-
-# In-memory session store
-# NOTE: Vercel serverless instances are ephemeral,
-# but this is ACCEPTABLE for the assignment demo.
-_sessions = {}
-
-
-def create_session():
-    session_id = str(uuid.uuid4())
-
-    _sessions[session_id] = {
-        "messages": [],
-        "revealed_symptoms": [],
-        "conversation_end": False
-    }
-
-    return session_id
-
-
-def get_session(session_id):
-    return _sessions.get(session_id)
-
-
-def reset_session(session_id):
-    if session_id in _sessions:
-        del _sessions[session_id]
+# utils/session_manager.py
+"""
+Server-side consultation sessions behind a pluggable store.
+
+The in-memory store keeps sessions in this process only. The SQLite store
+keeps them in a WAL-mode file, so every worker process on the host sees the
+same sessions and they survive a restart. That removes the need for sticky
+routing.
+
+- Each message is an append-only row in `turns`. An update only inserts the
+  messages added since the stored count.
+- The other fields (revealed symptoms, flags, history summary) are one JSON
+  row in `sessions`.
+- Writes from concurrent requests are group-committed: one writer thread
+  per process applies everything queued in a single transaction. Each
+  caller returns once its write is committed.
+- Sessions untouched for SESSION_TTL_S are swept every SESSION_SWEEP_S.
+
+    SESSION_BACKEND     "memory" (default) or "sqlite"
+    SESSION_DB          SQLite file (default <tmpdir>/sessions.sqlite)
+    SESSION_TTL_S       idle lifetime of a session in seconds (default 3600)
+    SESSION_SWEEP_S     seconds between expiry sweeps (default 60)
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from itertools import islice
+
+from utils.blocking import run_blocking
+from utils.metrics import Histogram
+from utils.transcript import Transcript
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.getenv("SESSION_BACKEND", "memory")
+DB_PATH = os.getenv("SESSION_DB", os.path.join(tempfile.gettempdir(), "sessions.sqlite"))
+SESSION_TTL_S = float(os.getenv("SESSION_TTL_S", "3600"))
+SWEEP_INTERVAL_S = float(os.getenv("SESSION_SWEEP_S", "60"))
+
+MAX_BATCH = 64          # writes applied per transaction
+CACHE_SIZE = 1024       # transcripts cached per process by the SQLite store
+
+COMMIT_BATCH = Histogram("session_commit_batch_size", "Session writes applied per SQLite transaction",
+                         buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+def _new_session(messages, case_id):
+    return {
+        "messages": messages if messages is not None else Transcript(),
+        "revealed_symptoms": [],
+        "conversation_end": False,
+        "clarification_used": False,
+        "treatment_start": None,
+        "history_summary": "",
+        "summarized_count": 0,
+        "case_id": case_id
+    }
+
+
+# ------------------ IN-MEMORY STORE ------------------
+class MemorySessionStore:
+    """Sessions in a dict, visible to this process only."""
+
+    def __init__(self, ttl=SESSION_TTL_S):
+        self.ttl = ttl
+        self._sessions = {}
+        self._touched = {}
+        self._last_sweep = time.monotonic()
+
+    def create(self, session_id, session):
+        self._sweep()
+        self._sessions[session_id] = session
+        self._touched[session_id] = time.monotonic()
+
+    def get(self, session_id):
+        touched = self._touched.get(session_id)
+        if touched is None or time.monotonic() - touched > self.ttl:
+            return None
+        return self._sessions.get(session_id)
+
+    def update(self, session_id, fields):
+        session = self.get(session_id)
+        if session is not None:
+            session.update(fields)
+            self._touched[session_id] = time.monotonic()
+        return session
+
+    def delete(self, session_id):
+        self._sessions.pop(session_id, None)
+        self._touched.pop(session_id, None)
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL_S:
+            return
+        self._last_sweep = now
+        for session_id, touched in list(self._touched.items()):
+            if now - touched > self.ttl:
+                self.delete(session_id)
+
+
+# ------------------ SQLITE STORE ------------------
+class _Write:
+    __slots__ = ("kind", "session_id", "fields", "done", "result", "error")
+
+    def __init__(self, kind, session_id, fields=None):
+        self.kind = kind
+        self.session_id = session_id
+        self.fields = fields
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SQLiteSessionStore:
+    """
+    Sessions shared by every process that opens the same file. Reads use a
+    per-thread connection; writes go through the group-commit writer.
+    """
+
+    def __init__(self, path=DB_PATH, ttl=SESSION_TTL_S):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._cache = OrderedDict()  # session_id -> Transcript as last read or written here
+        self._cache_lock = threading.Lock()
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+        db = self._connection()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, "
+            "turns INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS turns (session_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+            "role INTEGER NOT NULL, content TEXT NOT NULL, PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def _connection(self):
+        # Connections are per thread and per process (reopened after a fork)
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # durable across process crashes, cheap commits
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    # ------------------ READS ------------------
+    def get(self, session_id):
+        with self._cache_lock:
+            transcript = self._cache.get(session_id)
+        seen = len(transcript) if transcript is not None else 0
+        found = run_blocking(self._read, session_id, seen)
+        if found is None:
+            self._forget(session_id)
+            return None
+        state, turns, start, rows = found
+
+        if transcript is None or start == 0:
+            transcript = Transcript()
+        if rows:
+            for role, content in rows:
+                transcript = transcript.add(role, content)
+            self._remember(session_id, transcript)
+
+        session = json.loads(state)
+        session["messages"] = transcript
+        return session
+
+    def _read(self, session_id, seen):
+        """(state, turns, start, rows): the session row and the turns from `start` on."""
+        db = self._connection()
+        row = db.execute("SELECT state, turns, updated FROM sessions WHERE id = ?",
+                         (session_id,)).fetchone()
+        if row is None or time.time() - row[2] > self.ttl:
+            return None
+        state, turns, _ = row
+        # Only the turns this process has not seen yet are read
+        start = seen if seen <= turns else 0
+        rows = []
+        if start < turns:
+            rows = db.execute(
+                "SELECT role, content FROM turns WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (session_id, start, turns)
+            ).fetchall()
+        return state, turns, start, rows
+
+    def _remember(self, session_id, transcript):
+        with self._cache_lock:
+            self._cache[session_id] = transcript
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _forget(self, session_id):
+        with self._cache_lock:
+            self._cache.pop(session_id, None)
+
+    # ------------------ WRITES ------------------
+    def create(self, session_id, session):
+        self._write(_Write("create", session_id, session))
+
+    def update(self, session_id, fields):
+        return self._write(_Write("update", session_id, fields))
+
+    def delete(self, session_id):
+        self._forget(session_id)
+        self._write(_Write("delete", session_id))
+
+    def _write(self, write):
+        self._writer_queue().put(write)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _writer_queue(self):
+        # One writer thread per process, restarted in a forked child
+        if self._writer_pid != os.getpid():
+            with self._writer_lock:
+                if self._writer_pid != os.getpid():
+                    self._queue = queue.Queue()
+                    threading.Thread(target=self._run_writer, args=(self._queue,),
+                                     name="session-writer", daemon=True).start()
+                    self._writer_pid = os.getpid()
+        return self._queue
+
+    def _run_writer(self, writes):
+        last_sweep = 0.0
+        while True:
+            try:
+                batch = [writes.get(timeout=SWEEP_INTERVAL_S)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < MAX_BATCH:
+                try:
+                    batch.append(writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._commit(batch)
+            if time.monotonic() - last_sweep >= SWEEP_INTERVAL_S:
+                last_sweep = time.monotonic()
+                try:
+                    run_blocking(self.sweep)
+                except sqlite3.Error as e:
+                    logger.error(f"Session sweep failed: {e}")
+
+    def _commit(self, batch):
+        try:
+            for session_id, messages in run_blocking(self._transaction, batch):
+                self._remember(session_id, messages)
+            COMMIT_BATCH.labels().observe(len(batch))
+        except Exception as e:
+            for write in batch:
+                write.error = e
+        finally:
+            for write in batch:
+                write.done.set()
+
+    def _transaction(self, batch):
+        """Applies the batch in one transaction; returns the transcripts that grew."""
+        db = self._connection()
+        grown = []
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for write in batch:
+                write.result = self._apply(db, write, grown)
+            db.execute("COMMIT")
+        except Exception:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        return grown
+
+    def _apply(self, db, write, grown):
+        session_id, now = write.session_id, time.time()
+        if write.kind == "delete":
+            db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            return None
+
+        if write.kind == "create":
+            stored, turns = {}, 0
+        else:
+            row = db.execute("SELECT state, turns FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            stored, turns = json.loads(row[0]), row[1]
+
+        fields = dict(write.fields)
+        messages = fields.pop("messages", None)
+        stored.update(fields)
+        if messages is not None:
+            # Append-only: a transcript no longer than the stored one adds nothing
+            db.executemany(
+                "INSERT OR REPLACE INTO turns VALUES (?, ?, ?, ?)",
+                [(session_id, seq, role, content)
+                 for seq, (role, content) in enumerate(islice(messages, turns, None), start=turns)]
+            )
+            if len(messages) > turns:
+                turns = len(messages)
+                grown.append((session_id, messages))
+
+        db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+                   (session_id, json.dumps(stored), turns, now))
+        return stored if messages is None else {**stored, "messages": messages}
+
+    def sweep(self):
+        """Deletes sessions (and their turns) idle for longer than the TTL."""
+        db = self._connection()
+        cutoff = time.time() - self.ttl
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM turns WHERE session_id IN (SELECT id FROM sessions WHERE updated < ?)",
+                       (cutoff,))
+            db.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+
+def _default_store():
+    if BACKEND == "sqlite":
+        return SQLiteSessionStore()
+    return MemorySessionStore()
+
+
+_store = _default_store()
+
+
+def get_store():
+    return _store
+
+
+def set_store(store):
+    """Swaps the session store; used by benchmarks and tools."""
+    global _store
+    _store = store
+
+
+# ------------------ API ------------------
+def create_session(messages=None, case_id=None):
+    session_id = str(uuid.uuid4())
+    _store.create(session_id, _new_session(messages, case_id))
+    return session_id
+
+
+def get_session(session_id):
+    return _store.get(session_id)
+
+
+def update_session(session_id, **fields):
+    return _store.update(session_id, fields)
+
+
+def reset_session(session_id):
+    _store.delete(session_id)
@@ -0,0 +1,139 @@
+# utils/single_flight.py
+"""
+Single-flight coalescing of identical in-flight graph invocations.
+
+A retried or double-submitted request carries exactly the same graph input
+as the one already running. flights.invoke(name, graph, state, identity)
+keys the call on a hash of (graph name, caller identity, full input state):
+the first caller starts the invocation and every identical caller that
+arrives before it finishes waits for the same result (or exception) instead
+of paying for its own upstream calls. The identity (a session id, say)
+keeps two different students who send the same turn at the same moment
+apart; each gets a reply of their own. Calls without an identity are not
+coalesced at all.
+
+The invocation runs on a pool thread in a copy of the first caller's
+context, so that caller's deadline applies. Each caller waits at most until
+its own deadline (SINGLE_FLIGHT_TIMEOUT_S without one). When the last caller
+stops waiting the flight is cancelled: it leaves the table, so the next
+identical request starts afresh, and no further upstream attempt, retry
+or hedge is made for it.
+
+    SINGLE_FLIGHT              "0" disables coalescing (default on)
+    SINGLE_FLIGHT_TIMEOUT_S    wait limit for callers without a deadline (default 30)
+    SINGLE_FLIGHT_WORKERS      threads running invocations (default 64)
+"""
+import contextvars
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from utils.metrics import Counter
+from utils.resilience import DeadlineExceeded, remaining, set_cancel_event
+from utils.transcript import Transcript
+
+ENABLED = os.getenv("SINGLE_FLIGHT", "1") != "0"
+WAIT_TIMEOUT_S = float(os.getenv("SINGLE_FLIGHT_TIMEOUT_S", "30"))
+MAX_WORKERS = int(os.getenv("SINGLE_FLIGHT_WORKERS", "64"))
+
+FLIGHTS = Counter("single_flight_calls_total",
+                  "Graph invocations started, joined, timed out or cancelled by single-flight",
+                  ["graph", "result"])
+
+
+def _encode(value):
+    if isinstance(value, Transcript):
+        return [[role, content] for role, content in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+
+def state_key(name, state, identity=None):
+    """Hash of the graph name, the caller's identity and the full input state."""
+    payload = json.dumps([name, identity, state], sort_keys=True, default=_encode)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("future", "waiters", "cancel")
+
+    def __init__(self):
+        self.future = None
+        self.waiters = 0
+        self.cancel = threading.Event()
+
+
+class SingleFlight:
+    def __init__(self, max_workers=MAX_WORKERS, timeout=WAIT_TIMEOUT_S):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._flights = {}  # key -> _Flight still running
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="single-flight")
+        return self._pool
+
+    def do(self, key, fn, label="graph"):
+        """Runs fn() once for all concurrent callers with the same key; returns its result."""
+        executor = self._executor()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                context = contextvars.copy_context()
+                flight.future = executor.submit(context.run, self._run, key, flight, fn)
+                FLIGHTS.labels(label, "started").inc()
+            else:
+                FLIGHTS.labels(label, "joined").inc()
+            flight.waiters += 1
+
+        left = remaining()
+        timeout = self.timeout if left is None else max(left, 0.0)
+        try:
+            return flight.future.result(timeout)
+        except FutureTimeout:
+            FLIGHTS.labels(label, "timeout").inc()
+            raise DeadlineExceeded(f"Timed out waiting for {label} after {timeout:.1f}s") from None
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.future.done():
+                    # Nobody is left to read the result
+                    flight.future.cancel()
+                    flight.cancel.set()
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                    FLIGHTS.labels(label, "cancelled").inc()
+
+    def _run(self, key, flight, fn):
+        set_cancel_event(flight.cancel)  # scoped to this flight's context copy
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def invoke(self, name, graph, state, identity=None):
+        """
+        graph.invoke(state), coalesced with the same caller's identical
+        in-flight invocations; run on its own when identity is None.
+        """
+        if not ENABLED or identity is None:
+            return graph.invoke(state)
+        return self.do(state_key(name, state, identity), lambda: graph.invoke(state), name)
+
+    def __len__(self):
+        return len(self._flights)
+
+
+flights = SingleFlight()
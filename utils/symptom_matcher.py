@@ -0,0 +1,106 @@
+# utils/symptom_matcher.py
+"""
+Single-pass symptom detection.
+
+All keywords of a case are compiled into one word-bounded alternation, so
+a reply is scanned once regardless of how many keywords the case defines.
+Keywords also match their plural ("headaches", "head hurts").
+"""
+import re
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, Iterable, List
+
+
+class SymptomMatcher:
+    def __init__(self, symptom_keywords: Dict[str, List[str]]):
+        self.symptoms = list(symptom_keywords)
+        self._symptom_for = {}
+        for symptom, keywords in symptom_keywords.items():
+            for kw in keywords:
+                self._symptom_for[" ".join(kw.lower().split())] = symptom
+
+        # Longest first so "head pain" wins over a shorter overlapping keyword
+        alternation = "|".join(
+            re.escape(kw).replace(r"\ ", r"\s+")
+            for kw in sorted(self._symptom_for, key=len, reverse=True)
+        )
+        # Matching runs on lowercased text; a case-sensitive pattern is ~2x faster
+        self._regex = re.compile(rf"\b({alternation})(?:e?s)?\b")
+
+    def _symptom(self, match) -> str:
+        return self._symptom_for[" ".join(match.group(1).split())]
+
+    def find(self, text: str) -> List[str]:
+        """Symptoms mentioned in text, in order of first mention."""
+        found = []
+        for match in self._regex.finditer(text.lower()):
+            symptom = self._symptom(match)
+            if symptom not in found:
+                found.append(symptom)
+                if len(found) == len(self.symptoms):
+                    break
+        return found
+
+    def new_symptoms(self, text: str, revealed: Iterable[str]) -> List[str]:
+        """Symptoms mentioned in text that are not in revealed yet."""
+        revealed = set(revealed)
+        if len(revealed) >= len(self.symptoms):
+            return []
+        return [s for s in self.find(text) if s not in revealed]
+
+    # ------------------ BULK MODE ------------------
+    def reveal_order(self, replies: List[str]) -> List[tuple]:
+        """
+        (symptom, turn) for the first reveal of each symptom across a consult's
+        patient replies. The replies are joined and scanned in one pass.
+        """
+        replies = [reply.lower() for reply in replies]
+        starts, offset = [], 0
+        for reply in replies:
+            starts.append(offset)
+            offset += len(reply) + 1
+        joined = "\n".join(replies)
+
+        order, seen = [], set()
+        for match in self._regex.finditer(joined):
+            symptom = self._symptom(match)
+            if symptom not in seen:
+                seen.add(symptom)
+                order.append((symptom, bisect_right(starts, match.start()) - 1))
+                if len(seen) == len(self.symptoms):
+                    break
+        return order
+
+    def scan_corpus(self, consults: Iterable[List[str]]) -> Dict:
+        """
+        Reveal statistics over many consults, each given as its list of patient
+        replies: how often each symptom is revealed, the mean turn of its first
+        reveal, and the most common reveal orders.
+        """
+        total = 0
+        reveal_counts = Counter()
+        turn_sums = Counter()
+        orders = Counter()
+
+        for replies in consults:
+            total += 1
+            order = self.reveal_order(replies)
+            for symptom, turn in order:
+                reveal_counts[symptom] += 1
+                turn_sums[symptom] += turn
+            orders[" > ".join(symptom for symptom, _ in order) or "(none)"] += 1
+
+        return {
+            "consults": total,
+            "symptoms": {
+                symptom: {
+                    "revealed": reveal_counts[symptom],
+                    "reveal_rate": round(reveal_counts[symptom] / total, 4) if total else 0.0,
+                    "mean_first_turn": (round(turn_sums[symptom] / reveal_counts[symptom], 2)
+                                        if reveal_counts[symptom] else None)
+                }
+                for symptom in self.symptoms
+            },
+            "reveal_orders": dict(orders.most_common(20))
+        }
@@ -0,0 +1,142 @@
+# utils/transcript.py
+"""
+Consultation transcript shared by the HTTP handlers and the graphs.
+
+A Transcript is an immutable snapshot over an append-only log: roles in a
+byte array, contents in a list. add() returns a snapshot one message
+longer. When the snapshot is the newest one it appends to the shared log
+without copying anything; an older snapshot (a retried or concurrent turn)
+branches off a copy, so earlier snapshots never change.
+
+The Groq-format and client JSON views are built once per message and cached
+on the log, so each turn only converts the messages added since the last
+one.
+
+    Roles       client JSON   Groq
+    DOCTOR      "doctor"      "user"
+    PATIENT     "patient"     "assistant"
+"""
+import threading
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DOCTOR = 0
+PATIENT = 1
+
+JSON_ROLES = ("doctor", "patient")
+GROQ_ROLES = ("user", "assistant")
+LINE_LABELS = ("Doctor", "Patient")
+
+
+class _Log:
+    __slots__ = ("roles", "contents", "groq", "json", "lock")
+
+    def __init__(self, roles=None, contents=None):
+        self.roles = roles if roles is not None else array("b")
+        self.contents = contents if contents is not None else []
+        self.groq = []   # cached {"role", "content"} dicts in Groq format
+        self.json = []   # cached dicts in client format
+        self.lock = threading.Lock()
+
+
+class Transcript:
+    __slots__ = ("_log", "_length")
+
+    def __init__(self, log: Optional[_Log] = None, length: int = 0):
+        self._log = log if log is not None else _Log()
+        self._length = length
+
+    # ------------------ CONSTRUCTION ------------------
+    @classmethod
+    def from_json(cls, messages) -> "Transcript":
+        """Client {"role", "content"} dicts; anything but "doctor" is the patient."""
+        roles = array("b", [DOCTOR if m.get("role") == "doctor" else PATIENT for m in messages])
+        contents = [str(m.get("content", "")) for m in messages]
+        return cls(_Log(roles, contents), len(contents))
+
+    @classmethod
+    def from_messages(cls, messages) -> "Transcript":
+        """LangChain Human/AI messages (older graph callers)."""
+        roles = array("b", [DOCTOR if getattr(m, "type", "") == "human" else PATIENT for m in messages])
+        contents = [m.content for m in messages]
+        return cls(_Log(roles, contents), len(contents))
+
+    def add(self, role: int, content: str) -> "Transcript":
+        """Returns this transcript plus one message; self is left unchanged."""
+        log = self._log
+        with log.lock:
+            if len(log.contents) == self._length:
+                log.roles.append(role)
+                log.contents.append(content)
+                return Transcript(log, self._length + 1)
+        branch = _Log(log.roles[:self._length], log.contents[:self._length])
+        branch.roles.append(role)
+        branch.contents.append(content)
+        return Transcript(branch, self._length + 1)
+
+    # ------------------ ACCESS ------------------
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        log = self._log
+        return zip(log.roles[:self._length], log.contents[:self._length])
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def __repr__(self) -> str:
+        return f"Transcript({self._length} messages)"
+
+    def last(self, role: Optional[int] = None) -> str:
+        """Content of the newest message (of the given role), or ""."""
+        log = self._log
+        for i in range(self._length - 1, -1, -1):
+            if role is None or log.roles[i] == role:
+                return log.contents[i]
+        return ""
+
+    def contents(self, role: int) -> List[str]:
+        log = self._log
+        return [c for r, c in zip(log.roles[:self._length], log.contents) if r == role]
+
+    def lines(self, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """"Doctor: ..." / "Patient: ..." lines, as the evaluator reads history."""
+        log = self._log
+        start, stop, _ = slice(start, stop).indices(self._length)
+        return [f"{LINE_LABELS[log.roles[i]]}: {log.contents[i]}" for i in range(start, stop)]
+
+    # ------------------ VIEWS ------------------
+    def _view(self, cache: List[Dict], names) -> List[Dict]:
+        log = self._log
+        if len(cache) < self._length:
+            with log.lock:
+                for i in range(len(cache), self._length):
+                    cache.append({"role": names[log.roles[i]], "content": log.contents[i]})
+        return cache[:self._length]
+
+    def groq_messages(self) -> List[Dict]:
+        """Groq chat-format messages. The dicts are shared; do not mutate them."""
+        return self._view(self._log.groq, GROQ_ROLES)
+
+    def to_json(self) -> List[Dict]:
+        """Client-format messages, ready for jsonify. The dicts are shared."""
+        return self._view(self._log.json, JSON_ROLES)
+
+    def __reduce__(self):
+        log = self._log
+        return _restore, (log.roles[:self._length].tobytes(), log.contents[:self._length])
+
+
+def _restore(roles: bytes, contents: List[str]) -> Transcript:
+    return Transcript(_Log(array("b", roles), contents), len(contents))
+
+
+def as_transcript(messages) -> Transcript:
+    """Accepts a Transcript, client dicts or LangChain messages (graph inputs)."""
+    if isinstance(messages, Transcript):
+        return messages
+    messages = list(messages or [])
+    if messages and isinstance(messages[0], dict):
+        return Transcript.from_json(messages)
+    return Transcript.from_messages(messages)